@@ -0,0 +1,29 @@
+"""Add token_count to messages
+
+Revision ID: 3c7f2b9d41e6
+Revises: a5e8420ede10
+Create Date: 2026-10-17 10:12:31.408215
+
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7f2b9d41e6'
+down_revision: str | Sequence[str] | None = 'a5e8420ede10'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable: existing rows are counted on read until they age out of history.
+    op.add_column('messages', sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('messages', 'token_count')
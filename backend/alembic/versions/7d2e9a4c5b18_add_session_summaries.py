@@ -0,0 +1,38 @@
+"""Add session_summaries
+
+Revision ID: 7d2e9a4c5b18
+Revises: 3c7f2b9d41e6
+Create Date: 2026-10-17 14:02:47.551093
+
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e9a4c5b18'
+down_revision: str | Sequence[str] | None = '3c7f2b9d41e6'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('session_summaries',
+    sa.Column('session_id', sa.UUID(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=False),
+    sa.Column('token_count', sa.Integer(), nullable=False),
+    sa.Column('watermark_message_id', sa.UUID(), nullable=False),
+    sa.Column('watermark_at', sa.DateTime(), nullable=False),
+    sa.Column('summarized_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.CheckConstraint('summarized_count >= 0', name='chk_summary_summarized_count'),
+    sa.PrimaryKeyConstraint('session_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('session_summaries')
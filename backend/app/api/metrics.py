@@ -0,0 +1,21 @@
+"""Metrics API - 以 Prometheus 文本格式导出进程内指标"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.observability.metrics import metrics
+
+router = APIRouter(tags=["Metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus 抓取端点
+
+    导出当前进程内注册的全部计数器 / 仪表 / 直方图；
+    多进程部署时每个 worker 各自导出，由 Prometheus 按实例聚合。
+    """
+    return PlainTextResponse(metrics.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
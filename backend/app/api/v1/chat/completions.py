@@ -1,6 +1,5 @@
 """聊天完成端点 - OpenAI 兼容"""
 
-import json
 import time
 from collections.abc import AsyncGenerator
 from typing import Union
@@ -8,6 +7,8 @@ from typing import Union
 from fastapi import APIRouter, Header, Request
 from fastapi.responses import StreamingResponse
 
+from app.api.v1.chat.sse import DONE_FRAME, SSEFrameEncoder, coalesce_chunks
+from app.core.config.manager import get_config
 from app.core.exceptions import ValidationError
 from app.observability.logging import get_logger
 from app.observability.logging import bind_request_context
@@ -59,6 +60,8 @@ async def chat_completions(
     request: Request,
     user_id: str = Header(None, alias="X-User-Id"),
     session_id: str = Header(None, alias="X-Session-Id"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
+    request_timeout: float = Header(None, alias="X-Request-Timeout"),
 ) -> Union[dict, StreamingResponse]:
     """
     聊天完成端点 (OpenAI 兼容)
@@ -66,6 +69,8 @@ async def chat_completions(
     请求头:
     - X-User-Id: 用户 ID
     - X-Session-Id: 会话 ID
+    - Idempotency-Key: 可选，相同键的重试返回已完成的响应而不重新生成
+    - X-Request-Timeout: 可选，请求截止时间（秒），超出后返回 504 或截断流
 
     请求体:
     {
@@ -132,6 +137,8 @@ async def chat_completions(
                 max_tokens=req.max_tokens,
                 top_p=req.top_p,
                 tools=req.tools,
+                idempotency_key=idempotency_key,
+                timeout=request_timeout,
             ),
             media_type="text/event-stream",
             headers={
@@ -152,6 +159,8 @@ async def chat_completions(
         max_tokens=req.max_tokens,
         top_p=req.top_p,
         tools=req.tools,
+        idempotency_key=idempotency_key,
+        timeout=request_timeout,
     )
 
     return response
@@ -168,12 +177,15 @@ async def _stream_response(
     max_tokens: int | None = None,
     top_p: float | None = None,
     tools: list[dict] | None = None,
-) -> AsyncGenerator[str, None]:
+    idempotency_key: str | None = None,
+    timeout: float | None = None,
+) -> AsyncGenerator[bytes, None]:
     """流式响应生成器"""
     # 获取 request_id（从中间件设置）
     request_id = getattr(request.state, 'request_id', 'unknown')
     start_time = time.time()
-    
+    encoder = SSEFrameEncoder(request_id)
+
     logger.info(
         "Stream chat started",
         request_id=request_id,
@@ -191,9 +203,12 @@ async def _stream_response(
         max_tokens=max_tokens,
         top_p=top_p,
         tools=tools,
+        idempotency_key=idempotency_key,
+        timeout=timeout,
     )
+    frames = _coalesced(stream)
     try:
-        async for chunk in stream:
+        async for chunk in frames:
             if await request.is_disconnected():
                 logger.info(
                     "Client disconnected from stream",
@@ -212,11 +227,10 @@ async def _stream_response(
                     session_id=session_id,
                     elapsed_time=elapsed_time,
                 )
-                yield "data: [DONE]\n\n"
+                yield DONE_FRAME
             else:
-                # 添加 request_id 到响应中
-                chunk_with_id = {**chunk, "request_id": request_id}
-                yield f"data: {json.dumps(chunk_with_id)}\n\n"
+                # 预编码帧：逐 token 只序列化 delta，request_id 已在帧后缀中
+                yield encoder.encode(chunk)
     except Exception as e:
         logger.error(
             "Stream failed",
@@ -234,8 +248,21 @@ async def _stream_response(
                 "request_id": request_id,
             }
         }
-        yield f"data: {json.dumps(error_response)}\n\n"
+        yield encoder.error(error_response)
     finally:
-        # 安全地关闭 stream
+        # 安全地关闭 stream（先关闭合并层，它会取消挂起的读取）
+        if frames is not stream:
+            await frames.aclose()
         if hasattr(stream, 'aclose'):
             await stream.aclose()
+
+
+def _coalesced(stream):
+    """按配置合并相邻文本增量（未启用时原样返回）"""
+    try:
+        cfg = get_config().api.sse.coalesce
+    except Exception:
+        return stream
+    if not cfg.enabled:
+        return stream
+    return coalesce_chunks(stream, cfg.max_bytes, cfg.flush_interval_ms / 1000)
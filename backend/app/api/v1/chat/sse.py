@@ -0,0 +1,200 @@
+"""SSE 帧编码与增量合并 - 流式补全的逐 chunk 序列化快路径"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选加速依赖
+    orjson = None
+
+from app.observability.metrics import metrics
+
+DONE_FRAME = b"data: [DONE]\n\n"
+
+sse_deltas_coalesced = metrics.counter(
+    "sse_deltas_coalesced_total", "Upstream deltas merged into a preceding SSE frame"
+)
+
+
+def dumps(value: Any) -> bytes:
+    """紧凑 JSON 序列化（优先 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+class SSEFrameEncoder:
+    """单个流式请求的 SSE 帧编码器
+
+    同一请求内 id/object/created/model/request_id 不变：预先拼好帧前缀与后缀，
+    逐 token 只序列化 delta 文本与 finish_reason。其他形态的 chunk（工具进度、
+    带 usage 的末块等）走完整序列化，输出字段与 {**chunk, "request_id": ...} 一致。
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self._request_id_json = dumps(request_id)
+        self._header: tuple[Any, Any, Any, Any] | None = None
+        self._prefix = b""
+        self._suffix = b',"request_id":' + self._request_id_json + b"}\n\n"
+
+    def encode(self, chunk: dict) -> bytes:
+        """编码一个 chat.completion.chunk 为完整 SSE 帧"""
+        content = content_delta(chunk)
+        if content is None:
+            return self._frame(chunk)
+
+        header = (chunk["id"], chunk["object"], chunk["created"], chunk["model"])
+        if header != self._header:
+            self._header = header
+            self._prefix = (
+                b'data: {"id":'
+                + dumps(header[0])
+                + b',"object":'
+                + dumps(header[1])
+                + b',"created":'
+                + dumps(header[2])
+                + b',"model":'
+                + dumps(header[3])
+                + b',"choices":[{"index":0,"delta":{"content":'
+            )
+        finish_reason = chunk["choices"][0]["finish_reason"]
+        return (
+            self._prefix
+            + dumps(content)
+            + b'},"finish_reason":'
+            + dumps(finish_reason)
+            + b"}]"
+            + self._suffix
+        )
+
+    def _frame(self, chunk: dict) -> bytes:
+        return b"data: " + dumps({**chunk, "request_id": self.request_id}) + b"\n\n"
+
+    @staticmethod
+    def error(payload: dict) -> bytes:
+        return b"data: " + dumps(payload) + b"\n\n"
+
+
+_CONTENT_KEYS = frozenset({"id", "object", "created", "model", "choices"})
+
+
+def content_delta(chunk: dict) -> str | None:
+    """仅当 chunk 为标准单 choice 文本增量时返回其内容"""
+    if chunk.keys() != _CONTENT_KEYS:
+        return None
+    choices = chunk["choices"]
+    if len(choices) != 1:
+        return None
+    choice = choices[0]
+    if choice.keys() != {"index", "delta", "finish_reason"} or choice["index"] != 0:
+        return None
+    delta = choice["delta"]
+    if delta.keys() != {"content"} or not isinstance(delta["content"], str):
+        return None
+    return delta["content"]
+
+
+async def coalesce_chunks(
+    stream: AsyncIterator[dict],
+    max_bytes: int = 256,
+    flush_interval: float = 0.02,
+) -> AsyncIterator[dict]:
+    """合并相邻文本增量，减少每个流的帧数与写次数
+
+    后台任务读取上游放入队列，已到达的增量一次性取尽合并；缓冲首个增量起计时，
+    达到 max_bytes 或 flush_interval 即输出一帧。带 finish_reason 的增量、
+    工具事件等非文本 chunk 立即刷出（先刷缓冲）。上游停顿时由定时器刷出已缓冲内容。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+    end = object()
+
+    async def read() -> None:
+        try:
+            async for item in stream:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put((end, e))
+        else:
+            await queue.put((end, None))
+
+    reader = asyncio.create_task(read())
+    first: dict | None = None
+    parts: list[str] = []
+    size = 0
+    deadline = 0.0
+
+    def take(finish_reason: str | None = None) -> dict:
+        nonlocal first, parts, size
+        if len(parts) == 1 and finish_reason == first["choices"][0]["finish_reason"]:
+            merged = first
+        else:
+            sse_deltas_coalesced.inc(len(parts) - 1)
+            merged = {
+                **first,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": "".join(parts)},
+                        "finish_reason": finish_reason,
+                    }
+                ],
+            }
+        first, parts, size = None, [], 0
+        return merged
+
+    try:
+        while True:
+            if first is None:
+                item = await queue.get()
+            else:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        yield take()
+                        continue
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except TimeoutError:
+                        yield take()
+                        continue
+
+            if type(item) is tuple and item[0] is end:
+                if first is not None:
+                    yield take()
+                if item[1] is not None:
+                    raise item[1]
+                return
+
+            content = content_delta(item)
+            if content is None:
+                if first is not None:
+                    yield take()
+                yield item
+                continue
+
+            if first is not None and (
+                first["id"] != item["id"]
+                or first["created"] != item["created"]
+                or first["model"] != item["model"]
+            ):
+                yield take()
+            if first is None:
+                first = item
+                deadline = loop.time() + flush_interval
+            parts.append(content)
+            size += len(content.encode())
+
+            finish_reason = item["choices"][0]["finish_reason"]
+            if finish_reason is not None or size >= max_bytes:
+                yield take(finish_reason)
+    finally:
+        if not reader.done():
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
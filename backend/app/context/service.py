@@ -3,8 +3,9 @@
 import asyncio
 import time
 import uuid
+from datetime import datetime
 
-from sqlalchemy import select
+from sqlalchemy import and_, case, func, or_, select
 
 from app.context.message_builder import context_to_messages
 from app.context.models import ContextBundle, TokenBudget
@@ -16,8 +17,14 @@ from app.engines.knowledge import KnowledgeItem
 from app.engines.registry import EngineRegistry
 from app.engines.user_profile import UserProfileResult
 from app.observability.logging import get_logger
+from app.observability.timing import PhaseTimer
+from app.services.history_cache import CachedMessage, SessionHistoryCache
+from app.services.persister import MessagePersister, message_persister
+from app.services.summarizer import SessionSummarizer, SummaryState, session_summarizer
 from app.storage.database import db_manager
 from app.storage.models import Message
+from app.utils.deadline import Deadline
+from app.utils.tokenizer import Tokenizer, get_tokenizer
 
 logger = get_logger(__name__)
 
@@ -25,9 +32,21 @@ logger = get_logger(__name__)
 class ContextService:
     """Context service for building ContextBundle."""
 
-    def __init__(self, engine_registry: EngineRegistry, config=None):
+    def __init__(
+        self,
+        engine_registry: EngineRegistry,
+        config=None,
+        persister: MessagePersister | None = None,
+        summarizer: SessionSummarizer | None = None,
+        history_cache: SessionHistoryCache | None = None,
+    ):
         self.engine_registry = engine_registry
         self._config = config
+        self.message_persister = persister or message_persister
+        self.history_cache = history_cache or self.message_persister.history_cache
+        self.summarizer = summarizer or session_summarizer
+        # Sources that missed the soft deadline; referenced until they finish
+        self._background_tasks: set[asyncio.Task] = set()
 
     async def build_context_bundle(
         self,
@@ -37,24 +56,40 @@ class ContextService:
         personality: Personality,
         max_tokens: int | None = None,
         request_id: str | None = None,
+        timer: PhaseTimer | None = None,
+        deadline: Deadline | None = None,
     ) -> ContextBundle:
-        """Build a context bundle for the current request."""
+        """Build a context bundle for the current request.
+
+        When a PhaseTimer is given, history fetch, each context engine and the
+        token budget pass are recorded as separate phases. When a Deadline is
+        given, every source timeout is capped by its remaining budget and a
+        source that runs out degrades like any other timeout. With a soft
+        deadline configured, assembly stops waiting for slow personalization
+        engines at the cutoff and lists them in metadata["late_sources"].
+        """
         config = self._get_config()
         context_cfg = config.context
         engines_cfg = config.engines
         request_id = request_id or str(uuid.uuid4())
+        source_timeout = context_cfg.parallel_execution.timeout
+        if deadline is not None:
+            source_timeout = deadline.timeout(source_timeout)
 
         system_prompts = []
         if context_cfg.assembly.include_system_prompt:
             system_prompts.append(personality.system_prompt)
 
-        recent_messages = await self._fetch_recent_messages(
-            session_id=session_id,
-            limit=20,
-            request_id=request_id,
-        )
-
-        summary: list[str] = []
+        # The rolling summary covers every message up to its watermark, so
+        # history is only read after it and prompt size stays flat as the
+        # session grows. The lookup starts right away, alongside the
+        # personalization engines; only the history read waits for it.
+        summary_task = None
+        if context_cfg.summarization.enabled:
+            summary_task = asyncio.create_task(
+                self._load_summary(session_id, source_timeout, request_id, timer)
+            )
+        tokenizer = get_tokenizer(personality.ai.model)
 
         knowledge_enabled = (
             context_cfg.assembly.include_knowledge and engines_cfg.knowledge.enabled
@@ -68,70 +103,100 @@ class ContextService:
             and personality.memory.enabled
         )
 
-        engine_tasks = []
-        engine_names = []
+        # All context sources (history + personalization engines) run as one
+        # fan-out, each bounded by its own deadline, so assembly latency is the
+        # slowest source rather than the sum of them.
+        source_tasks = {
+            "history": self._call_history_after_summary(
+                summary_task,
+                context_cfg,
+                system_prompts,
+                max_tokens,
+                tokenizer,
+                session_id,
+                source_timeout,
+                request_id,
+                deadline,
+            )
+        }
         if knowledge_enabled:
-            engine_tasks.append(
-                self._call_knowledge_engine(
-                    current_message,
-                    engines_cfg.knowledge.default_provider,
-                    engines_cfg.knowledge.providers.get(
-                        engines_cfg.knowledge.default_provider
-                    ),
-                    context_cfg.parallel_execution.timeout,
-                    request_id,
-                )
+            source_tasks["knowledge"] = self._call_knowledge_engine(
+                current_message,
+                engines_cfg.knowledge.default_provider,
+                engines_cfg.knowledge.providers.get(engines_cfg.knowledge.default_provider),
+                context_cfg.parallel_execution.timeout,
+                request_id,
+                deadline,
             )
-            engine_names.append("knowledge")
         if user_profile_enabled:
-            engine_tasks.append(
-                self._call_user_profile_engine(
-                    user_id,
-                    engines_cfg.user_profile.default_provider,
-                    engines_cfg.user_profile.timeout,
-                    context_cfg.parallel_execution.timeout,
-                    request_id,
-                )
+            source_tasks["user_profile"] = self._call_user_profile_engine(
+                user_id,
+                engines_cfg.user_profile.default_provider,
+                engines_cfg.user_profile.timeout,
+                context_cfg.parallel_execution.timeout,
+                request_id,
+                deadline,
             )
-            engine_names.append("user_profile")
         if chat_memory_enabled:
-            engine_tasks.append(
-                self._call_chat_memory_engine(
-                    current_message,
-                    user_id,
-                    session_id,
-                    personality.memory.recall_top_k,
-                    engines_cfg.chat_memory.default_provider,
-                    engines_cfg.chat_memory.providers.get(
-                        engines_cfg.chat_memory.default_provider
-                    ),
-                    context_cfg.parallel_execution.timeout,
-                    request_id,
-                )
+            source_tasks["chat_memory"] = self._call_chat_memory_engine(
+                current_message,
+                user_id,
+                session_id,
+                personality.memory.recall_top_k,
+                engines_cfg.chat_memory.default_provider,
+                engines_cfg.chat_memory.providers.get(engines_cfg.chat_memory.default_provider),
+                context_cfg.parallel_execution.timeout,
+                request_id,
+                deadline,
             )
-            engine_names.append("chat_memory")
 
+        recent_messages: list[ChatMessage] = []
         knowledge_results: list[KnowledgeItem] = []
         user_profile_result: UserProfileResult | None = None
         memory_results: list[MemoryItem] = []
         metadata = {"engines": {}}
 
-        if engine_tasks:
-            if context_cfg.parallel_execution.enabled:
-                results = await asyncio.gather(*engine_tasks)
-            else:
-                results = []
-                for task in engine_tasks:
-                    results.append(await task)
-
-            for engine_name, (engine_data, engine_meta) in zip(engine_names, results):
-                metadata["engines"][engine_name] = engine_meta
-                if engine_name == "knowledge":
-                    knowledge_results = engine_data
-                elif engine_name == "user_profile":
-                    user_profile_result = engine_data
-                elif engine_name == "chat_memory":
-                    memory_results = engine_data
+        parallel_cfg = context_cfg.parallel_execution
+        if parallel_cfg.enabled and parallel_cfg.soft_deadline:
+            soft_deadline = parallel_cfg.soft_deadline
+            if deadline is not None:
+                soft_deadline = deadline.timeout(soft_deadline)
+            results = await self._gather_until_soft_deadline(
+                source_tasks, soft_deadline, request_id
+            )
+        elif parallel_cfg.enabled:
+            results = await asyncio.gather(*source_tasks.values())
+        else:
+            results = []
+            for task in source_tasks.values():
+                results.append(await task)
+
+        # History has been awaited, and it awaited the summary lookup
+        summary_state = summary_task.result() if summary_task else None
+        summary: list[str] = [summary_state.summary] if summary_state else []
+
+        late_sources = [
+            name for name, (_, meta) in zip(source_tasks, results) if meta["status"] == "late"
+        ]
+        if late_sources:
+            metadata["late_sources"] = late_sources
+
+        for source_name, (source_data, source_meta) in zip(source_tasks, results):
+            metadata["engines"][source_name] = source_meta
+            if timer:
+                timer.record(
+                    "history_fetch" if source_name == "history" else f"context_engine.{source_name}",
+                    source_meta["latency_ms"] / 1000,
+                    status=source_meta["status"],
+                )
+            if source_name == "history":
+                recent_messages = source_data
+            elif source_name == "knowledge":
+                knowledge_results = source_data
+            elif source_name == "user_profile":
+                user_profile_result = source_data
+            elif source_name == "chat_memory":
+                memory_results = source_data
         if "knowledge" not in metadata["engines"]:
             metadata["engines"]["knowledge"] = {
                 "status": "skipped",
@@ -154,6 +219,20 @@ class ContextService:
                 "cache_hit": False,
             }
 
+        budget_start = time.perf_counter()
+        token_budget = self._apply_token_budget(
+            system_prompts,
+            recent_messages,
+            summary,
+            knowledge_results,
+            memory_results,
+            user_profile_result,
+            max_tokens,
+            tokenizer,
+        )
+        if timer:
+            timer.record("token_budget", time.perf_counter() - budget_start)
+
         bundle = ContextBundle(
             system_prompts=system_prompts,
             recent_messages=recent_messages,
@@ -161,24 +240,237 @@ class ContextService:
             retrieved_knowledge=knowledge_results,
             retrieved_memories=memory_results,
             user_profile=user_profile_result,
-            token_budget=self._apply_token_budget(
-                system_prompts,
-                recent_messages,
-                summary,
-                knowledge_results,
-                memory_results,
-                user_profile_result,
-                max_tokens,
-            ),
+            token_budget=token_budget,
             metadata=metadata,
         )
 
         return bundle
 
+    async def prefetch(
+        self,
+        user_id: str,
+        session_id: str,
+        personality: Personality,
+        query: str,
+        request_id: str | None = None,
+    ) -> dict[str, str]:
+        """Warm the caches the next build_context_bundle for this session reads.
+
+        Runs the same source calls as a real turn: the rolling summary and
+        history cache (a miss refills it from the database), the user profile
+        and, with the last reply as the query, a memory search. Returns the
+        status of each source.
+        """
+        config = self._get_config()
+        context_cfg = config.context
+        engines_cfg = config.engines
+        request_id = request_id or str(uuid.uuid4())
+        timeout = context_cfg.parallel_execution.timeout
+
+        summary_task = None
+        if context_cfg.summarization.enabled:
+            summary_task = asyncio.create_task(
+                self._load_summary(session_id, timeout, request_id, None)
+            )
+        system_prompts = (
+            [personality.system_prompt] if context_cfg.assembly.include_system_prompt else []
+        )
+
+        source_tasks = {
+            "history": self._call_history_after_summary(
+                summary_task,
+                context_cfg,
+                system_prompts,
+                None,
+                get_tokenizer(personality.ai.model),
+                session_id,
+                timeout,
+                request_id,
+            )
+        }
+        if context_cfg.assembly.include_user_profile and engines_cfg.user_profile.enabled:
+            source_tasks["user_profile"] = self._call_user_profile_engine(
+                user_id,
+                engines_cfg.user_profile.default_provider,
+                engines_cfg.user_profile.timeout,
+                timeout,
+                request_id,
+            )
+        if (
+            query
+            and context_cfg.assembly.include_chat_memory
+            and engines_cfg.chat_memory.enabled
+            and personality.memory.enabled
+        ):
+            source_tasks["chat_memory"] = self._call_chat_memory_engine(
+                query,
+                user_id,
+                session_id,
+                personality.memory.recall_top_k,
+                engines_cfg.chat_memory.default_provider,
+                engines_cfg.chat_memory.providers.get(engines_cfg.chat_memory.default_provider),
+                timeout,
+                request_id,
+            )
+
+        results = await asyncio.gather(*source_tasks.values())
+        statuses = {name: meta["status"] for name, (_, meta) in zip(source_tasks, results)}
+        logger.debug("Context prefetched", request_id=request_id, **statuses)
+        return statuses
+
+    @staticmethod
+    def _history_budget(
+        context_cfg,
+        system_prompts: list[str],
+        summary_state: SummaryState | None,
+        max_tokens: int | None,
+        tokenizer: Tokenizer,
+    ) -> int:
+        """Tokens history may use: what the prompt, summary and completion leave."""
+        reserve_for_completion = max_tokens or context_cfg.token_budget.reserve_for_completion
+        return max(
+            0,
+            context_cfg.token_budget.max_context_tokens
+            - reserve_for_completion
+            - sum(tokenizer.count(prompt) for prompt in system_prompts)
+            - (summary_state.token_count if summary_state else 0),
+        )
+
     def to_messages(self, bundle: ContextBundle, current_message: str) -> list[ChatMessage]:
         """Convert ContextBundle into AI engine messages."""
         return context_to_messages(bundle, current_message)
 
+    async def _gather_until_soft_deadline(
+        self,
+        source_tasks: dict,
+        soft_deadline: float,
+        request_id: str,
+    ) -> list[tuple]:
+        """Wait for context sources until the soft deadline, then go with what arrived.
+
+        History is required and is always awaited. Personalization engines
+        still running at the cutoff are reported as "late" with empty results;
+        they keep running in the background (bounded by their own timeouts)
+        and fill the engine caches, so the next turn gets their results.
+        """
+        start_time = time.time()
+        tasks = {name: asyncio.create_task(coro) for name, coro in source_tasks.items()}
+        await asyncio.wait(tasks.values(), timeout=soft_deadline)
+        await tasks["history"]
+
+        results = []
+        for name, task in tasks.items():
+            if task.done():
+                results.append(task.result())
+                continue
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            logger.info(
+                "Context source late, continuing in background",
+                request_id=request_id,
+                source=name,
+                soft_deadline=soft_deadline,
+            )
+            empty = (
+                UserProfileResult(profile_text="", token_size=0, metadata={})
+                if name == "user_profile"
+                else []
+            )
+            results.append(
+                (empty, self._build_engine_meta("late", start_time, "soft_deadline", False))
+            )
+        return results
+
+    async def _load_summary(
+        self,
+        session_id: str,
+        timeout: float,
+        request_id: str,
+        timer: PhaseTimer | None,
+    ) -> SummaryState | None:
+        start_time = time.perf_counter()
+        status = "ok"
+        try:
+            return await asyncio.wait_for(self.summarizer.load(session_id), timeout=timeout)
+        except Exception as e:
+            status = "degraded"
+            logger.warning(
+                "Session summary lookup failed",
+                request_id=request_id,
+                session_id=session_id,
+                error=str(e) or type(e).__name__,
+            )
+            return None
+        finally:
+            if timer:
+                timer.record("summary_lookup", time.perf_counter() - start_time, status=status)
+
+    async def _call_history_after_summary(
+        self,
+        summary_task: asyncio.Task | None,
+        context_cfg,
+        system_prompts: list[str],
+        max_tokens: int | None,
+        tokenizer: Tokenizer,
+        session_id: str,
+        timeout: float,
+        request_id: str,
+        deadline: Deadline | None = None,
+    ) -> tuple[list[ChatMessage], dict]:
+        """Read history after the summary watermark, within what the summary leaves.
+
+        The watermark is what lets the read stop early (and a hot cache cover
+        it), so this source waits for the summary lookup while the other
+        sources already run.
+        """
+        summary_state: SummaryState | None = await summary_task if summary_task else None
+        history_budget = self._history_budget(
+            context_cfg, system_prompts, summary_state, max_tokens, tokenizer
+        )
+        return await self._call_history(
+            session_id,
+            history_budget,
+            deadline.timeout(timeout) if deadline else timeout,
+            request_id,
+            after=summary_state.watermark if summary_state else None,
+        )
+
+    async def _call_history(
+        self,
+        session_id: str,
+        token_budget: int,
+        timeout: float,
+        request_id: str,
+        after: tuple[datetime, uuid.UUID] | None = None,
+    ) -> tuple[list[ChatMessage], dict]:
+        start_time = time.time()
+        try:
+            messages = await asyncio.wait_for(
+                self._fetch_recent_messages(
+                    session_id=session_id,
+                    token_budget=token_budget,
+                    request_id=request_id,
+                    after=after,
+                ),
+                timeout=timeout,
+            )
+            return messages, self._build_engine_meta("ok", start_time, None, False)
+        except TimeoutError:
+            logger.warning(
+                "Recent history fetch timeout",
+                request_id=request_id,
+                session_id=session_id,
+            )
+            return [], self._build_engine_meta("degraded", start_time, "timeout", False)
+        except Exception as e:
+            logger.warning(
+                "Recent history fetch failed",
+                request_id=request_id,
+                session_id=session_id,
+                error=str(e),
+            )
+            return [], self._build_engine_meta("degraded", start_time, "error", False)
+
     async def _call_knowledge_engine(
         self,
         query: str,
@@ -186,8 +478,11 @@ class ContextService:
         provider_config,
         timeout: float,
         request_id: str,
+        deadline: Deadline | None = None,
     ) -> tuple[list[KnowledgeItem], dict]:
         engine_timeout = provider_config.timeout if provider_config else timeout
+        if deadline is not None:
+            engine_timeout = deadline.timeout(engine_timeout)
         start_time = time.time()
         try:
             engine = await self.engine_registry.get_or_create_knowledge(
@@ -198,7 +493,7 @@ class ContextService:
                 timeout=engine_timeout,
             )
             return results, self._build_engine_meta("ok", start_time, None, False)
-        except asyncio.TimeoutError:
+        except TimeoutError:
             logger.warning(
                 "Knowledge engine timeout",
                 request_id=request_id,
@@ -221,8 +516,11 @@ class ContextService:
         provider_timeout: float,
         default_timeout: float,
         request_id: str,
+        deadline: Deadline | None = None,
     ) -> tuple[UserProfileResult, dict]:
         engine_timeout = provider_timeout or default_timeout
+        if deadline is not None:
+            engine_timeout = deadline.timeout(engine_timeout)
         start_time = time.time()
         try:
             engine = await self.engine_registry.get_or_create_user_profile(
@@ -237,7 +535,7 @@ class ContextService:
                 timeout=engine_timeout,
             )
             return result, self._build_engine_meta("ok", start_time, None, False)
-        except asyncio.TimeoutError:
+        except TimeoutError:
             logger.warning(
                 "User profile engine timeout",
                 request_id=request_id,
@@ -269,8 +567,11 @@ class ContextService:
         provider_config,
         timeout: float,
         request_id: str,
+        deadline: Deadline | None = None,
     ) -> tuple[list[MemoryItem], dict]:
         engine_timeout = provider_config.timeout if provider_config else timeout
+        if deadline is not None:
+            engine_timeout = deadline.timeout(engine_timeout)
         start_time = time.time()
         try:
             engine = await self.engine_registry.get_or_create_chat_memory(
@@ -286,7 +587,7 @@ class ContextService:
                 timeout=engine_timeout,
             )
             return results, self._build_engine_meta("ok", start_time, None, False)
-        except asyncio.TimeoutError:
+        except TimeoutError:
             logger.warning(
                 "Chat memory engine timeout",
                 request_id=request_id,
@@ -314,9 +615,28 @@ class ContextService:
     async def _fetch_recent_messages(
         self,
         session_id: str,
-        limit: int,
+        token_budget: int,
         request_id: str,
+        max_messages: int | None = None,
+        after: tuple[datetime, uuid.UUID] | None = None,
     ) -> list[ChatMessage]:
+        """Select the newest messages that fit in token_budget.
+
+        Walks newest-first pages of (id, role, token_count) and stops at the
+        first message that no longer fits, then loads content only for the
+        kept rows. Rows written before token_count existed are estimated from
+        the content length for selection and re-counted by the budget pass.
+        When after (a summary watermark) is given, only messages after it are
+        considered.
+
+        The session hot cache is consulted first; the database is only paged
+        when the cached messages do not cover the budget, and a miss backfills
+        the cache with what was read.
+        """
+        history_cfg = self._get_config().context.history
+        max_messages = max_messages or history_cfg.max_messages
+        page_size = min(history_cfg.page_size, max_messages)
+
         try:
             session_uuid = uuid.UUID(session_id)
         except ValueError:
@@ -328,20 +648,123 @@ class ContextService:
                 normalized_session_id=str(session_uuid),
             )
 
-        async with db_manager.session() as session:
-            result = await session.execute(
-                select(Message)
-                .where(Message.session_id == session_uuid)
-                .order_by(Message.created_at.desc())
-                .limit(limit)
+        snapshot = await self.history_cache.get(session_uuid)
+        # Taken before the pending snapshot: any write after this point bumps
+        # the cache version and makes the backfill a no-op.
+        fill_token = None if snapshot else await self.history_cache.begin_fill(session_uuid)
+
+        # Snapshot unflushed writes before querying so a batch committed
+        # mid-query is still seen; duplicates are dropped by message id.
+        pending = self.message_persister.pending_messages(session_uuid)
+
+        # message id -> [role, created_at, stored token_count, content or None]
+        selected: dict[uuid.UUID, list] = {}
+        used_tokens = 0
+
+        def take(message_id, role, created_at, token_count, estimate, content) -> bool:
+            nonlocal used_tokens
+            if message_id in selected:
+                return True
+            cost = token_count if token_count is not None else estimate
+            if len(selected) >= max_messages or used_tokens + cost > token_budget:
+                return False
+            used_tokens += cost
+            selected[message_id] = [role, created_at, token_count, content]
+            return True
+
+        head: list = list(pending)
+        cursor = None
+        covered = False
+        if snapshot is not None and snapshot.messages:
+            head.extend(snapshot.messages)
+            oldest = snapshot.messages[0]
+            cursor = (oldest.created_at, oldest.id)
+            covered = snapshot.complete or (
+                after is not None and (oldest.created_at, oldest.id) <= after
             )
-            records = list(result.scalars())
-
-        records.reverse()
-        messages = [
-            ChatMessage(role=record.role, content=record.content) for record in records
+        elif snapshot is not None:
+            covered = snapshot.complete
+        if after is not None:
+            head = [row for row in head if (row.created_at, row.id) > after]
+
+        budget_left = True
+        for row in sorted(head, key=lambda row: (row.created_at, row.id), reverse=True):
+            estimate = max(1, len(row.content) // 2)
+            if not take(row.id, row.role, row.created_at, row.token_count, estimate, row.content):
+                budget_left = False
+                break
+        if covered:
+            budget_left = False
+
+        exhausted = False
+        if budget_left:
+            async with db_manager.session() as session:
+                legacy_length = case(
+                    (Message.token_count.is_(None), func.length(Message.content)),
+                    else_=None,
+                )
+                while budget_left:
+                    query = (
+                        select(
+                            Message.id,
+                            Message.role,
+                            Message.created_at,
+                            Message.token_count,
+                            legacy_length.label("content_length"),
+                        )
+                        .where(Message.session_id == session_uuid)
+                        .order_by(Message.created_at.desc(), Message.id.desc())
+                        .limit(page_size)
+                    )
+                    if after is not None:
+                        query = query.where(
+                            or_(
+                                Message.created_at > after[0],
+                                and_(Message.created_at == after[0], Message.id > after[1]),
+                            )
+                        )
+                    if cursor is not None:
+                        query = query.where(
+                            or_(
+                                Message.created_at < cursor[0],
+                                and_(Message.created_at == cursor[0], Message.id < cursor[1]),
+                            )
+                        )
+                    rows = (await session.execute(query)).all()
+                    for row in rows:
+                        estimate = max(1, (row.content_length or 0) // 2)
+                        fits = take(row.id, row.role, row.created_at, row.token_count, estimate, None)
+                        if not fits:
+                            budget_left = False
+                            break
+                    if len(rows) < page_size:
+                        exhausted = budget_left
+                        break
+                    cursor = (rows[-1].created_at, rows[-1].id)
+
+                missing = [message_id for message_id, entry in selected.items() if entry[3] is None]
+                if missing:
+                    result = await session.execute(
+                        select(Message.id, Message.content).where(Message.id.in_(missing))
+                    )
+                    for message_id, content in result.all():
+                        selected[message_id][3] = content
+
+        ordered = sorted(selected.items(), key=lambda item: (item[1][1], item[0]))
+        if fill_token is not None:
+            await self.history_cache.fill(
+                session_uuid,
+                fill_token,
+                [
+                    CachedMessage(message_id, role, content or "", token_count, created_at)
+                    for message_id, (role, created_at, token_count, content) in ordered
+                ],
+                complete=exhausted and after is None,
+            )
+        return [
+            ChatMessage(role=role, content=content or "", token_count=token_count)
+            for _, (role, _, token_count, content) in ordered
         ]
-        return messages
 
     def _apply_token_budget(
         self,
@@ -352,19 +775,26 @@ class ContextService:
         memory_items: list[MemoryItem],
         user_profile: UserProfileResult | None,
         max_tokens: int | None,
+        tokenizer: Tokenizer | None = None,
     ) -> TokenBudget:
+        """Trim context sections to the budget.
+
+        History messages carry the token_count written at insert time, so
+        only non-persisted text is tokenized here (and that is memoized).
+        """
+        tokenizer = tokenizer or get_tokenizer()
         config = self._get_config()
         budget_cfg = config.context.token_budget
         reserve_for_completion = max_tokens or budget_cfg.reserve_for_completion
         max_context_tokens = budget_cfg.max_context_tokens
         available_context_tokens = max(0, max_context_tokens - reserve_for_completion)
 
-        system_tokens = sum(_estimate_tokens(text) for text in system_prompts)
-        recent_tokens = sum(_estimate_tokens(msg.content) for msg in recent_messages)
-        summary_tokens = sum(_estimate_tokens(text) for text in summary)
-        knowledge_tokens = sum(_estimate_tokens(item.content) for item in knowledge_items)
-        memory_tokens = sum(_estimate_tokens(item.content) for item in memory_items)
-        profile_tokens = _estimate_tokens(user_profile.profile_text) if user_profile else 0
+        system_tokens = sum(tokenizer.count(text) for text in system_prompts)
+        recent_tokens = sum(_message_tokens(msg, tokenizer) for msg in recent_messages)
+        summary_tokens = sum(tokenizer.count(text) for text in summary)
+        knowledge_tokens = sum(tokenizer.count(item.content) for item in knowledge_items)
+        memory_tokens = sum(tokenizer.count(item.content) for item in memory_items)
+        profile_tokens = tokenizer.count(user_profile.profile_text) if user_profile else 0
 
         used_tokens = (
             system_tokens
@@ -406,10 +836,25 @@ class ContextService:
 
         remaining_tokens = available_context_tokens - system_tokens
 
+        # The rolling summary stands in for every turn up to its watermark and
+        # history is only read after it, so it is budgeted together with
+        # history, ahead of personalization: dropping it would silently lose
+        # those turns. It is only cut when it alone overflows the window.
+        original_summary_count = len(summary)
+        summary[:] = _truncate_text_list(summary, remaining_tokens, tokenizer)
+        summary_tokens = sum(tokenizer.count(text) for text in summary)
+        remaining_tokens = max(0, remaining_tokens - summary_tokens)
+        if len(summary) < original_summary_count:
+            truncated = True
+            logger.warning(
+                "Session summary exceeds the context window and was dropped",
+                available_tokens=available_context_tokens - system_tokens,
+            )
+
         # Truncate recent messages (keep most recent that fit)
         original_recent_count = len(recent_messages)
-        recent_messages[:] = _truncate_messages(recent_messages, remaining_tokens)
-        recent_tokens = sum(_estimate_tokens(msg.content) for msg in recent_messages)
+        recent_messages[:] = _truncate_messages(recent_messages, remaining_tokens, tokenizer)
+        recent_tokens = sum(_message_tokens(msg, tokenizer) for msg in recent_messages)
         remaining_tokens = max(0, remaining_tokens - recent_tokens)
         if len(recent_messages) < original_recent_count:
             truncated = True
@@ -419,8 +864,8 @@ class ContextService:
         # Truncate user profile
         profile_text = user_profile.profile_text if user_profile else ""
         original_profile_len = len(profile_text)
-        profile_text = _truncate_text(profile_text, personalization_budget)
-        profile_tokens = _estimate_tokens(profile_text)
+        profile_text = _truncate_text(profile_text, personalization_budget, tokenizer)
+        profile_tokens = tokenizer.count(profile_text)
         if user_profile:
             user_profile.profile_text = profile_text
         if len(profile_text) < original_profile_len:
@@ -429,27 +874,20 @@ class ContextService:
 
         # Truncate knowledge items
         original_knowledge_count = len(knowledge_items)
-        knowledge_items[:] = _truncate_items(knowledge_items, personalization_budget)
-        knowledge_tokens = sum(_estimate_tokens(item.content) for item in knowledge_items)
+        knowledge_items[:] = _truncate_items(knowledge_items, personalization_budget, tokenizer)
+        knowledge_tokens = sum(tokenizer.count(item.content) for item in knowledge_items)
         personalization_budget = max(0, personalization_budget - knowledge_tokens)
         if len(knowledge_items) < original_knowledge_count:
             truncated = True
 
         # Truncate memory items
         original_memory_count = len(memory_items)
-        memory_items[:] = _truncate_items(memory_items, personalization_budget)
-        memory_tokens = sum(_estimate_tokens(item.content) for item in memory_items)
+        memory_items[:] = _truncate_items(memory_items, personalization_budget, tokenizer)
+        memory_tokens = sum(tokenizer.count(item.content) for item in memory_items)
         personalization_budget = max(0, personalization_budget - memory_tokens)
         if len(memory_items) < original_memory_count:
             truncated = True
 
-        # Truncate summary
-        original_summary_count = len(summary)
-        summary[:] = _truncate_text_list(summary, personalization_budget)
-        summary_tokens = sum(_estimate_tokens(text) for text in summary)
-        if len(summary) < original_summary_count:
-            truncated = True
-
         used_tokens = (
             system_tokens
             + recent_tokens
@@ -488,28 +926,25 @@ class ContextService:
         return self._config or get_config()
 
 
-def _estimate_tokens(text: str) -> int:
-    if not text:
-        return 0
-    return max(1, len(text) // 4)
+def _message_tokens(message: ChatMessage, tokenizer: Tokenizer) -> int:
+    if message.token_count is not None:
+        return message.token_count
+    return tokenizer.count(message.content)
 
 
-def _truncate_text(text: str, max_tokens: int) -> str:
+def _truncate_text(text: str, max_tokens: int, tokenizer: Tokenizer) -> str:
     if max_tokens <= 0:
         return ""
-    if _estimate_tokens(text) <= max_tokens:
-        return text
-    max_chars = max_tokens * 4
-    return text[:max_chars]
+    return tokenizer.truncate(text, max_tokens)
 
 
-def _truncate_text_list(items: list[str], max_tokens: int) -> list[str]:
+def _truncate_text_list(items: list[str], max_tokens: int, tokenizer: Tokenizer) -> list[str]:
     if max_tokens <= 0:
         return []
     kept: list[str] = []
     tokens_used = 0
     for item in items:
-        item_tokens = _estimate_tokens(item)
+        item_tokens = tokenizer.count(item)
         if tokens_used + item_tokens > max_tokens:
             break
         kept.append(item)
@@ -517,13 +952,13 @@ def _truncate_text_list(items: list[str], max_tokens: int) -> list[str]:
     return kept
 
 
-def _truncate_items(items: list, max_tokens: int) -> list:
+def _truncate_items(items: list, max_tokens: int, tokenizer: Tokenizer) -> list:
     if max_tokens <= 0:
         return []
     kept = []
     tokens_used = 0
     for item in items:
-        item_tokens = _estimate_tokens(item.content)
+        item_tokens = tokenizer.count(item.content)
         if tokens_used + item_tokens > max_tokens:
             break
         kept.append(item)
@@ -531,13 +966,15 @@ def _truncate_items(items: list, max_tokens: int) -> list:
     return kept
 
 
-def _truncate_messages(messages: list[ChatMessage], max_tokens: int) -> list[ChatMessage]:
+def _truncate_messages(
+    messages: list[ChatMessage], max_tokens: int, tokenizer: Tokenizer
+) -> list[ChatMessage]:
     if max_tokens <= 0:
         return []
     tokens_used = 0
     kept_reversed: list[ChatMessage] = []
     for message in reversed(messages):
-        message_tokens = _estimate_tokens(message.content)
+        message_tokens = _message_tokens(message, tokenizer)
         if tokens_used + message_tokens > max_tokens:
             break
         kept_reversed.append(message)
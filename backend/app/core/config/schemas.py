@@ -2,7 +2,7 @@
 
 from typing import Literal
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 # ============================================================================
@@ -46,12 +46,21 @@ class AppConfig(BaseModel):
 # ============================================================================
 
 
+class SSECoalesceConfig(BaseModel):
+    """Merge small upstream deltas into fewer SSE frames."""
+
+    enabled: bool = True
+    max_bytes: int = Field(default=256, ge=1, le=65536)  # flush once buffered text reaches this size
+    flush_interval_ms: int = Field(default=20, ge=1, le=1000)  # max time a delta waits in the buffer
+
+
 class SSEConfig(BaseModel):
     """Server-Sent Events configuration."""
 
     enabled: bool = True
     heartbeat_interval: int = Field(default=15, ge=1, le=300)
     max_timeout: int = Field(default=300, ge=10, le=3600)
+    coalesce: SSECoalesceConfig = Field(default_factory=SSECoalesceConfig)
 
 
 class APILimitsConfig(BaseModel):
@@ -69,6 +78,29 @@ class APIResponseConfig(BaseModel):
     include_timing: bool = False
 
 
+class APIIdempotencyConfig(BaseModel):
+    """Request coalescing and Idempotency-Key configuration."""
+
+    enabled: bool = True  # honour the Idempotency-Key header
+    coalesce_inflight: bool = True  # share one upstream call among identical in-flight requests
+    ttl: int = Field(default=300, ge=1, le=86400)  # seconds a completed keyed response is kept
+    key_prefix: str = "cozy:idem:"
+
+
+class APIDeadlineConfig(BaseModel):
+    """End-to-end request deadline configuration.
+
+    The deadline comes from the X-Request-Timeout header, then the personality's
+    ai.request_timeout, then default_timeout.
+    """
+
+    enabled: bool = True
+    default_timeout: float = Field(default=60.0, gt=0, le=3600)  # seconds
+    max_timeout: float = Field(default=300.0, gt=0, le=3600)  # upper bound for the header
+    context_share: float = Field(default=0.3, gt=0, le=1.0)  # of the remaining budget
+    min_llm_time: float = Field(default=2.0, ge=0, le=60)  # kept free after tool execution
+
+
 class APIConfig(BaseModel):
     """API configuration."""
 
@@ -77,6 +109,8 @@ class APIConfig(BaseModel):
     sse: SSEConfig = Field(default_factory=SSEConfig)
     limits: APILimitsConfig = Field(default_factory=APILimitsConfig)
     response: APIResponseConfig = Field(default_factory=APIResponseConfig)
+    idempotency: APIIdempotencyConfig = Field(default_factory=APIIdempotencyConfig)
+    deadline: APIDeadlineConfig = Field(default_factory=APIDeadlineConfig)
 
 
 # ============================================================================
@@ -93,11 +127,115 @@ class AIProviderConfig(BaseModel):
     max_tokens: int = Field(default=4096, ge=1, le=128000)
 
 
+class AIHttpClientConfig(BaseModel):
+    """Long-lived pooled HTTP client shared by all calls of one AI provider instance."""
+
+    max_connections: int = Field(default=100, ge=1, le=10000)
+    max_keepalive_connections: int = Field(default=20, ge=0, le=10000)
+    keepalive_expiry: float = Field(default=60.0, ge=0, le=3600)  # idle seconds before closing
+    connect_timeout: float = Field(default=5.0, gt=0, le=60)
+    read_timeout: float = Field(default=120.0, gt=0, le=3600)
+    pool_timeout: float = Field(default=10.0, gt=0, le=300)  # wait for a free connection
+    http2: bool = False  # requires the h2 package (httpx[http2])
+    prewarm_connections: int = Field(default=2, ge=0, le=100)  # opened in initialize()
+
+
+class CompletionCacheConfig(BaseModel):
+    """Exact-match completion cache configuration (personalities opt in)."""
+
+    enabled: bool = True
+    l1_max_entries: int = Field(default=1000, ge=1, le=100000)
+    key_prefix: str = "cozy:completion:"
+
+
+class AICircuitBreakerConfig(BaseModel):
+    """Sliding-window circuit breaker per provider + model, shared by all personalities."""
+
+    enabled: bool = True
+    window_seconds: float = Field(default=30.0, gt=0, le=3600)
+    min_calls: int = Field(default=10, ge=1, le=10000)  # calls in window before it can open
+    failure_rate_threshold: float = Field(default=0.5, gt=0, le=1.0)
+    open_seconds: float = Field(default=30.0, gt=0, le=3600)  # then half-open probes
+    half_open_max_calls: int = Field(default=1, ge=1, le=100)
+
+
+class AIRateLimitConfig(BaseModel):
+    """Client-side RPM/TPM governor for one provider key (a pair of token buckets)."""
+
+    enabled: bool = True
+    requests_per_minute: int | None = Field(default=None, ge=1, le=1_000_000)
+    tokens_per_minute: int | None = Field(default=None, ge=1, le=1_000_000_000)
+    max_wait_seconds: float = Field(default=10.0, ge=0, le=300)  # queued admission bound
+    shared: bool = True  # keep buckets in Redis so all workers share one limit
+    key_prefix: str = "cozy:ratelimit:"
+
+
+class AIConcurrencyConfig(BaseModel):
+    """Adaptive (gradient) concurrency limit per provider key."""
+
+    enabled: bool = True
+    initial_limit: int = Field(default=20, ge=1, le=10000)
+    min_limit: int = Field(default=2, ge=1, le=10000)
+    max_limit: int = Field(default=200, ge=1, le=10000)
+    rtt_tolerance: float = Field(default=1.5, ge=1.0, le=10.0)  # latency rise tolerated
+    smoothing: float = Field(default=0.2, gt=0, le=1.0)
+    backoff_ratio: float = Field(default=0.9, gt=0, lt=1.0)  # on 429 / 5xx / timeouts
+    max_queue: int = Field(default=50, ge=0, le=10000)  # waiting callers before shedding
+    queue_timeout_seconds: float = Field(default=2.0, ge=0, le=60)
+
+    @model_validator(mode="after")
+    def validate_limits(self) -> "AIConcurrencyConfig":
+        if not self.min_limit <= self.initial_limit <= self.max_limit:
+            raise ValueError("Concurrency limits must satisfy min <= initial <= max")
+        return self
+
+
+class UpstreamEndpointConfig(BaseModel):
+    """One API key / OpenAI-compatible gateway in an upstream pool."""
+
+    name: str
+    base_url: str = "https://api.openai.com/v1"
+    api_key_env: str = "OPENAI_API_KEY"  # environment variable holding the key
+    weight: float = Field(default=1.0, gt=0, le=1000)
+    max_concurrency: int = Field(default=64, ge=1, le=10000)  # outstanding requests cap
+    rate_limit: AIRateLimitConfig | None = None  # this key's limits (default: provider's)
+
+
+class OutlierEjectionConfig(BaseModel):
+    """Passive outlier ejection on 429 / 5xx / connection errors."""
+
+    consecutive_failures: int = Field(default=3, ge=1, le=100)
+    base_ejection_seconds: float = Field(default=30.0, gt=0, le=3600)  # grows per ejection
+    max_ejection_seconds: float = Field(default=300.0, gt=0, le=86400)
+    max_ejection_percent: int = Field(default=50, ge=0, le=100)  # of the pool's endpoints
+
+
+class UpstreamPoolConfig(BaseModel):
+    """Several endpoints behind one provider, balanced by weighted least-outstanding."""
+
+    endpoints: list[UpstreamEndpointConfig] = Field(default_factory=list)
+    ejection: OutlierEjectionConfig = Field(default_factory=OutlierEjectionConfig)
+
+    @field_validator("endpoints")
+    @classmethod
+    def validate_unique_names(cls, v: list[UpstreamEndpointConfig]) -> list:
+        names = [endpoint.name for endpoint in v]
+        if len(names) != len(set(names)):
+            raise ValueError("Upstream endpoint names must be unique")
+        return v
+
+
 class AIEngineConfig(BaseModel):
     """AI engine configuration."""
 
     default_provider: str = "openai"
     providers: dict[str, AIProviderConfig] = Field(default_factory=dict)
+    completion_cache: CompletionCacheConfig = Field(default_factory=CompletionCacheConfig)
+    http_client: AIHttpClientConfig = Field(default_factory=AIHttpClientConfig)
+    upstreams: dict[str, UpstreamPoolConfig] = Field(default_factory=dict)  # by provider
+    circuit_breaker: AICircuitBreakerConfig = Field(default_factory=AICircuitBreakerConfig)
+    rate_limits: dict[str, AIRateLimitConfig] = Field(default_factory=dict)  # by provider
+    concurrency: AIConcurrencyConfig = Field(default_factory=AIConcurrencyConfig)
 
     @field_validator("providers")
     @classmethod
@@ -156,6 +294,22 @@ class ToolsEngineConfig(BaseModel):
     max_iterations: int = Field(default=5, ge=1, le=20)
 
 
+class HedgingConfig(BaseModel):
+    """Hedged reads for remote knowledge / memory / profile engines.
+
+    A duplicate read is sent once the primary call has run longer than the
+    engine's rolling latency quantile; the first response wins.
+    """
+
+    enabled: bool = False
+    quantile: float = Field(default=0.9, gt=0, lt=1)  # hedge delay = rolling latency quantile
+    min_delay: float = Field(default=0.02, ge=0, le=10.0)  # seconds
+    max_delay: float = Field(default=1.0, gt=0, le=30.0)  # seconds
+    window: int = Field(default=200, ge=10, le=10000)  # latency samples kept per engine
+    min_samples: int = Field(default=20, ge=1, le=10000)  # no hedging until warmed up
+    budget_ratio: float = Field(default=0.1, ge=0, le=1.0)  # max extra load from hedges
+
+
 class EnginesConfig(BaseModel):
     """Engines configuration."""
 
@@ -164,6 +318,7 @@ class EnginesConfig(BaseModel):
     user_profile: UserProfileEngineConfig = Field(default_factory=UserProfileEngineConfig)
     chat_memory: ChatMemoryEngineConfig = Field(default_factory=ChatMemoryEngineConfig)
     tools: ToolsEngineConfig = Field(default_factory=ToolsEngineConfig)
+    hedging: HedgingConfig = Field(default_factory=HedgingConfig)
 
 
 # ============================================================================
@@ -179,12 +334,57 @@ class TokenBudgetConfig(BaseModel):
     personalization_budget: int = Field(default=10000, ge=100, le=100000)
 
 
+class HistoryCacheConfig(BaseModel):
+    """Per-session hot history cache (in-process L1 + Redis L2)."""
+
+    enabled: bool = True
+    capacity: int = Field(default=100, ge=1, le=5000)  # newest messages kept per session
+    l1_max_sessions: int = Field(default=1000, ge=1, le=100000)
+    ttl: int = Field(default=3600, ge=60, le=604800)  # idle sessions fall back to the database
+    key_prefix: str = "cozy:history:"
+
+
+class HistoryConfig(BaseModel):
+    """Recent-history selection configuration."""
+
+    page_size: int = Field(default=50, ge=1, le=500)  # metadata rows fetched per round trip
+    max_messages: int = Field(default=200, ge=1, le=5000)  # hard cap regardless of budget
+    cache: HistoryCacheConfig = Field(default_factory=HistoryCacheConfig)
+
+
+class SummarizationConfig(BaseModel):
+    """Rolling conversation summary configuration."""
+
+    enabled: bool = True
+    keep_recent_messages: int = Field(default=20, ge=2, le=1000)  # never folded into the summary
+    min_batch_messages: int = Field(default=10, ge=1, le=1000)  # fold only when this many are due
+    max_batch_messages: int = Field(default=100, ge=1, le=2000)  # per worker task
+    max_summary_tokens: int = Field(default=512, ge=64, le=8192)
+    debounce_seconds: int = Field(default=30, ge=0, le=3600)  # at most one queued task per window
+    cache_ttl: int = Field(default=3600, ge=0, le=86400)  # Redis cache of the summary row
+    queue_name: str = "cozy:queue:summary_updates"
+    key_prefix: str = "cozy:summary:"
+
+
+class PrefetchConfig(BaseModel):
+    """Next-turn context prefetch, run by the async worker after each response."""
+
+    enabled: bool = True
+    user_interval_seconds: int = Field(default=30, ge=0, le=3600)  # at most one per user per window
+    max_query_chars: int = Field(default=1000, ge=1, le=20000)  # reply prefix used as memory query
+    queue_name: str = "cozy:queue:context_prefetch"
+    key_prefix: str = "cozy:prefetch:"
+
+
 class ParallelExecutionConfig(BaseModel):
     """Parallel execution configuration."""
 
     enabled: bool = True
     max_workers: int = Field(default=3, ge=1, le=10)
     timeout: float = Field(default=10.0, ge=1.0, le=60.0)
+    # Start generation once this many seconds have passed, with whatever
+    # context has arrived; late engines finish in the background. 0 = wait for all
+    soft_deadline: float = Field(default=0.0, ge=0.0, le=60.0)
 
 
 class DegradationConfig(BaseModel):
@@ -209,6 +409,9 @@ class ContextConfig(BaseModel):
     """Context management configuration."""
 
     token_budget: TokenBudgetConfig = Field(default_factory=TokenBudgetConfig)
+    history: HistoryConfig = Field(default_factory=HistoryConfig)
+    summarization: SummarizationConfig = Field(default_factory=SummarizationConfig)
+    prefetch: PrefetchConfig = Field(default_factory=PrefetchConfig)
     parallel_execution: ParallelExecutionConfig = Field(default_factory=ParallelExecutionConfig)
     degradation: DegradationConfig = Field(default_factory=DegradationConfig)
     assembly: ContextAssemblyConfig = Field(default_factory=ContextAssemblyConfig)
@@ -260,6 +463,21 @@ class ToolsLimitsConfig(BaseModel):
     max_calls_per_minute: int = Field(default=10, ge=1, le=1000)
 
 
+class ToolCacheOverrideConfig(BaseModel):
+    """Per-tool result cache override."""
+
+    ttl: float = Field(default=0.0, ge=0.0, le=86400.0)
+    max_entries: int = Field(default=256, ge=1, le=100000)
+    scope: Literal["global", "user"] = "global"
+
+
+class ToolsCacheConfig(BaseModel):
+    """Tool result cache configuration."""
+
+    enabled: bool = True
+    tools: dict[str, ToolCacheOverrideConfig] = Field(default_factory=dict)
+
+
 class ToolsConfig(BaseModel):
     """Tools configuration."""
 
@@ -268,6 +486,7 @@ class ToolsConfig(BaseModel):
     audit: ToolsAuditConfig = Field(default_factory=ToolsAuditConfig)
     mcp: MCPConfig = Field(default_factory=MCPConfig)
     limits: ToolsLimitsConfig = Field(default_factory=ToolsLimitsConfig)
+    cache: ToolsCacheConfig = Field(default_factory=ToolsCacheConfig)
 
 
 # ============================================================================
@@ -312,11 +531,25 @@ class RedisConfig(BaseModel):
     queue: RedisQueueConfig = Field(default_factory=RedisQueueConfig)
 
 
+class WriteBehindConfig(BaseModel):
+    """Message write-behind persistence configuration."""
+
+    enabled: bool = True
+    flush_interval_ms: int = Field(default=50, ge=1, le=10000)
+    max_batch_rows: int = Field(default=200, ge=1, le=10000)
+    max_buffer_rows: int = Field(default=10000, ge=10, le=1000000)
+    redis_journal: bool = False
+    journal_key: str = "cozy:journal:messages"
+    shutdown_timeout: float = Field(default=10.0, ge=0.1, le=300.0)
+    max_flush_retries: int = Field(default=5, ge=0, le=100)  # before isolating bad rows
+
+
 class StorageConfig(BaseModel):
     """Storage configuration."""
 
     database: DatabaseConfig = Field(default_factory=DatabaseConfig)
     redis: RedisConfig = Field(default_factory=RedisConfig)
+    write_behind: WriteBehindConfig = Field(default_factory=WriteBehindConfig)
 
 
 # ============================================================================
@@ -425,6 +658,18 @@ class AuthorizationConfig(BaseModel):
     default_role: str = "user"
 
 
+class AuditSinkConfig(BaseModel):
+    """Batched audit sink configuration."""
+
+    enabled: bool = True
+    flush_interval_ms: int = Field(default=200, ge=1, le=60000)
+    max_batch_events: int = Field(default=500, ge=1, le=10000)
+    max_queue_events: int = Field(default=10000, ge=10, le=1000000)
+    overflow_policy: Literal["drop_oldest", "spill_redis"] = "drop_oldest"
+    spill_key: str = "cozy:audit:spill"
+    shutdown_timeout: float = Field(default=10.0, ge=0.1, le=300.0)
+
+
 class SecurityAuditConfig(BaseModel):
     """Security audit configuration."""
 
@@ -433,6 +678,7 @@ class SecurityAuditConfig(BaseModel):
     log_mutations: bool = True
     log_tool_calls: bool = True
     log_failed_auth: bool = True
+    sink: AuditSinkConfig = Field(default_factory=AuditSinkConfig)
 
 
 class RateLimitingConfig(BaseModel):
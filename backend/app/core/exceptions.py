@@ -86,6 +86,30 @@ class ExternalServiceError(CozyEngineError):
         )
 
 
+class DeadlineExceededError(CozyEngineError):
+    """请求截止时间已到"""
+
+    def __init__(self, stage: str):
+        super().__init__(
+            message=f"Request deadline exceeded during {stage}",
+            code="DEADLINE_EXCEEDED",
+            status_code=504,
+            details={"stage": stage},
+        )
+
+
+class ServiceOverloadedError(CozyEngineError):
+    """上游并发已满，请求被提前拒绝（可稍后重试）"""
+
+    def __init__(self, service: str, reason: str, retry_after: float = 1.0):
+        super().__init__(
+            message=f"{service}: overloaded ({reason}), retry later",
+            code="SERVICE_OVERLOADED",
+            status_code=503,
+            details={"reason": reason, "retry_after_seconds": retry_after},
+        )
+
+
 class ConfigurationError(CozyEngineError):
     """配置错误"""
 
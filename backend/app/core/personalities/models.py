@@ -11,6 +11,14 @@ from app.observability.logging import get_logger
 logger = get_logger(__name__)
 
 
+@dataclass
+class PersonalityFallback:
+    """备用提供商 / 模型（主提供商熔断或失败时按顺序尝试）"""
+
+    provider: str
+    model: str
+
+
 @dataclass
 class PersonalityAI:
     """AI 配置"""
@@ -20,6 +28,8 @@ class PersonalityAI:
     temperature: float = 0.7
     max_tokens: int = 2000
     top_p: float = 1.0
+    request_timeout: float | None = None  # 秒；请求未携带 X-Request-Timeout 时的截止时间
+    fallbacks: list[PersonalityFallback] = field(default_factory=list)
 
 
 @dataclass
@@ -38,6 +48,15 @@ class PersonalityMemory:
     recall_top_k: int = 5
 
 
+@dataclass
+class PersonalityCache:
+    """补全缓存配置（完全相同的请求直接返回缓存响应）"""
+
+    enabled: bool = False
+    ttl: int = 300  # 秒
+    max_temperature: float = 0.0  # 仅缓存温度不高于该值的确定性请求
+
+
 @dataclass
 class Personality:
     """人格定义"""
@@ -49,6 +68,7 @@ class Personality:
     ai: PersonalityAI
     tools: PersonalityTools = field(default_factory=PersonalityTools)
     memory: PersonalityMemory = field(default_factory=PersonalityMemory)
+    cache: PersonalityCache = field(default_factory=PersonalityCache)
     metadata: dict[str, Any] = field(default_factory=dict)
 
     @classmethod
@@ -62,6 +82,11 @@ class Personality:
                 temperature=ai_config.get("temperature", 0.7),
                 max_tokens=ai_config.get("max_tokens", 2000),
                 top_p=ai_config.get("top_p", 1.0),
+                request_timeout=ai_config.get("request_timeout"),
+                fallbacks=[
+                    PersonalityFallback(provider=item["provider"], model=item["model"])
+                    for item in ai_config.get("fallbacks", [])
+                ],
             )
 
             tools_config = data.get("tools", {})
@@ -76,6 +101,13 @@ class Personality:
                 recall_top_k=memory_config.get("recall_top_k", 5),
             )
 
+            cache_config = data.get("cache", {})
+            cache = PersonalityCache(
+                enabled=cache_config.get("enabled", False),
+                ttl=cache_config.get("ttl", 300),
+                max_temperature=cache_config.get("max_temperature", 0.0),
+            )
+
             return cls(
                 id=data.get("id", ""),
                 name=data.get("name", ""),
@@ -84,6 +116,7 @@ class Personality:
                 ai=ai,
                 tools=tools,
                 memory=memory,
+                cache=cache,
                 metadata=data.get("metadata", {}),
             )
         except KeyError as e:
@@ -103,6 +136,11 @@ class Personality:
                 "temperature": self.ai.temperature,
                 "max_tokens": self.ai.max_tokens,
                 "top_p": self.ai.top_p,
+                "request_timeout": self.ai.request_timeout,
+                "fallbacks": [
+                    {"provider": fallback.provider, "model": fallback.model}
+                    for fallback in self.ai.fallbacks
+                ],
             },
             "tools": {
                 "enabled": self.tools.enabled,
@@ -112,6 +150,11 @@ class Personality:
                 "enabled": self.memory.enabled,
                 "recall_top_k": self.memory.recall_top_k,
             },
+            "cache": {
+                "enabled": self.cache.enabled,
+                "ttl": self.cache.ttl,
+                "max_temperature": self.cache.max_temperature,
+            },
             "metadata": self.metadata,
         }
 
@@ -1,11 +1,16 @@
 """AI 引擎 - 接口定义"""
 
+import asyncio
+import json
 from abc import ABC, abstractmethod
 from collections.abc import AsyncGenerator
 from dataclasses import dataclass
 
 import httpx
 
+from app.core.config.schemas import AIHttpClientConfig
+from app.engines.ai.http_pool import create_http_client
+
 
 @dataclass
 class ChatMessage:
@@ -15,6 +20,7 @@ class ChatMessage:
     content: str
     tool_calls: dict | list[dict] | None = None  # For assistant role with tool calls
     tool_call_id: str | None = None  # For tool role responses
+    token_count: int | None = None  # 已知的 token 数（持久化时写入），用于预算时免重复分词
 
 
 @dataclass
@@ -27,6 +33,99 @@ class ChatResponse:
     tool_calls: list[dict] | None = None
 
 
+class ToolCallAssembler:
+    """流式 tool_calls 增量拼装
+
+    OpenAI 按 index 顺序逐个下发工具调用片段：id/name 在首个片段，arguments 分片追加。
+    参数拼成完整 JSON 对象、出现下一个 index 或流结束时，即认为该调用已完整。
+    """
+
+    def __init__(self):
+        self._calls: dict[int, dict] = {}
+        self._emitted: set[int] = set()
+
+    @property
+    def has_calls(self) -> bool:
+        return bool(self._calls)
+
+    @property
+    def tool_calls(self) -> list[dict]:
+        return [self._calls[index] for index in sorted(self._calls)]
+
+    def feed(
+        self,
+        index: int,
+        call_id: str | None = None,
+        name: str | None = None,
+        arguments: str | None = None,
+    ) -> list[dict]:
+        """追加一个片段，返回因此变为完整的工具调用"""
+        completed = [
+            self._emit(earlier)
+            for earlier in sorted(self._calls)
+            if earlier < index and earlier not in self._emitted
+        ]
+
+        call = self._calls.setdefault(
+            index, {"id": "", "function": {"name": "", "arguments": ""}}
+        )
+        if call_id:
+            call["id"] = call_id
+        if name:
+            call["function"]["name"] += name
+        if arguments:
+            call["function"]["arguments"] += arguments
+
+        if index not in self._emitted and call["id"] and _is_complete_json_object(
+            call["function"]["arguments"]
+        ):
+            completed.append(self._emit(index))
+        return completed
+
+    def finish(self) -> list[dict]:
+        """流结束：返回尚未发出的工具调用"""
+        return [self._emit(index) for index in sorted(self._calls) if index not in self._emitted]
+
+    def _emit(self, index: int) -> dict:
+        self._emitted.add(index)
+        return self._calls[index]
+
+
+def _is_complete_json_object(text: str) -> bool:
+    if not text.rstrip().endswith("}"):
+        return False
+    try:
+        return isinstance(json.loads(text), dict)
+    except ValueError:
+        return False
+
+
+def _to_openai_messages(messages: list[ChatMessage]) -> list[dict]:
+    """转换为 OpenAI 消息格式（保留 assistant tool_calls 与 tool 消息的 tool_call_id）"""
+    openai_messages = []
+    for msg in messages:
+        item: dict = {"role": msg.role, "content": msg.content}
+        if msg.tool_calls:
+            tool_calls = msg.tool_calls if isinstance(msg.tool_calls, list) else [msg.tool_calls]
+            item["tool_calls"] = [
+                {
+                    "id": tool_call.get("id"),
+                    "type": tool_call.get("type", "function"),
+                    "function": tool_call.get("function", {}),
+                }
+                for tool_call in tool_calls
+            ]
+        if msg.tool_call_id:
+            item["tool_call_id"] = msg.tool_call_id
+        openai_messages.append(item)
+    return openai_messages
+
+
+def _to_openai_tools(tools: list[dict]) -> list[dict]:
+    """工具定义已是 OpenAI tools schema 时原样传递，否则按 function 包装"""
+    return [tool if "type" in tool else {"type": "function", "function": tool} for tool in tools]
+
+
 class AIEngine(ABC):
     """AI 引擎基类"""
 
@@ -81,45 +180,90 @@ class AIEngine(ABC):
 
 
 class OpenAIProvider(AIEngine):
-    """OpenAI 提供商"""
+    """OpenAI 提供商
+
+    每个实例持有一个长连接 HTTP 客户端（initialize 创建、close 关闭），
+    所有 chat / chat_stream / health_check 调用共享同一连接池。
+    """
 
     def __init__(
         self,
         api_key: str,
         base_url: str = "https://api.openai.com/v1",
         model: str = "gpt-4",
+        http_config: AIHttpClientConfig | None = None,
+        pool_label: str | None = None,
     ):
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
+        self.pool_label = pool_label or f"openai:{model}"
         self.client = None
+        self.http_client: httpx.AsyncClient | None = None
+        self.http_config = http_config
         self._initialized = False
 
     async def initialize(self) -> None:
-        """初始化 OpenAI 客户端"""
+        """初始化 OpenAI 客户端（长连接池）并预热连接"""
         if self._initialized:
             return
 
+        import openai
+
         from app.observability.logging import get_logger
 
         logger = get_logger(__name__)
         logger.info("Initializing OpenAI provider", base_url=self.base_url)
+
+        http_config = self.http_config
+        if http_config is None:
+            try:
+                from app.core.config.manager import get_config
+
+                http_config = get_config().engines.ai.http_client
+            except Exception:
+                http_config = AIHttpClientConfig()
+        self.http_client = create_http_client(http_config, pool_label=self.pool_label)
+        self.client = openai.AsyncOpenAI(
+            api_key=self.api_key, base_url=self.base_url, http_client=self.http_client
+        )
         self._initialized = True
+        if http_config.prewarm_connections:
+            await self._prewarm(http_config.prewarm_connections)
+
+    async def _prewarm(self, connections: int) -> None:
+        """并发发起轻量请求，提前完成 TCP + TLS 握手；失败不影响启动"""
+        results = await asyncio.gather(
+            *(self.health_check() for _ in range(connections)), return_exceptions=True
+        )
+        if not any(result is True for result in results):
+            from app.observability.logging import get_logger
+
+            get_logger(__name__).warning(
+                "OpenAI connection prewarm failed", base_url=self.base_url
+            )
 
     async def health_check(self) -> bool:
         """健康检查 - 检查 API 连接"""
+        if self.http_client is None:
+            await self.initialize()
         try:
-            async with httpx.AsyncClient(
-                base_url=self.base_url, headers={"Authorization": f"Bearer {self.api_key}"}
-            ) as client:
-                response = await client.get("/models", timeout=5.0)
-                return response.status_code == 200
+            response = await self.http_client.get(
+                f"{self.base_url.rstrip('/')}/models",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=5.0,
+            )
+            return response.status_code == 200
         except Exception:
             return False
 
     async def close(self) -> None:
-        """关闭连接"""
-        pass
+        """关闭连接池"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        self.http_client = None
+        self.client = None
+        self._initialized = False
 
     async def chat(
         self,
@@ -131,14 +275,12 @@ class OpenAIProvider(AIEngine):
     ) -> ChatResponse:
         """非流式聊天"""
         try:
-            import openai
-
-            client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+            if self.client is None:
+                await self.initialize()
+            client = self.client
 
             # 转换消息格式
-            openai_messages = [
-                {"role": msg.role, "content": msg.content} for msg in messages
-            ]
+            openai_messages = _to_openai_messages(messages)
 
             kwargs = {
                 "model": self.model,
@@ -149,7 +291,7 @@ class OpenAIProvider(AIEngine):
             }
 
             if tools:
-                kwargs["tools"] = [{"type": "function", "function": t} for t in tools]
+                kwargs["tools"] = _to_openai_tools(tools)
 
             response = await client.chat.completions.create(**kwargs)
 
@@ -190,14 +332,12 @@ class OpenAIProvider(AIEngine):
     ):
         """流式聊天"""
         try:
-            import openai
-
-            client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+            if self.client is None:
+                await self.initialize()
+            client = self.client
 
             # 转换消息格式
-            openai_messages = [
-                {"role": msg.role, "content": msg.content} for msg in messages
-            ]
+            openai_messages = _to_openai_messages(messages)
 
             kwargs = {
                 "model": self.model,
@@ -209,17 +349,41 @@ class OpenAIProvider(AIEngine):
             }
 
             if tools:
-                kwargs["tools"] = [{"type": "function", "function": t} for t in tools]
+                kwargs["tools"] = _to_openai_tools(tools)
 
             stream = await client.chat.completions.create(**kwargs)
 
+            assembler = ToolCallAssembler()
             async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta:
-                    delta = chunk.choices[0].delta
-                    yield {
-                        "content": delta.content or "",
-                        "finish_reason": chunk.choices[0].finish_reason,
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta
+
+                # 工具调用参数完整后立即单独发出，调用方可在流结束前开始执行
+                if delta and delta.tool_calls:
+                    for fragment in delta.tool_calls:
+                        function = fragment.function
+                        for tool_call in assembler.feed(
+                            index=fragment.index,
+                            call_id=fragment.id,
+                            name=function.name if function else None,
+                            arguments=function.arguments if function else None,
+                        ):
+                            yield {"content": "", "finish_reason": None, "tool_call": tool_call}
+
+                if choice.finish_reason and assembler.has_calls:
+                    for tool_call in assembler.finish():
+                        yield {"content": "", "finish_reason": None, "tool_call": tool_call}
+
+                if delta or choice.finish_reason:
+                    event = {
+                        "content": (delta.content if delta else None) or "",
+                        "finish_reason": choice.finish_reason,
                     }
+                    if choice.finish_reason and assembler.has_calls:
+                        event["tool_calls"] = assembler.tool_calls
+                    yield event
         except Exception as e:
             from app.core.exceptions import ExternalServiceError
 
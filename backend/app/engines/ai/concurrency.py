@@ -0,0 +1,224 @@
+"""自适应并发限制 - 按观测到的延迟与错误调整上游 AI 调用的并发上限
+
+梯度算法（gradient2 风格）：长期 RTT 基线缓慢跟踪，单次 RTT 明显高于基线
+（超出 rtt_tolerance）时按比例收缩上限，否则以 sqrt(limit) 的余量增长；
+429 / 5xx / 超时（包括在拿到响应或首个 chunk 之前被取消）按 backoff_ratio 乘性减小（AIMD）。
+非流式调用的样本为完整耗时，流式调用为首个 chunk 的耗时（输出长度不影响样本）。
+
+超出上限的调用进入短队列等待，队列已满或等待超时则以可重试的 503 提前拒绝，
+保护事件循环和上游服务。
+"""
+
+import asyncio
+import contextlib
+import math
+import time
+from collections import deque
+
+from app.core.config.schemas import AIConcurrencyConfig
+from app.core.exceptions import ServiceOverloadedError
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.engines.ai.upstream import is_endpoint_failure
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+
+logger = get_logger(__name__)
+
+concurrency_limit = metrics.gauge("ai_concurrency_limit", "Adaptive AI concurrency limit")
+concurrency_inflight = metrics.gauge("ai_concurrency_inflight", "AI calls currently in flight")
+concurrency_queue_depth = metrics.gauge(
+    "ai_concurrency_queue_depth", "AI calls waiting for a concurrency slot"
+)
+concurrency_shed = metrics.counter(
+    "ai_concurrency_shed_total", "AI calls rejected by the adaptive concurrency limiter"
+)
+
+# RTT 基线的平滑系数（长期均值，变化远慢于上限本身）
+_LONG_RTT_SMOOTHING = 0.05
+
+
+class AdaptiveConcurrencyLimiter:
+    """一个提供商密钥的自适应并发上限与等待队列"""
+
+    def __init__(self, name: str, config: AIConcurrencyConfig):
+        self.name = name
+        self.config = config
+        self.limit = float(config.initial_limit)
+        self.inflight = 0
+        self.long_rtt: float | None = None
+        self._waiters: deque[asyncio.Future] = deque()
+        self._publish()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self) -> None:
+        """占用一个并发名额；队列已满或等待超时抛出 ServiceOverloadedError"""
+        if self.inflight < int(self.limit) and not self.queue_depth:
+            self.inflight += 1
+            self._publish()
+            return
+        if self.queue_depth >= self.config.max_queue:
+            self._shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.config.queue_timeout_seconds)
+        except TimeoutError:
+            self._discard(waiter)
+            self._shed("queue_timeout")
+        except asyncio.CancelledError:
+            # 名额已交给本调用但调用方被取消：归还名额
+            if waiter.done() and not waiter.cancelled():
+                self.inflight -= 1
+                self._wake()
+            self._discard(waiter)
+            raise
+
+    def release(self, rtt: float | None = None, dropped: bool = False) -> None:
+        """归还名额并更新上限：dropped 表示上游过载类失败，rtt 为成功调用的耗时"""
+        self.inflight -= 1
+        if dropped:
+            self.limit = max(self.config.min_limit, self.limit * self.config.backoff_ratio)
+        elif rtt is not None and rtt > 0:
+            self._update(rtt)
+        self._wake()
+
+    def _update(self, rtt: float) -> None:
+        if self.long_rtt is None:
+            self.long_rtt = rtt
+        else:
+            self.long_rtt += (rtt - self.long_rtt) * _LONG_RTT_SMOOTHING
+            # 上游恢复后延迟远低于基线时加速回落，避免长时间放任排队
+            if self.long_rtt > rtt * 2:
+                self.long_rtt *= 0.95
+
+        gradient = max(0.5, min(1.0, self.config.rtt_tolerance * self.long_rtt / rtt))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        # 未用到一半名额时不增长：低负载下的低延迟不能说明上游能承受更高并发
+        if new_limit > self.limit and (self.inflight + 1) * 2 < self.limit:
+            return
+        smoothing = self.config.smoothing
+        self.limit = min(
+            self.config.max_limit,
+            max(self.config.min_limit, self.limit * (1 - smoothing) + new_limit * smoothing),
+        )
+
+    def _wake(self) -> None:
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.inflight += 1
+            waiter.set_result(None)
+        self._publish()
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        with contextlib.suppress(ValueError):
+            self._waiters.remove(waiter)
+        self._publish()
+
+    def _shed(self, reason: str) -> None:
+        concurrency_shed.inc(key=self.name, reason=reason)
+        logger.warning(
+            "AI call shed by concurrency limiter",
+            key=self.name,
+            reason=reason,
+            limit=int(self.limit),
+            inflight=self.inflight,
+        )
+        raise ServiceOverloadedError(
+            self.name, reason, retry_after=max(1.0, self.long_rtt or 1.0)
+        )
+
+    def _publish(self) -> None:
+        concurrency_limit.set(int(self.limit), key=self.name)
+        concurrency_inflight.set(self.inflight, key=self.name)
+        concurrency_queue_depth.set(self.queue_depth, key=self.name)
+
+
+class ConcurrencyLimitedEngine(AIEngine):
+    """在 AI 引擎前加一层自适应并发限制，对编排器透明"""
+
+    def __init__(self, engine: AIEngine, limiter: AdaptiveConcurrencyLimiter):
+        self.engine = engine
+        self.limiter = limiter
+        self.model = getattr(engine, "model", None)
+
+    async def initialize(self) -> None:
+        await self.engine.initialize()
+
+    async def health_check(self) -> bool:
+        return await self.engine.health_check()
+
+    async def close(self) -> None:
+        await self.engine.close()
+
+    @property
+    def supports_tools(self) -> bool:
+        return self.engine.supports_tools
+
+    @property
+    def supports_vision(self) -> bool:
+        return self.engine.supports_vision
+
+    async def chat(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ) -> ChatResponse:
+        await self.limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = await self.engine.chat(
+                messages, temperature=temperature, max_tokens=max_tokens, top_p=top_p, tools=tools
+            )
+        except Exception as e:
+            self.limiter.release(dropped=is_endpoint_failure(e))
+            raise
+        except asyncio.CancelledError:
+            # 截止时间或故障转移的单次超时取消了调用：上游未能及时响应
+            self.limiter.release(dropped=True)
+            raise
+        except BaseException:
+            self.limiter.release()
+            raise
+        self.limiter.release(time.perf_counter() - start)
+        return response
+
+    async def chat_stream(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ):
+        await self.limiter.acquire()
+        start = time.perf_counter()
+        first_chunk = None
+        dropped = False
+        try:
+            async for chunk in self.engine.chat_stream(
+                messages, temperature=temperature, max_tokens=max_tokens, top_p=top_p, tools=tools
+            ):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+                yield chunk
+        except Exception as e:
+            dropped = is_endpoint_failure(e)
+            first_chunk = None
+            raise
+        except asyncio.CancelledError:
+            # 首个 chunk 之前被取消视为上游未能及时响应；之后的取消（客户端断开）不算
+            dropped = first_chunk is None
+            raise
+        finally:
+            # 名额占用到流结束（包括客户端中途断开）
+            self.limiter.release(first_chunk, dropped=dropped)
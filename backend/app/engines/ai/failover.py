@@ -0,0 +1,274 @@
+"""提供商故障转移 - 按人格声明的顺序尝试 provider / model，跳过熔断中的目标
+
+每个请求创建一个 FailoverEngine；熔断器按 provider + model 由 EngineRegistry 持有并在请求间共享，
+同一提供商的其他模型不受某个模型熔断的影响。
+流式调用只在首个有效 chunk 之前失败时转移，已输出内容后的错误照常抛出。
+
+有请求截止时间时每次尝试单独限时（非流式为整个调用，流式为首个有效 chunk）：
+卡住的提供商在截止时间之前超时、计入熔断并转移，而不是被请求截止时间直接取消。
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from app.core.exceptions import (
+    DeadlineExceededError,
+    ExternalServiceError,
+    RateLimitError,
+    ServiceOverloadedError,
+)
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.engines.ai.upstream import is_endpoint_failure
+from app.engines.base_remote import SlidingWindowCircuitBreaker
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+from app.utils.deadline import Deadline
+
+logger = get_logger(__name__)
+
+provider_skips = metrics.counter(
+    "ai_provider_skips_total", "AI provider attempts skipped or failed over, by reason"
+)
+
+
+# 还有备用目标时单次尝试最多占用剩余预算的一半；最后一个目标在请求截止前超时，
+# 让熔断器记录到这次失败
+_ATTEMPT_SHARE = 0.5
+_LAST_ATTEMPT_SHARE = 0.9
+
+
+def _local_rejection_reason(error: Exception) -> str:
+    return "overloaded" if isinstance(error, ServiceOverloadedError) else "throttled"
+
+
+@dataclass(frozen=True)
+class AITarget:
+    """一个候选 provider / model"""
+
+    provider: str
+    model: str
+
+
+class FailoverEngine(AIEngine):
+    """按顺序尝试候选目标的 AI 引擎（单次请求内使用，served_by 记录实际服务方）"""
+
+    def __init__(
+        self,
+        targets: list[AITarget],
+        acquire: Callable[[AITarget], Awaitable[AIEngine]],
+        breaker_for: Callable[[str, str], SlidingWindowCircuitBreaker | None],
+        primary: AIEngine | None = None,
+        deadline: Deadline | None = None,
+    ):
+        self.targets = targets
+        self.deadline = deadline
+        self._acquire = acquire
+        self._breaker_for = breaker_for
+        self._engines: dict[AITarget, AIEngine] = {targets[0]: primary} if primary else {}
+        self.served_by: AITarget | None = None
+        self.skipped: list[dict] = []
+
+    @property
+    def model(self) -> str:
+        """实际服务的模型（尚未调用时为首选模型）"""
+        return (self.served_by or self.targets[0]).model
+
+    @property
+    def failed_over(self) -> bool:
+        return self.served_by is not None and self.served_by != self.targets[0]
+
+    def served_metadata(self) -> dict:
+        served = self.served_by or self.targets[0]
+        return {
+            "provider": served.provider,
+            "model": served.model,
+            "failover": self.failed_over,
+            "skipped": self.skipped,
+        }
+
+    async def initialize(self) -> None:
+        pass
+
+    async def health_check(self) -> bool:
+        primary = self._engines.get(self.targets[0])
+        return await primary.health_check() if primary else False
+
+    async def close(self) -> None:
+        # 引擎由 EngineRegistry 持有并关闭
+        pass
+
+    @property
+    def supports_tools(self) -> bool:
+        primary = self._engines.get(self.targets[0])
+        return primary.supports_tools if primary else True
+
+    @property
+    def supports_vision(self) -> bool:
+        primary = self._engines.get(self.targets[0])
+        return primary.supports_vision if primary else False
+
+    def _skip(self, target: AITarget, reason: str, error: BaseException | None = None) -> None:
+        self.skipped.append({"provider": target.provider, "model": target.model, "reason": reason})
+        provider_skips.inc(provider=target.provider, reason=reason)
+        logger.warning(
+            "AI provider skipped",
+            provider=target.provider,
+            model=target.model,
+            reason=reason,
+            error=str(error) if error else None,
+        )
+
+    async def _candidates(self):
+        """依次给出可尝试的 (目标, 引擎, 熔断器)；熔断中或无法创建的目标被跳过"""
+        for target in self.targets:
+            breaker = self._breaker_for(target.provider, target.model)
+            if breaker is not None and not breaker.allow_request():
+                self._skip(target, "circuit_open")
+                continue
+            engine = self._engines.get(target)
+            if engine is None:
+                try:
+                    engine = self._engines[target] = await self._acquire(target)
+                except Exception as e:
+                    self._skip(target, "unavailable", e)
+                    continue
+            yield target, engine, breaker
+
+    def _attempt_timeout(self, target: AITarget) -> float | None:
+        if self.deadline is None:
+            return None
+        share = _LAST_ATTEMPT_SHARE if target == self.targets[-1] else _ATTEMPT_SHARE
+        return self.deadline.remaining() * share
+
+    def _timed_out(self, target: AITarget, breaker: SlidingWindowCircuitBreaker | None):
+        """记录一次超时的尝试，返回对应的错误（最后一个目标超时即请求截止）"""
+        if breaker is not None:
+            breaker.record_failure()
+        self._skip(target, "timeout")
+        if target == self.targets[-1]:
+            return DeadlineExceededError("llm_call")
+        return ExternalServiceError(target.provider, "no response before the attempt timeout")
+
+    def _unavailable(self, last_error: Exception | None) -> Exception:
+        if last_error is not None:
+            return last_error
+        return ExternalServiceError(
+            service=self.targets[0].provider,
+            message="no AI provider available (circuit open for every configured target)",
+        )
+
+    async def chat(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ) -> ChatResponse:
+        last_error = None
+        async for target, engine, breaker in self._candidates():
+            try:
+                async with asyncio.timeout(self._attempt_timeout(target)):
+                    response = await engine.chat(
+                        messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        top_p=top_p,
+                        tools=tools,
+                    )
+            except TimeoutError:
+                last_error = self._timed_out(target, breaker)
+                continue
+            except (RateLimitError, ServiceOverloadedError) as e:
+                # 本地限速 / 并发限制拒绝：不计入熔断，直接尝试下一个目标
+                self._skip(target, _local_rejection_reason(e), e)
+                last_error = e
+                continue
+            except Exception as e:
+                if not is_endpoint_failure(e):
+                    # 请求本身的错误（如 400）：提供商是健康的，换提供商也无济于事
+                    if breaker is not None:
+                        breaker.record_success()
+                    raise
+                if breaker is not None:
+                    breaker.record_failure()
+                self._skip(target, "error", e)
+                last_error = e
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            self.served_by = target
+            return response
+        raise self._unavailable(last_error)
+
+    async def chat_stream(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ):
+        last_error = None
+        async for target, engine, breaker in self._candidates():
+            upstream = engine.chat_stream(
+                messages, temperature=temperature, max_tokens=max_tokens, top_p=top_p, tools=tools
+            )
+            # 首个有效 chunk（内容 / 工具调用 / 结束原因）之前的空 chunk 先暂存，
+            # 在此之前失败可以无感切换到下一个目标
+            held: list[dict] = []
+            started = False
+            try:
+                async with asyncio.timeout(self._attempt_timeout(target)) as first_chunk:
+                    async for chunk in upstream:
+                        if not started:
+                            if not (
+                                chunk.get("content")
+                                or "tool_call" in chunk
+                                or chunk.get("finish_reason")
+                            ):
+                                held.append(chunk)
+                                continue
+                            # 已开始输出：之后只受请求截止时间约束
+                            first_chunk.reschedule(None)
+                            started = True
+                            self.served_by = target
+                            for pending in held:
+                                yield pending
+                        yield chunk
+            except TimeoutError:
+                if started:
+                    # 已输出内容：超时来自上游本身，不再转移
+                    if breaker is not None:
+                        breaker.record_failure()
+                    raise
+                last_error = self._timed_out(target, breaker)
+                continue
+            except (RateLimitError, ServiceOverloadedError) as e:
+                if started:
+                    raise
+                self._skip(target, _local_rejection_reason(e), e)
+                last_error = e
+                continue
+            except Exception as e:
+                endpoint_failure = is_endpoint_failure(e)
+                if breaker is not None:
+                    if endpoint_failure:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if started or not endpoint_failure:
+                    raise
+                self._skip(target, "error", e)
+                last_error = e
+                continue
+            finally:
+                await upstream.aclose()
+            if breaker is not None:
+                breaker.record_success()
+            self.served_by = target
+            for pending in held if not started else []:
+                yield pending
+            return
+        raise self._unavailable(last_error)
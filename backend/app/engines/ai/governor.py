@@ -0,0 +1,262 @@
+"""上游调用限速 - 按提供商密钥的 RPM / TPM 令牌桶，排队准入并按实际用量校正
+
+每次调用从请求桶取 1、从 token 桶取（估算的提示 token + max_tokens）；桶不足时
+按先来先到排队等待补充，预计等待超过 max_wait_seconds 则直接拒绝（429），
+而不是把请求打到上游再吃 429。调用结束后以 usage 校正 token 桶的预扣量。
+Redis 可用时桶状态由 Lua 脚本原子更新，所有 worker 共享同一全局限额。
+"""
+
+import asyncio
+import json
+import time
+
+from app.core.config.schemas import AIRateLimitConfig
+from app.core.exceptions import RateLimitError
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+from app.storage.redis import redis_manager
+from app.utils.tokenizer import get_tokenizer
+
+logger = get_logger(__name__)
+
+admission_wait_seconds = metrics.histogram(
+    "ai_rate_limit_wait_seconds",
+    "Time AI calls queued for rate limit admission",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+admission_rejections = metrics.counter(
+    "ai_rate_limit_rejections_total", "AI calls rejected because the admission wait was too long"
+)
+
+# 每条消息的格式开销（role 与分隔符）
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+# KEYS: 请求桶、token 桶；ARGV: RPM、TPM（0 表示不限）、本次 token 数
+# 返回需等待的秒数（字符串，避免 Lua 数字被截断为整数）；"0" 表示已扣除
+_ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local costs = {1, tonumber(ARGV[3])}
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[i])
+  if capacity > 0 then
+    local bucket = redis.call('HMGET', key, 'level', 'ts')
+    local level = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    level = math.min(capacity, level + math.max(0, now - ts) * capacity / 60)
+    levels[i] = level
+    local need = math.min(costs[i], capacity)
+    if level < need then
+      wait = math.max(wait, (need - level) * 60 / capacity)
+    end
+  end
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[i])
+  if capacity > 0 then
+    redis.call('HSET', key, 'level', levels[i] - costs[i], 'ts', now)
+    redis.call('EXPIRE', key, 120)
+  end
+end
+return '0'
+"""
+
+
+def estimate_prompt_tokens(
+    messages: list[ChatMessage], model: str | None = None, tools: list[dict] | None = None
+) -> int:
+    """估算提示 token 数（已知 token_count 的消息不再重复分词）"""
+    tokenizer = get_tokenizer(model)
+    total = 0
+    for message in messages:
+        if message.token_count is not None:
+            total += message.token_count
+        else:
+            total += tokenizer.count(message.content or "")
+        if message.tool_calls:
+            total += tokenizer.count(json.dumps(message.tool_calls, ensure_ascii=False))
+        total += _MESSAGE_OVERHEAD_TOKENS
+    if tools:
+        total += tokenizer.count(json.dumps(tools, ensure_ascii=False))
+    return total
+
+
+class RateGovernor:
+    """一个提供商密钥的 RPM / TPM 令牌桶（每分钟补满），进程内排队保证先来先到"""
+
+    def __init__(self, name: str, config: AIRateLimitConfig):
+        self.name = name
+        self.config = config
+        self._capacities = (config.requests_per_minute or 0, config.tokens_per_minute or 0)
+        now = time.monotonic()
+        self._buckets = [[float(capacity), now] for capacity in self._capacities]
+        self._queue = asyncio.Lock()
+        self._script = None
+        self._script_client = None
+        key = f"{config.key_prefix}{{{name}}}"
+        self._keys = [f"{key}:rpm", f"{key}:tpm"]
+
+    async def acquire(self, tokens: int) -> None:
+        """等待准入；预计等待超出 max_wait_seconds 时抛出 RateLimitError"""
+        start = time.monotonic()
+        deadline = start + self.config.max_wait_seconds
+        if self._queue.locked():
+            try:
+                await asyncio.wait_for(
+                    self._queue.acquire(), timeout=self.config.max_wait_seconds
+                )
+            except TimeoutError:
+                self._reject(tokens, "queue")
+        else:
+            await self._queue.acquire()
+        try:
+            while (wait := await self._take(tokens)) > 0:
+                if time.monotonic() + wait > deadline:
+                    self._reject(tokens, "budget")
+                await asyncio.sleep(wait)
+        finally:
+            self._queue.release()
+        admission_wait_seconds.observe(time.monotonic() - start, key=self.name)
+
+    async def reconcile(self, reserved: int, actual: int) -> None:
+        """以实际用量校正预扣的 token：多退少补（不足时后续请求等待更久）"""
+        delta = actual - reserved
+        if not delta or not self._capacities[1]:
+            return
+        client = self._shared_client()
+        if client is not None:
+            try:
+                await client.hincrbyfloat(self._keys[1], "level", -delta)
+                return
+            except Exception as e:
+                logger.warning("Rate limit reconcile failed", key=self.name, error=str(e))
+        self._buckets[1][0] -= delta
+
+    def _reject(self, tokens: int, reason: str) -> None:
+        admission_rejections.inc(key=self.name, reason=reason)
+        logger.warning("AI call rejected by rate governor", key=self.name, tokens=tokens)
+        raise RateLimitError(
+            f"Upstream rate limit for '{self.name}' reached; "
+            f"admission wait exceeds {self.config.max_wait_seconds}s"
+        )
+
+    def _shared_client(self):
+        return redis_manager.get_client() if self.config.shared else None
+
+    async def _take(self, tokens: int) -> float:
+        """尝试扣除，返回还需等待的秒数（0 表示已准入）"""
+        client = self._shared_client()
+        if client is not None:
+            try:
+                if self._script is None or self._script_client is not client:
+                    self._script = client.register_script(_ACQUIRE_SCRIPT)
+                    self._script_client = client
+                wait = await self._script(keys=self._keys, args=[*self._capacities, tokens])
+                return float(wait)
+            except Exception as e:
+                # Redis 故障时退化为进程内限速，不阻断请求
+                logger.warning("Shared rate limit unavailable", key=self.name, error=str(e))
+        return self._take_local(tokens)
+
+    def _take_local(self, tokens: int) -> float:
+        now = time.monotonic()
+        costs = (1, tokens)
+        wait = 0.0
+        for bucket, capacity, cost in zip(self._buckets, self._capacities, costs, strict=True):
+            if not capacity:
+                continue
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * capacity / 60)
+            bucket[1] = now
+            # 超过桶容量的单次请求在桶满时放行，避免永远等不到
+            need = min(cost, capacity)
+            if bucket[0] < need:
+                wait = max(wait, (need - bucket[0]) * 60 / capacity)
+        if wait > 0:
+            return wait
+        for bucket, capacity, cost in zip(self._buckets, self._capacities, costs, strict=True):
+            if capacity:
+                bucket[0] -= cost
+        return 0.0
+
+
+class RateLimitedEngine(AIEngine):
+    """在 AI 引擎前加一层 RPM / TPM 准入，对编排器透明"""
+
+    def __init__(self, engine: AIEngine, governor: RateGovernor):
+        self.engine = engine
+        self.governor = governor
+        self.model = getattr(engine, "model", None)
+
+    async def initialize(self) -> None:
+        await self.engine.initialize()
+
+    async def health_check(self) -> bool:
+        return await self.engine.health_check()
+
+    async def close(self) -> None:
+        await self.engine.close()
+
+    @property
+    def supports_tools(self) -> bool:
+        return self.engine.supports_tools
+
+    @property
+    def supports_vision(self) -> bool:
+        return self.engine.supports_vision
+
+    async def chat(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ) -> ChatResponse:
+        prompt_tokens = estimate_prompt_tokens(messages, self.model, tools)
+        reserved = prompt_tokens + max_tokens
+        await self.governor.acquire(reserved)
+        try:
+            response = await self.engine.chat(
+                messages, temperature=temperature, max_tokens=max_tokens, top_p=top_p, tools=tools
+            )
+        except Exception:
+            # 失败的调用没有生成内容：退回补全部分的预扣
+            await self.governor.reconcile(reserved, prompt_tokens)
+            raise
+        if response.usage and response.usage.get("total_tokens"):
+            await self.governor.reconcile(reserved, response.usage["total_tokens"])
+        return response
+
+    async def chat_stream(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ):
+        prompt_tokens = estimate_prompt_tokens(messages, self.model, tools)
+        reserved = prompt_tokens + max_tokens
+        await self.governor.acquire(reserved)
+        content = []
+        total_tokens = None
+        try:
+            async for chunk in self.engine.chat_stream(
+                messages, temperature=temperature, max_tokens=max_tokens, top_p=top_p, tools=tools
+            ):
+                if chunk.get("content"):
+                    content.append(chunk["content"])
+                if chunk.get("usage"):
+                    total_tokens = chunk["usage"].get("total_tokens")
+                yield chunk
+        finally:
+            # 流式通常不带 usage：以已输出内容的 token 数近似（客户端中途断开同样适用）
+            if total_tokens is None:
+                total_tokens = prompt_tokens + get_tokenizer(self.model).count("".join(content))
+            await self.governor.reconcile(reserved, total_tokens)
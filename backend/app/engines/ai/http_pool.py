@@ -0,0 +1,124 @@
+"""AI 提供商的长连接 HTTP 客户端 - 连接池复用、可选 HTTP/2 与连接池指标"""
+
+import time
+
+import httpx
+
+from app.core.config.schemas import AIHttpClientConfig
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+
+logger = get_logger(__name__)
+
+pool_connections = metrics.gauge(
+    "ai_http_pool_connections", "AI provider pooled connections by state (active / idle)"
+)
+pool_wait_seconds = metrics.histogram(
+    "ai_http_pool_wait_seconds",
+    "Time a request waited for a pooled connection",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+connections_opened = metrics.counter(
+    "ai_http_connections_opened_total", "New TCP connections opened by AI provider pools"
+)
+
+# 获得连接后的第一个事件：新建连接从 connect_tcp 开始，复用连接直接发送请求头
+_ACQUIRED_EVENTS = frozenset(
+    {
+        "connection.connect_tcp.started",
+        "http11.send_request_headers.started",
+        "http2.send_request_headers.started",
+    }
+)
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """记录连接池等待时间与连接数的传输层
+
+    等待时间取请求进入连接池到获得连接（开始建连或发送请求头）之间的间隔，
+    由 httpcore 的 trace 扩展给出，不额外创建任务。
+    """
+
+    def __init__(self, pool_label: str, **kwargs):
+        super().__init__(**kwargs)
+        self.pool_label = pool_label
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        acquired = False
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal acquired
+            if not acquired and event_name in _ACQUIRED_EVENTS:
+                acquired = True
+                pool_wait_seconds.observe(time.perf_counter() - start, pool=self.pool_label)
+            if event_name == "connection.connect_tcp.complete":
+                connections_opened.inc(pool=self.pool_label)
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.record_pool_state()
+            raise
+        # 连接在响应体读完后才回到空闲状态，因此在流关闭时记录连接数
+        response.stream = _RecordOnClose(response.stream, self.record_pool_state)
+        return response
+
+    def record_pool_state(self) -> None:
+        connections = self._pool.connections
+        idle = sum(1 for connection in connections if connection.is_idle())
+        pool_connections.set(idle, pool=self.pool_label, state="idle")
+        pool_connections.set(len(connections) - idle, pool=self.pool_label, state="active")
+
+
+class _RecordOnClose(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client(config: AIHttpClientConfig, pool_label: str) -> httpx.AsyncClient:
+    """按配置创建长连接客户端（每个提供商实例一个，initialize 时创建、close 时关闭）"""
+    http2 = config.http2
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+
+    transport = PooledTransport(
+        pool_label,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(
+            config.read_timeout, connect=config.connect_timeout, pool=config.pool_timeout
+        ),
+        follow_redirects=True,
+    )
@@ -0,0 +1,258 @@
+"""上游池 - 同一提供商的多个端点（API Key / 兼容网关）之间负载均衡
+
+路由：在未被摘除且未达并发上限的端点中，选择 (在途请求数 + 1) / 权重 最小者；
+被动摘除：连续 429 / 5xx / 连接错误达到阈值后摘除一段时间，时长随摘除次数递增。
+端点自身的本地限速 / 并发限制拒绝（请求未发出）不计入摘除，直接换下一个端点重试。
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Callable
+
+from app.core.config.schemas import OutlierEjectionConfig, UpstreamEndpointConfig
+from app.core.exceptions import RateLimitError, ServiceOverloadedError
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+
+logger = get_logger(__name__)
+
+upstream_outstanding = metrics.gauge(
+    "ai_upstream_outstanding", "Outstanding requests per upstream endpoint"
+)
+upstream_requests = metrics.counter(
+    "ai_upstream_requests_total", "Upstream endpoint requests by outcome"
+)
+upstream_ejections = metrics.counter(
+    "ai_upstream_ejections_total", "Upstream endpoints ejected after consecutive failures"
+)
+
+
+def failure_status(error: BaseException) -> int | None:
+    """上游响应的 HTTP 状态码；提供商把原始 SDK 异常保留在 __cause__ 中"""
+    status = getattr(error.__cause__ or error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_local_rejection(error: BaseException) -> bool:
+    """本地限速 / 并发限制在请求发出之前的拒绝，与上游端点是否健康无关"""
+    return isinstance(error, (RateLimitError, ServiceOverloadedError))
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """429 / 5xx / 无响应（连接错误、超时）计为端点故障；其余 4xx 是请求本身的问题"""
+    if is_local_rejection(error):
+        return False
+    status = failure_status(error)
+    return status is None or status == 429 or status >= 500
+
+
+class UpstreamEndpoint:
+    """上游端点及其运行时状态"""
+
+    def __init__(self, config: UpstreamEndpointConfig, engine: AIEngine):
+        self.name = config.name
+        self.weight = config.weight
+        self.max_concurrency = config.max_concurrency
+        self.engine = engine
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    @property
+    def saturated(self) -> bool:
+        return self.outstanding >= self.max_concurrency
+
+
+class UpstreamPool(AIEngine):
+    """由多个同类端点组成的 AI 引擎，对编排器透明"""
+
+    def __init__(
+        self,
+        name: str,
+        endpoints: list[UpstreamEndpoint],
+        ejection: OutlierEjectionConfig | None = None,
+    ):
+        if not endpoints:
+            raise ValueError("Upstream pool needs at least one endpoint")
+        self.name = name
+        self.endpoints = endpoints
+        self.ejection = ejection or OutlierEjectionConfig()
+        self._released = asyncio.Condition()
+
+    @classmethod
+    def from_config(
+        cls,
+        name: str,
+        endpoints: list[UpstreamEndpointConfig],
+        ejection: OutlierEjectionConfig,
+        factory: Callable[[UpstreamEndpointConfig], AIEngine],
+    ) -> "UpstreamPool":
+        return cls(
+            name,
+            [UpstreamEndpoint(endpoint, factory(endpoint)) for endpoint in endpoints],
+            ejection,
+        )
+
+    async def initialize(self) -> None:
+        await asyncio.gather(*(endpoint.engine.initialize() for endpoint in self.endpoints))
+
+    async def health_check(self) -> bool:
+        results = await asyncio.gather(
+            *(endpoint.engine.health_check() for endpoint in self.endpoints),
+            return_exceptions=True,
+        )
+        return any(result is True for result in results)
+
+    async def close(self) -> None:
+        for endpoint in self.endpoints:
+            await endpoint.engine.close()
+
+    @property
+    def supports_tools(self) -> bool:
+        return all(endpoint.engine.supports_tools for endpoint in self.endpoints)
+
+    @property
+    def supports_vision(self) -> bool:
+        return all(endpoint.engine.supports_vision for endpoint in self.endpoints)
+
+    def _pick(self, exclude: list[UpstreamEndpoint]) -> UpstreamEndpoint | None:
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+        healthy = [endpoint for endpoint in available if not endpoint.ejected(now)]
+        # 全部被摘除时忽略摘除状态，而不是让请求无处可去
+        candidates = [endpoint for endpoint in healthy or available if not endpoint.saturated]
+        if not candidates:
+            return None
+        # 加权最少在途请求；分数相同随机打散，避免总落到第一个端点
+        return min(
+            candidates,
+            key=lambda endpoint: ((endpoint.outstanding + 1) / endpoint.weight, random.random()),
+        )
+
+    async def _acquire(self, exclude: list[UpstreamEndpoint]) -> UpstreamEndpoint:
+        """选择端点（跳过 exclude）并占用一个并发名额；全部端点满载时等待名额释放"""
+        endpoint = self._pick(exclude)
+        if endpoint is None:
+            async with self._released:
+                while (endpoint := self._pick(exclude)) is None:
+                    await self._released.wait()
+        endpoint.outstanding += 1
+        upstream_outstanding.set(endpoint.outstanding, upstream=self.name, endpoint=endpoint.name)
+        return endpoint
+
+    async def _release(self, endpoint: UpstreamEndpoint) -> None:
+        endpoint.outstanding -= 1
+        upstream_outstanding.set(endpoint.outstanding, upstream=self.name, endpoint=endpoint.name)
+        async with self._released:
+            self._released.notify()
+
+    def _record_success(self, endpoint: UpstreamEndpoint) -> None:
+        endpoint.consecutive_failures = 0
+        upstream_requests.inc(upstream=self.name, endpoint=endpoint.name, outcome="ok")
+
+    def _record_failure(self, endpoint: UpstreamEndpoint, error: BaseException) -> None:
+        if is_local_rejection(error):
+            upstream_requests.inc(upstream=self.name, endpoint=endpoint.name, outcome="rejected")
+            return
+        if not is_endpoint_failure(error):
+            upstream_requests.inc(
+                upstream=self.name, endpoint=endpoint.name, outcome="client_error"
+            )
+            return
+        upstream_requests.inc(upstream=self.name, endpoint=endpoint.name, outcome="failure")
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures < self.ejection.consecutive_failures:
+            return
+
+        now = time.monotonic()
+        ejected = sum(1 for other in self.endpoints if other.ejected(now))
+        if (ejected + 1) * 100 > self.ejection.max_ejection_percent * len(self.endpoints):
+            return
+        duration = min(
+            self.ejection.max_ejection_seconds,
+            self.ejection.base_ejection_seconds * (endpoint.ejections + 1),
+        )
+        endpoint.ejections += 1
+        endpoint.consecutive_failures = 0
+        endpoint.ejected_until = now + duration
+        upstream_ejections.inc(upstream=self.name, endpoint=endpoint.name)
+        logger.warning(
+            "Upstream endpoint ejected",
+            upstream=self.name,
+            endpoint=endpoint.name,
+            status=failure_status(error),
+            seconds=duration,
+        )
+
+    async def chat(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ) -> ChatResponse:
+        tried: list[UpstreamEndpoint] = []
+        while True:
+            endpoint = await self._acquire(tried)
+            try:
+                response = await endpoint.engine.chat(
+                    messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    top_p=top_p,
+                    tools=tools,
+                )
+            except Exception as e:
+                self._record_failure(endpoint, e)
+                if is_local_rejection(e):
+                    tried.append(endpoint)
+                    if len(tried) < len(self.endpoints):
+                        continue
+                raise
+            finally:
+                await self._release(endpoint)
+            self._record_success(endpoint)
+            return response
+
+    async def chat_stream(
+        self,
+        messages: list[ChatMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        top_p: float = 1.0,
+        tools: list[dict] | None = None,
+    ):
+        tried: list[UpstreamEndpoint] = []
+        while True:
+            endpoint = await self._acquire(tried)
+            started = False
+            try:
+                async for chunk in endpoint.engine.chat_stream(
+                    messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    top_p=top_p,
+                    tools=tools,
+                ):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self._record_failure(endpoint, e)
+                # 本地拒绝发生在首个 chunk 之前，换端点对调用方无感
+                if is_local_rejection(e) and not started:
+                    tried.append(endpoint)
+                    if len(tried) < len(self.endpoints):
+                        continue
+                raise
+            else:
+                self._record_success(endpoint)
+                return
+            finally:
+                await self._release(endpoint)
@@ -6,18 +6,25 @@ from abc import ABC
 
 import json
 from abc import ABC
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta, timezone
 from typing import Any, Callable, Generic, TypeVar
 
 import httpx
 
 from app.core.config.manager import get_config
+from app.core.config.schemas import HedgingConfig
 from app.observability.logging import get_logger
+from app.observability.metrics import metrics
 from app.storage.redis import redis_manager
 
 logger = get_logger(__name__)
 
+hedges_fired = metrics.counter("engine_hedges_fired_total", "Hedged engine reads sent")
+hedges_won = metrics.counter(
+    "engine_hedges_won_total", "Hedged engine reads that answered before the primary"
+)
+
 T = TypeVar("T")
 
 
@@ -100,6 +107,117 @@ class CircuitBreaker:
             )
 
 
+class SlidingWindowCircuitBreaker:
+    """Circuit breaker over a sliding time window of call outcomes.
+
+    Opens once at least `min_calls` calls in the last `window_seconds` failed at
+    `failure_rate_threshold` or more. After `open_seconds` it lets
+    `half_open_max_calls` probes through; a probe success closes it, a probe
+    failure opens it again.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 30.0,
+        min_calls: int = 10,
+        failure_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
+        self.opened_at = 0.0
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._probes: deque[float] = deque()
+
+    def allow_request(self) -> bool:
+        now = time.monotonic()
+        if self.state == "OPEN":
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.state = "HALF_OPEN"
+            self._probes.clear()
+        if self.state == "HALF_OPEN":
+            # A probe that never reports back (e.g. cancelled) frees its slot
+            # after open_seconds, so the breaker cannot get stuck half-open
+            while self._probes and now - self._probes[0] >= self.open_seconds:
+                self._probes.popleft()
+            if len(self._probes) >= self.half_open_max_calls:
+                return False
+            self._probes.append(now)
+        return True
+
+    def record_success(self) -> None:
+        if self.state == "HALF_OPEN":
+            self.state = "CLOSED"
+            self._outcomes.clear()
+            return
+        self._record(True)
+
+    def record_failure(self) -> None:
+        if self.state == "HALF_OPEN":
+            self._open()
+            return
+        self._record(False)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if (
+            self.state == "CLOSED"
+            and len(self._outcomes) >= self.min_calls
+            and failures / len(self._outcomes) >= self.failure_rate_threshold
+        ):
+            self._open()
+
+    def _record(self, ok: bool) -> None:
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self) -> None:
+        self.state = "OPEN"
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+        logger.warning("Sliding window circuit breaker opened", open_seconds=self.open_seconds)
+
+
+class LatencyTracker:
+    """Rolling window of call latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgeBudget:
+    """Token bucket limiting hedges to `ratio` of primary calls."""
+
+    def __init__(self, ratio: float = 0.1, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
 class BaseRemoteEngine(ABC):
     """Base remote engine with HTTP client, circuit breaker, and L1/L2 cache."""
 
@@ -110,6 +228,7 @@ class BaseRemoteEngine(ABC):
         timeout: float = 10.0,
         cache_ttl: float = 300.0,
         cache_prefix: str = "engine",
+        hedging: HedgingConfig | None = None,
     ):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
@@ -120,6 +239,15 @@ class BaseRemoteEngine(ABC):
         self.cache_prefix = cache_prefix
         self.client: httpx.AsyncClient | None = None
 
+        if hedging is None:
+            try:
+                hedging = get_config().engines.hedging
+            except Exception:
+                hedging = HedgingConfig()
+        self.hedging = hedging
+        self.latency = LatencyTracker(hedging.window)
+        self.hedge_budget = HedgeBudget(hedging.budget_ratio)
+
     async def initialize(self) -> None:
         """Initialize HTTP client and Redis."""
         if not self.client:
@@ -136,6 +264,59 @@ class BaseRemoteEngine(ABC):
             await self.client.aclose()
             self.client = None
 
+    def _hedge_delay(self) -> float | None:
+        """Delay before sending a hedge; None while hedging is off or not warmed up."""
+        cfg = self.hedging
+        if not cfg.enabled or len(self.latency.samples) < cfg.min_samples:
+            return None
+        delay = self.latency.quantile(cfg.quantile)
+        return min(cfg.max_delay, max(cfg.min_delay, delay))
+
+    async def _timed(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        # Cancelled attempts are recorded too (as a lower bound), otherwise
+        # losing slow primaries would drag the quantile down
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self.latency.record(time.perf_counter() - start)
+
+    async def _hedged_call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run an idempotent read, hedging it once the primary is slower than usual.
+
+        The first successful response wins and the other attempt is cancelled.
+        If the first attempt to finish fails, the other one is still awaited.
+        """
+        delay = self._hedge_delay()
+        self.hedge_budget.deposit()
+        if delay is None:
+            return await self._timed(func, *args, **kwargs)
+
+        primary = asyncio.ensure_future(self._timed(func, *args, **kwargs))
+        pending: set[asyncio.Future] = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self.hedge_budget.try_spend():
+                return await primary
+
+            hedge = asyncio.ensure_future(self._timed(func, *args, **kwargs))
+            pending.add(hedge)
+            engine = self.__class__.__name__
+            hedges_fired.inc(engine=engine)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if not t.exception()), None)
+                if winner is not None:
+                    if winner is hedge:
+                        hedges_won.inc(engine=engine)
+                    return winner.result()
+                if not pending:
+                    # Both attempts failed: surface the primary's error
+                    return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def _safe_call(self, func: Callable[..., Any], *args, **kwargs) -> Any | None:
         """Execute call with circuit breaker and error handling."""
         if not self.circuit_breaker.allow_request():
@@ -213,7 +394,7 @@ class BaseRemoteEngine(ABC):
             if not self.client:
                 await self.initialize()
 
-            result = await func(*args, **kwargs)
+            result = await self._hedged_call(func, *args, **kwargs)
             
             self.circuit_breaker.record_success()
 
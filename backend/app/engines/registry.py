@@ -1,10 +1,22 @@
 """引擎注册表和工厂"""
 
 import asyncio
+import os
 from typing import Any
 
 from app.core.config.manager import get_config
+from app.core.config.schemas import (
+    AICircuitBreakerConfig,
+    AIConcurrencyConfig,
+    AIRateLimitConfig,
+    UpstreamEndpointConfig,
+    UpstreamPoolConfig,
+)
 from app.engines.ai import AIEngine, MockProvider, OpenAIProvider
+from app.engines.ai.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimitedEngine
+from app.engines.ai.governor import RateGovernor, RateLimitedEngine
+from app.engines.ai.upstream import UpstreamPool
+from app.engines.base_remote import SlidingWindowCircuitBreaker
 from app.engines.chat_memory import ChatMemoryEngine, NullChatMemoryEngine
 from app.engines.chat_memory.mem0 import Mem0ChatMemoryEngine
 from app.engines.knowledge import KnowledgeEngine, NullKnowledgeEngine
@@ -31,6 +43,11 @@ class EngineRegistry:
         self._user_profile_locks: dict[str, asyncio.Lock] = {}
         self._chat_memory_engines: dict[str, ChatMemoryEngine] = {}
         self._chat_memory_locks: dict[str, asyncio.Lock] = {}
+        # AI 熔断器（按 provider + model 区分，跨请求与人格共享）
+        self._ai_breakers: dict[str, SlidingWindowCircuitBreaker] = {}
+        # AI 调用限速器（按提供商密钥共享，同一密钥的不同模型共用限额）
+        self._ai_governors: dict[str, RateGovernor] = {}
+        self._ai_limiters: dict[str, AdaptiveConcurrencyLimiter] = {}
         
         # Voice Engines
         self._stt_engines: dict[str, STTEngine] = {}
@@ -65,15 +82,123 @@ class EngineRegistry:
             api_key = config.get("api_key")
             base_url = config.get("base_url", "https://api.openai.com/v1")
             model = config.get("model", "gpt-4")
+            upstream = self._upstream_config(engine_type)
+            if upstream is not None and upstream.endpoints:
+                return self._create_upstream_pool(engine_type, model, upstream)
             if not api_key:
                 raise ValueError("OpenAI API key is required")
-            return OpenAIProvider(api_key=api_key, base_url=base_url, model=model)
+            return self._guarded(
+                OpenAIProvider(api_key=api_key, base_url=base_url, model=model),
+                engine_type,
+                self._rate_limit_config(engine_type),
+            )
         
         if engine_type == "mock":
             return MockProvider()
 
         raise ValueError(f"Unknown engine type: {engine_type}")
 
+    def circuit_breaker(self, provider: str, model: str) -> SlidingWindowCircuitBreaker | None:
+        """provider + model 的滑动窗口熔断器；未启用时返回 None"""
+        key = f"{provider}:{model}"
+        breaker = self._ai_breakers.get(key)
+        if breaker is not None:
+            return breaker
+        try:
+            config = get_config().engines.ai.circuit_breaker
+        except Exception:
+            config = AICircuitBreakerConfig()
+        if not config.enabled:
+            return None
+        breaker = SlidingWindowCircuitBreaker(
+            window_seconds=config.window_seconds,
+            min_calls=config.min_calls,
+            failure_rate_threshold=config.failure_rate_threshold,
+            open_seconds=config.open_seconds,
+            half_open_max_calls=config.half_open_max_calls,
+        )
+        self._ai_breakers[key] = breaker
+        return breaker
+
+    @staticmethod
+    def _upstream_config(engine_type: str) -> UpstreamPoolConfig | None:
+        try:
+            return get_config().engines.ai.upstreams.get(engine_type)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _rate_limit_config(engine_type: str) -> AIRateLimitConfig | None:
+        try:
+            return get_config().engines.ai.rate_limits.get(engine_type)
+        except Exception:
+            return None
+
+    def _guarded(
+        self, engine: AIEngine, key: str, rate_limit: AIRateLimitConfig | None
+    ) -> AIEngine:
+        """RPM / TPM 准入在外、自适应并发限制在内（排队等待限速时不占并发名额）"""
+        return self._rate_limited(self._concurrency_limited(engine, key), key, rate_limit)
+
+    def _concurrency_limited(self, engine: AIEngine, key: str) -> AIEngine:
+        """按提供商密钥共享的自适应并发限制；未启用时原样返回"""
+        try:
+            config = get_config().engines.ai.concurrency
+        except Exception:
+            config = AIConcurrencyConfig()
+        if not config.enabled:
+            return engine
+        limiter = self._ai_limiters.get(key)
+        if limiter is None:
+            limiter = self._ai_limiters[key] = AdaptiveConcurrencyLimiter(key, config)
+        return ConcurrencyLimitedEngine(engine, limiter)
+
+    def _rate_limited(
+        self, engine: AIEngine, key: str, config: AIRateLimitConfig | None
+    ) -> AIEngine:
+        """配置了 RPM / TPM 时在引擎前加限速准入；同一密钥的限速器跨模型共享"""
+        if config is None or not config.enabled:
+            return engine
+        if not (config.requests_per_minute or config.tokens_per_minute):
+            return engine
+        governor = self._ai_governors.get(key)
+        if governor is None:
+            governor = self._ai_governors[key] = RateGovernor(key, config)
+        return RateLimitedEngine(engine, governor)
+
+    def _create_upstream_pool(
+        self, engine_type: str, model: str, upstream: UpstreamPoolConfig
+    ) -> UpstreamPool:
+        """多端点上游池：每个端点一个 OpenAIProvider（各自的连接池与限速），密钥从环境变量读取"""
+        provider_rate_limit = self._rate_limit_config(engine_type)
+
+        def create_endpoint(endpoint: UpstreamEndpointConfig) -> AIEngine:
+            api_key = os.getenv(endpoint.api_key_env, "")
+            if not api_key:
+                raise ValueError(
+                    f"Upstream endpoint '{endpoint.name}' key is missing ({endpoint.api_key_env})"
+                )
+            return self._guarded(
+                OpenAIProvider(
+                    api_key=api_key,
+                    base_url=endpoint.base_url,
+                    model=model,
+                    pool_label=f"{engine_type}:{model}:{endpoint.name}",
+                ),
+                f"{engine_type}:{endpoint.name}",
+                endpoint.rate_limit or provider_rate_limit,
+            )
+
+        logger.info(
+            "Creating upstream pool",
+            engine_type=engine_type,
+            model=model,
+            endpoints=[endpoint.name for endpoint in upstream.endpoints],
+        )
+        return UpstreamPool.from_config(
+            f"{engine_type}:{model}", upstream.endpoints, upstream.ejection, create_endpoint
+        )
+
     async def get_or_create_knowledge(
         self, engine_type: str, config: dict[str, Any]
     ) -> KnowledgeEngine:
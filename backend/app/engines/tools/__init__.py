@@ -3,6 +3,7 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
+from typing import Literal
 
 
 class ToolSideEffect(str, Enum):
@@ -23,6 +24,10 @@ class ToolDefinition:
     parameters: dict  # OpenAI function parameters schema
     side_effect: ToolSideEffect = ToolSideEffect.READ_ONLY
     requires_permission: bool = True
+    # 结果缓存（仅 READ_ONLY 工具生效）：cache_ttl <= 0 表示不缓存
+    cache_ttl: float = 0.0
+    cache_max_entries: int = 256
+    cache_scope: Literal["global", "user"] = "global"
 
 
 @dataclass
@@ -33,6 +38,7 @@ class ToolInvocationResult:
     result: str | dict | None = None
     error: str | None = None
     execution_time: float = 0.0
+    cached: bool = False
 
 
 class ToolsEngine(ABC):
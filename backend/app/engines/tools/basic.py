@@ -1,15 +1,23 @@
 """Tools Engine 基础实现"""
 
+import hashlib
+import json
 import time
 from collections import defaultdict
+from dataclasses import replace
 
 from app.core.config.manager import get_config
+from app.engines.base_remote import L1Cache
 from app.engines.tools import ToolDefinition, ToolInvocationResult, ToolsEngine, ToolSideEffect
 from app.engines.tools.built_in import BuiltInTools
 from app.observability.logging import get_logger
+from app.observability.metrics import metrics
 
 logger = get_logger(__name__)
 
+tool_cache_hits = metrics.counter("tool_cache_hits_total", "Tool result cache hits")
+tool_cache_misses = metrics.counter("tool_cache_misses_total", "Tool result cache misses")
+
 
 class BasicToolsEngine(ToolsEngine):
     """基础工具引擎实现"""
@@ -17,6 +25,7 @@ class BasicToolsEngine(ToolsEngine):
     def __init__(self):
         self._tools: dict[str, ToolDefinition] = {}
         self._rate_limit_tracker: dict[str, list[float]] = defaultdict(list)
+        self._result_caches: dict[str, L1Cache[ToolInvocationResult]] = {}
         self._initialized = False
 
     async def initialize(self) -> None:
@@ -26,6 +35,7 @@ class BasicToolsEngine(ToolsEngine):
 
         # 加载内置工具
         self._tools = BuiltInTools.get_definitions()
+        self._apply_cache_config()
 
         logger.info("Tools engine initialized", tool_count=len(self._tools))
         self._initialized = True
@@ -38,6 +48,7 @@ class BasicToolsEngine(ToolsEngine):
         """关闭引擎"""
         self._tools.clear()
         self._rate_limit_tracker.clear()
+        self._result_caches.clear()
         self._initialized = False
 
     def list_tools(self, allowed_tools: list[str] | None = None) -> list[ToolDefinition]:
@@ -94,14 +105,25 @@ class BasicToolsEngine(ToolsEngine):
                 error=f"Permission denied for tool: {name}",
             )
 
-        # 4. 检查速率限制
+        # 4. 命中结果缓存则跳过执行（不计入速率限制）
+        cache = self._result_caches.get(name)
+        cache_key = None
+        if cache is not None:
+            cache_key = self._cache_key(tool_def, arguments, context)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                tool_cache_hits.inc(tool=name)
+                return replace(cached, cached=True, execution_time=0.0)
+            tool_cache_misses.inc(tool=name)
+
+        # 5. 检查速率限制
         if not self._check_rate_limit(name):
             return ToolInvocationResult(
                 success=False,
                 error=f"Rate limit exceeded for tool: {name}",
             )
 
-        # 5. 执行工具
+        # 6. 执行工具
         logger.info(
             "Invoking tool",
             tool_name=name,
@@ -110,6 +132,8 @@ class BasicToolsEngine(ToolsEngine):
 
         try:
             result = await BuiltInTools.invoke(name, arguments)
+            if cache is not None and result.success:
+                cache.set(cache_key, result)
             return result
 
         except Exception as e:
@@ -128,6 +152,51 @@ class BasicToolsEngine(ToolsEngine):
         """获取工具定义"""
         return self._tools.get(name)
 
+    def _apply_cache_config(self) -> None:
+        """合并 tools.yaml 中的缓存覆盖配置，并为启用缓存的 READ_ONLY 工具创建 LRU 缓存"""
+        self._result_caches.clear()
+        try:
+            cache_config = get_config().tools.cache
+        except Exception:
+            cache_config = None
+
+        if cache_config is not None and not cache_config.enabled:
+            return
+
+        overrides = cache_config.tools if cache_config is not None else {}
+        for name, override in overrides.items():
+            if name in self._tools:
+                self._tools[name] = replace(
+                    self._tools[name],
+                    cache_ttl=override.ttl,
+                    cache_max_entries=override.max_entries,
+                    cache_scope=override.scope,
+                )
+
+        for name, tool_def in self._tools.items():
+            if tool_def.cache_ttl <= 0:
+                continue
+            if tool_def.side_effect != ToolSideEffect.READ_ONLY:
+                logger.warning(
+                    "Result cache ignored for tool with side effects",
+                    tool_name=name,
+                    side_effect=tool_def.side_effect.value,
+                )
+                continue
+            self._result_caches[name] = L1Cache(
+                capacity=tool_def.cache_max_entries, ttl=tool_def.cache_ttl
+            )
+
+    @staticmethod
+    def _cache_key(tool_def: ToolDefinition, arguments: dict, context: dict | None) -> str:
+        """缓存键：参数规范化（键排序）后哈希；user scope 额外带上 user_id"""
+        canonical = json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha256(canonical.encode()).hexdigest()
+        if tool_def.cache_scope == "user":
+            user_id = (context or {}).get("user_id", "")
+            return f"user:{user_id}:{digest}"
+        return digest
+
     def _check_whitelist(self, tool_name: str) -> bool:
         """检查工具是否在白名单中"""
         try:
@@ -45,6 +45,7 @@ class BuiltInTools:
                 },
                 side_effect=ToolSideEffect.READ_ONLY,
                 requires_permission=False,
+                cache_ttl=3600.0,
             ),
         }
 
@@ -10,6 +10,7 @@ from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
 from app.api.v1.chat import router as chat_router
 # from app.api.v1.personalities import router as personalities_router
 from app.api.v1.voice import router as voice_router
@@ -29,6 +30,8 @@ from app.observability import configure_logging, get_logger
 from app.orchestration import initialize_orchestrator
 from app.storage.database import db_manager
 from app.storage.redis import redis_manager
+from app.services.audit import audit_sink
+from app.services.persister import message_persister
 from app.services.worker import async_worker
 
 # Initialize configuration
@@ -74,6 +77,10 @@ async def lifespan(app: FastAPI):
     orchestrator = await initialize_orchestrator(personality_registry, engine_registry)
     logger.info("ChatOrchestrator initialized")
 
+    # Start message write-behind persister and audit sink
+    await message_persister.start()
+    await audit_sink.start()
+
     # Start Background Worker (Async Write-back)
     await async_worker.start()
     
@@ -84,6 +91,11 @@ async def lifespan(app: FastAPI):
     
     # Stop Background Worker
     await async_worker.stop()
+
+    # Flush buffered messages and audit events before the database pool goes away
+    await message_persister.stop()
+    await audit_sink.stop()
+    logger.info("Message persister and audit sink flushed")
     
     # Close all engines
     await engine_registry.close_all()
@@ -171,6 +183,8 @@ if config.app.cors.enabled:
 
 # Register routers
 app.include_router(health_router, prefix="/api/v1")
+if config.observability.metrics.enabled:
+    app.include_router(metrics_router)  # Prometheus scrape endpoint at /metrics
 app.include_router(chat_router, prefix="/api")
 # app.include_router(personalities_router, prefix="/api")
 app.include_router(compat_router, prefix="/api/v1")
@@ -42,9 +42,11 @@ class ErrorHandlerMiddleware(BaseHTTPMiddleware):
                 )
             )
 
+            retry_after = exc.details.get("retry_after_seconds")
             return JSONResponse(
                 status_code=exc.status_code,
                 content=error_response.model_dump(),
+                headers={"Retry-After": str(max(1, round(retry_after)))} if retry_after else None,
             )
 
         except Exception as exc:
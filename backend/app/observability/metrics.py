@@ -0,0 +1,192 @@
+"""进程内指标（计数器 / 仪表 / 直方图）
+
+轻量实现，不依赖外部指标库；按名称注册，标签以 kwargs 传入。
+通过 GET /metrics 以 Prometheus 文本格式导出（app/api/metrics.py）。
+"""
+
+from bisect import bisect_left
+from threading import Lock
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: dict[LabelKey, float] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> list[dict]:
+        return [
+            {"labels": dict(key), "value": value} for key, value in self._values.items()
+        ]
+
+    def exposition(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+
+    def set(self, value: float, **labels: object) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+
+# 延迟直方图默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """固定桶直方图（桶上界含等号，最后一个桶为 +Inf）"""
+
+    def __init__(self, name: str, description: str = "", buckets: tuple[float, ...] | None = None):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._series: dict[LabelKey, dict] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, **labels: object) -> int:
+        series = self._series.get(_label_key(labels))
+        return series["count"] if series else 0
+
+    def sum(self, **labels: object) -> float:
+        series = self._series.get(_label_key(labels))
+        return series["sum"] if series else 0.0
+
+    def snapshot(self) -> list[dict]:
+        result = []
+        for key, series in self._series.items():
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip((*self.buckets, float("inf")), series["counts"]):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            result.append(
+                {
+                    "labels": dict(key),
+                    "count": series["count"],
+                    "sum": series["sum"],
+                    "buckets": buckets,
+                }
+            )
+        return result
+
+    def exposition(self) -> list[str]:
+        with self._lock:
+            series_items = [
+                (key, list(series["counts"]), series["sum"], series["count"])
+                for key, series in self._series.items()
+            ]
+        lines = []
+        for key, counts, total, count in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                labels = _format_labels((*key, ("le", _format_value(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表（单例）"""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = Lock()
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(
+        self, name: str, description: str = "", buckets: tuple[float, ...] | None = None
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets=buckets)
+
+    def snapshot(self) -> dict[str, dict]:
+        """导出全部指标的当前值"""
+        return {
+            name: {
+                "type": type(metric).__name__.lower(),
+                "description": metric.description,
+                "values": metric.snapshot(),
+            }
+            for name, metric in self._metrics.items()
+        }
+
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文本格式（0.0.4）导出全部指标"""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            description = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {type(metric).__name__.lower()}")
+            lines.extend(metric.exposition())
+        return "\n".join(lines) + "\n"
+
+    def _get_or_create(self, cls: type, name: str, description: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, description, **kwargs)
+                self._metrics[name] = metric
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} already registered as {type(metric).__name__}")
+            return metric
+
+
+metrics = MetricsRegistry()
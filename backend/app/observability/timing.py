@@ -0,0 +1,89 @@
+"""请求级阶段计时 - 把聊天请求延迟分解到各阶段（上下文、引擎、LLM、工具、持久化）"""
+
+import time
+from collections.abc import Awaitable
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from app.observability.metrics import metrics
+
+T = TypeVar("T")
+
+phase_seconds = metrics.histogram("chat_phase_seconds", "Chat request latency per phase")
+request_seconds = metrics.histogram("chat_request_seconds", "Chat request total latency")
+ttft_seconds = metrics.histogram(
+    "llm_time_to_first_token_seconds", "Time from LLM call start to first content delta"
+)
+tokens_per_second = metrics.histogram(
+    "llm_tokens_per_second",
+    "LLM completion tokens per second",
+    buckets=(1, 5, 10, 20, 40, 60, 80, 120, 200, 400, 1000),
+)
+
+
+class PhaseTimer:
+    """单个请求的阶段计时器
+
+    阶段可重复（每轮 LLM 调用、每次工具执行）也可嵌套或并发（上下文构建与引擎获取），
+    因此各阶段之和不必等于总耗时。每个阶段同时写入 chat_phase_seconds 直方图。
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.phases: list[dict[str, Any]] = []
+
+    @contextmanager
+    def phase(self, name: str, **attrs: Any):
+        """计时一个阶段；yield 的字典可在阶段内补充属性"""
+        record = dict(attrs)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.record(name, time.perf_counter() - start, **record)
+
+    async def timed(self, name: str, awaitable: Awaitable[T], **attrs: Any) -> T:
+        with self.phase(name, **attrs):
+            return await awaitable
+
+    def record(self, name: str, seconds: float, **attrs: Any) -> None:
+        self.phases.append({"phase": name, "ms": round(seconds * 1000, 2), **attrs})
+        phase_seconds.observe(seconds, kind=self.kind, phase=name)
+
+    def record_llm_call(
+        self,
+        seconds: float,
+        completion_tokens: int | None = None,
+        ttft: float | None = None,
+        **attrs: Any,
+    ) -> None:
+        """记录一次 LLM 调用（流式带 TTFT），并计算 tokens/sec"""
+        if ttft is not None:
+            attrs["ttft_ms"] = round(ttft * 1000, 2)
+            ttft_seconds.observe(ttft, kind=self.kind)
+        if completion_tokens:
+            attrs["completion_tokens"] = completion_tokens
+            # 流式按首 token 之后的生成时间计算，排除排队与首包等待
+            generation = seconds - (ttft or 0.0)
+            if generation > 0:
+                rate = completion_tokens / generation
+                attrs["tokens_per_sec"] = round(rate, 1)
+                tokens_per_second.observe(rate, kind=self.kind)
+        self.record("llm_call", seconds, **attrs)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def breakdown(self) -> dict[str, float]:
+        """按阶段名汇总耗时（毫秒），用于结构化日志"""
+        totals: dict[str, float] = {}
+        for phase in self.phases:
+            totals[phase["phase"]] = round(totals.get(phase["phase"], 0.0) + phase["ms"], 2)
+        return totals
+
+    def finish(self) -> dict[str, Any]:
+        """结束计时，返回放入响应 metadata 的分解结果"""
+        total = self.elapsed()
+        request_seconds.observe(total, kind=self.kind)
+        return {"total_ms": round(total * 1000, 2), "phases": self.phases}
@@ -1,27 +1,32 @@
 """ChatOrchestrator - 聊天编排核心"""
 
+import asyncio
 import json
 import time
 import uuid
 from datetime import datetime
 
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-
 from app.core.config.manager import get_config
 from app.core.exceptions import (
+    DeadlineExceededError,
     NotFoundError,
 )
 from app.core.personalities.models import PersonalityRegistry
 from app.context.service import ContextService
-from app.engines.ai import ChatMessage
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.engines.ai.failover import AITarget, FailoverEngine
 from app.engines.registry import EngineRegistry
-from app.engines.tools import ToolsEngine
+from app.engines.tools import ToolsEngine, ToolSideEffect
 from app.engines.tools.basic import BasicToolsEngine
 from app.observability.logging import get_logger
+from app.observability.timing import PhaseTimer
+from app.orchestration.completion_cache import CompletionCache
+from app.orchestration.singleflight import IdempotencyStore, SingleFlight
 from app.services.audit import AuditService
-from app.storage.database import db_manager
-from app.storage.models import Message, Session
+from app.services.persister import MessagePersister, message_persister
+from app.services.prefetch import ContextPrefetcher, context_prefetcher
+from app.services.summarizer import SessionSummarizer, session_summarizer
+from app.utils.deadline import Deadline
 
 logger = get_logger(__name__)
 
@@ -34,12 +39,25 @@ class ChatOrchestrator:
         personality_registry: PersonalityRegistry,
         engine_registry: EngineRegistry,
         context_service: ContextService | None = None,
+        persister: MessagePersister | None = None,
+        completion_cache: CompletionCache | None = None,
+        idempotency: IdempotencyStore | None = None,
+        summarizer: SessionSummarizer | None = None,
+        prefetcher: ContextPrefetcher | None = None,
     ):
         self.personality_registry = personality_registry
         self.engine_registry = engine_registry
         self.tools_engine: ToolsEngine | None = None
         self.max_tool_iterations = 10  # 默认最大迭代次数
-        self.context_service = context_service or ContextService(engine_registry)
+        self.message_persister = persister or message_persister
+        self.completion_cache = completion_cache or CompletionCache()
+        self.idempotency = idempotency or IdempotencyStore()
+        self.singleflight = SingleFlight()
+        self.summarizer = summarizer or session_summarizer
+        self.prefetcher = prefetcher or context_prefetcher
+        self.context_service = context_service or ContextService(
+            engine_registry, persister=self.message_persister
+        )
 
     async def initialize_tools_engine(self) -> None:
         """初始化工具引擎"""
@@ -48,6 +66,20 @@ class ChatOrchestrator:
             await self.tools_engine.initialize()
             logger.info("Tools engine initialized")
 
+    async def warm_up_engines(self) -> None:
+        """为已注册人格的 (provider, model) 创建并初始化引擎；失败只记录日志"""
+        targets = {
+            (personality.ai.provider, personality.ai.model)
+            for personality in self.personality_registry.list_all()
+        }
+        for engine_type, model in sorted(targets):
+            try:
+                await self._acquire_engine(engine_type, model)
+            except Exception as e:
+                logger.warning(
+                    "Engine warm-up failed", engine_type=engine_type, model=model, error=str(e)
+                )
+
     async def chat(
         self,
         user_id: str,
@@ -58,14 +90,63 @@ class ChatOrchestrator:
         max_tokens: int | None = None,
         top_p: float | None = None,
         tools: list[dict] | None = None,
+        idempotency_key: str | None = None,
+        timeout: float | None = None,
+    ) -> dict:
+        """非流式聊天
+
+        指纹相同的进行中请求合并为一次上游调用；携带 idempotency_key 时
+        已完成的响应短期保存在 Redis，完成后的重试直接返回保存的响应。
+        timeout（秒）为请求截止时间，未指定时取人格或全局默认值。
+        """
+        params = {
+            "session_id": session_id,
+            "personality_id": personality_id,
+            "message": message,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": top_p,
+            "tools": tools,
+        }
+        key = self.idempotency.build_key("chat", user_id, idempotency_key, **params)
+        # 功能关闭时 build_key 退化为内容指纹键：只合并进行中请求，不保存也不回放
+        replayable = self.idempotency.enabled and bool(idempotency_key)
+        if key is None:
+            return await self._chat(user_id, **params, timeout=timeout)
+
+        if replayable:
+            stored = await self.idempotency.get(key)
+            if stored is not None:
+                return _with_metadata(stored, idempotent_replay=True)
+
+        async def run() -> dict:
+            response = await self._chat(user_id, **params, timeout=timeout)
+            if replayable:
+                await self.idempotency.set(key, response)
+            return response
+
+        response, joined = await self.singleflight.do(key, run)
+        return _with_metadata(response, coalesced=True) if joined else response
+
+    async def _chat(
+        self,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        message: str,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+        top_p: float | None = None,
+        tools: list[dict] | None = None,
+        timeout: float | None = None,
     ) -> dict:
-        """非流式聊天"""
         request_id = str(uuid.uuid4())
-        start_time = time.time()
+        timer = PhaseTimer("chat")
 
         try:
             # 1. 验证人格
-            personality = self.personality_registry.get(personality_id)
+            with timer.phase("personality_resolution"):
+                personality = self.personality_registry.get(personality_id)
             if not personality:
                 raise NotFoundError(resource="Personality", identifier=personality_id)
 
@@ -77,33 +158,33 @@ class ChatOrchestrator:
                 personality_id=personality_id,
             )
 
-            # 2. 获取模型参数
+            # 2. 获取模型参数；截止时间从此刻起算，后续各阶段超时由剩余预算推导
             ai_config = personality.ai
+            deadline = Deadline.for_request(timeout, ai_config.request_timeout)
             model_temperature = temperature if temperature is not None else ai_config.temperature
             model_max_tokens = max_tokens if max_tokens is not None else ai_config.max_tokens
             model_top_p = top_p if top_p is not None else ai_config.top_p
 
-            # 3. 构建上下文
-            context_bundle = await self.context_service.build_context_bundle(
-                user_id=user_id,
-                session_id=session_id,
-                current_message=message,
-                personality=personality,
-                max_tokens=model_max_tokens,
-                request_id=request_id,
-            )
-            messages = self.context_service.to_messages(context_bundle, message)
-
-            # 4. 获取引擎
+            # 3+4. 并发构建上下文与获取引擎
             engine_type = ai_config.provider
-            engine = await self.engine_registry.get_or_create(
-                engine_type,
-                {
-                    "api_key": self._get_api_key(engine_type),
-                    "base_url": self._get_base_url(engine_type),
-                    "model": ai_config.model,
-                },
+            context_bundle, (engine, engine_meta) = await asyncio.gather(
+                timer.timed(
+                    "context_build",
+                    self.context_service.build_context_bundle(
+                        user_id=user_id,
+                        session_id=session_id,
+                        current_message=message,
+                        personality=personality,
+                        max_tokens=model_max_tokens,
+                        request_id=request_id,
+                        timer=timer,
+                        deadline=deadline.child() if deadline else None,
+                    ),
+                ),
+                timer.timed("engine_acquire", self._acquire_chat_engine(ai_config, deadline)),
             )
+            context_bundle.metadata["engines"]["ai"] = engine_meta
+            messages = self.context_service.to_messages(context_bundle, message)
 
             # 4.5. 准备工具（如果启用）
             allowed_tools = self._get_allowed_tools(personality, tools)
@@ -113,110 +194,83 @@ class ChatOrchestrator:
                 if self.tools_engine:
                     openai_tools = self.tools_engine.to_openai_tools(allowed_tools)
 
-            # 5. 调用 AI 引擎（带工具调用循环）
-            logger.info(
-                "Calling AI engine",
-                request_id=request_id,
-                engine_type=engine_type,
-                temperature=model_temperature,
-                tools_enabled=bool(openai_tools),
-            )
-
-            # 工具调用循环
-            iteration = 0
-            while iteration < self.max_tool_iterations:
-                response = await engine.chat(
-                    messages=messages,
-                    temperature=model_temperature,
-                    max_tokens=model_max_tokens,
-                    top_p=model_top_p,
-                    tools=openai_tools,
+            # 5. 补全缓存（人格开启且请求确定时，完全相同的请求直接复用响应）
+            cache_key = None
+            response = None
+            if self.completion_cache.is_eligible(personality, model_temperature):
+                cache_key = self.completion_cache.build_key(
+                    engine_type,
+                    ai_config.model,
+                    messages,
+                    model_temperature,
+                    model_max_tokens,
+                    model_top_p,
+                    openai_tools,
                 )
-
-                # 检查是否有工具调用
-                if response.finish_reason == "tool_calls" and response.tool_calls:
-                    iteration += 1
-                    logger.info(
-                        "Tool calls detected",
-                        request_id=request_id,
-                        iteration=iteration,
-                        tool_count=len(response.tool_calls),
-                    )
-
-                    # 执行工具调用
-                    tool_results = await self._execute_tool_calls(
-                        response.tool_calls,
-                        user_id,
-                        session_id,
-                        personality_id,
-                        request_id,
-                    )
-
-                    # 回填工具调用结果到消息列表
-                    messages.append(
-                        ChatMessage(
-                            role="assistant",
-                            content=response.content or "",
-                            tool_calls=response.tool_calls,
-                        )
-                    )
-                    for tool_result in tool_results:
-                        messages.append(
-                            ChatMessage(
-                                role="tool",
-                                content=tool_result["content"],
-                                tool_calls={"id": tool_result["tool_call_id"]},
-                            )
-                        )
-
-                    # 继续下一轮调用
-                    continue
-
-                # 没有工具调用，退出循环
-                break
-
-            if iteration >= self.max_tool_iterations:
-                logger.warning(
-                    "Tool iteration limit reached",
-                    request_id=request_id,
-                    max_iterations=self.max_tool_iterations,
+                response = await timer.timed(
+                    "completion_cache_lookup", self.completion_cache.get(cache_key)
                 )
 
-            # 6. 持久化消息到数据库
-            async with db_manager.session() as session:
-                await self._persist_message(
-                    session=session,
-                    user_id=user_id,
-                    session_id=session_id,
-                    role="user",
-                    content=message,
-                    personality_id=personality_id,
+            # 6. 调用 AI 引擎（带工具调用循环）
+            if response is None:
+                logger.info(
+                    "Calling AI engine",
                     request_id=request_id,
+                    engine_type=engine_type,
+                    temperature=model_temperature,
+                    tools_enabled=bool(openai_tools),
                 )
-
-                await self._persist_message(
-                    session=session,
+                response, iteration = await self._run_tool_loop(
+                    engine,
+                    messages,
+                    model_temperature,
+                    model_max_tokens,
+                    model_top_p,
+                    openai_tools,
+                    user_id,
+                    session_id,
+                    personality_id,
+                    request_id,
+                    timer,
+                    deadline,
+                )
+                # 故障转移到其他模型的响应不写入首选模型的缓存键
+                if cache_key and iteration == 0 and not engine.failed_over:
+                    await self.completion_cache.set(cache_key, response, personality.cache.ttl)
+                engine_meta.update(engine.served_metadata())
+
+            # 7. 持久化消息到数据库
+            with timer.phase("persistence"):
+                await self._persist_messages(
                     user_id=user_id,
                     session_id=session_id,
-                    role="assistant",
-                    content=response.content,
                     personality_id=personality_id,
                     request_id=request_id,
+                    messages=[("user", message), ("assistant", response.content)],
+                    model=engine.model,
+                )
+                # 一轮结束：投递滚动摘要任务（去抖，由 worker 折叠滑出近期窗口的消息）
+                await self.summarizer.schedule(session_id, engine_type, ai_config.model)
+                # 预取下一轮上下文（按用户限流，由 worker 预热画像 / 历史 / 记忆缓存）
+                await self.prefetcher.schedule(
+                    user_id, session_id, personality_id, response.content or ""
                 )
 
-            elapsed_time = time.time() - start_time
+            timings = timer.finish()
+            elapsed_time = timings["total_ms"] / 1000
             logger.info(
                 "Chat completed successfully",
                 request_id=request_id,
                 elapsed_time=elapsed_time,
                 finish_reason=response.finish_reason,
+                phases=timer.breakdown(),
             )
 
             return {
                 "id": f"chatcmpl-{request_id}",
                 "object": "chat.completion",
                 "created": int(datetime.now().timestamp()),
-                "model": ai_config.model,
+                "model": engine.model,
                 "choices": [
                     {
                         "index": 0,
@@ -235,6 +289,7 @@ class ChatOrchestrator:
                 "metadata": {
                     "request_id": request_id,
                     "elapsed_time": elapsed_time,
+                    "timings": timings,
                     "context": context_bundle.metadata,
                     "token_budget": context_bundle.token_budget.sections,
                 },
@@ -249,6 +304,97 @@ class ChatOrchestrator:
             )
             raise
 
+    async def _run_tool_loop(
+        self,
+        engine: AIEngine,
+        messages: list[ChatMessage],
+        model_temperature: float,
+        model_max_tokens: int,
+        model_top_p: float,
+        openai_tools: list[dict] | None,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        request_id: str,
+        timer: PhaseTimer | None = None,
+        deadline: Deadline | None = None,
+    ) -> tuple[ChatResponse, int]:
+        """非流式工具调用循环，返回最终响应与工具迭代次数
+
+        有截止时间时每次 LLM 调用以剩余预算为超时，预算耗尽抛出 DeadlineExceededError。
+        """
+        # 工具调用循环
+        iteration = 0
+        while iteration < self.max_tool_iterations:
+            call_start = time.perf_counter()
+            completion = engine.chat(
+                messages=messages,
+                temperature=model_temperature,
+                max_tokens=model_max_tokens,
+                top_p=model_top_p,
+                tools=openai_tools,
+            )
+            response = await (deadline.run("llm_call", completion) if deadline else completion)
+            if timer:
+                timer.record_llm_call(
+                    time.perf_counter() - call_start,
+                    completion_tokens=(response.usage or {}).get("completion_tokens"),
+                    iteration=iteration,
+                )
+
+            # 检查是否有工具调用
+            if response.finish_reason == "tool_calls" and response.tool_calls:
+                iteration += 1
+                logger.info(
+                    "Tool calls detected",
+                    request_id=request_id,
+                    iteration=iteration,
+                    tool_count=len(response.tool_calls),
+                )
+
+                # 执行工具调用
+                tool_results = await self._execute_tool_calls(
+                    response.tool_calls,
+                    user_id,
+                    session_id,
+                    personality_id,
+                    request_id,
+                    timer,
+                    deadline,
+                )
+
+                # 回填工具调用结果到消息列表
+                messages.append(
+                    ChatMessage(
+                        role="assistant",
+                        content=response.content or "",
+                        tool_calls=response.tool_calls,
+                    )
+                )
+                for tool_result in tool_results:
+                    messages.append(
+                        ChatMessage(
+                            role="tool",
+                            content=tool_result["content"],
+                            tool_call_id=tool_result["tool_call_id"],
+                        )
+                    )
+
+                # 继续下一轮调用
+                continue
+
+            # 没有工具调用，退出循环
+            break
+
+        if iteration >= self.max_tool_iterations:
+            logger.warning(
+                "Tool iteration limit reached",
+                request_id=request_id,
+                max_iterations=self.max_tool_iterations,
+            )
+
+        return response, iteration
+
     async def chat_stream(
         self,
         user_id: str,
@@ -259,14 +405,70 @@ class ChatOrchestrator:
         max_tokens: int | None = None,
         top_p: float | None = None,
         tools: list[dict] | None = None,
+        idempotency_key: str | None = None,
+        timeout: float | None = None,
+    ):
+        """流式聊天 - 返回异步迭代器
+
+        指纹相同的进行中流共享同一次上游调用，后加入者从头回放已产出的 chunk；
+        携带 idempotency_key 时完整 chunk 序列短期保存在 Redis 供重试回放。
+        """
+        params = {
+            "session_id": session_id,
+            "personality_id": personality_id,
+            "message": message,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": top_p,
+            "tools": tools,
+        }
+        key = self.idempotency.build_key("chat_stream", user_id, idempotency_key, **params)
+        replayable = self.idempotency.enabled and bool(idempotency_key)
+        if key is None:
+            async for chunk in self._chat_stream(user_id, **params, timeout=timeout):
+                yield chunk
+            return
+
+        if replayable:
+            stored = await self.idempotency.get(key)
+            if stored is not None:
+                for chunk in stored:
+                    yield chunk
+                return
+
+        async def produce():
+            chunks = []
+            async for chunk in self._chat_stream(user_id, **params, timeout=timeout):
+                if replayable:
+                    chunks.append(chunk)
+                yield chunk
+            if replayable:
+                await self.idempotency.set(key, chunks)
+
+        async for chunk in self.singleflight.stream(key, produce):
+            yield chunk
+
+    async def _chat_stream(
+        self,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        message: str,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+        top_p: float | None = None,
+        tools: list[dict] | None = None,
+        timeout: float | None = None,
     ):
-        """流式聊天 - 返回异步迭代器"""
         request_id = str(uuid.uuid4())
-        start_time = time.time()
+        timer = PhaseTimer("chat_stream")
+        # 同一流的所有 chunk 共用 created（与 OpenAI 行为一致，也便于帧前缀复用）
+        created = int(time.time())
 
         try:
             # 1. 验证人格
-            personality = self.personality_registry.get(personality_id)
+            with timer.phase("personality_resolution"):
+                personality = self.personality_registry.get(personality_id)
             if not personality:
                 raise NotFoundError(resource="Personality", identifier=personality_id)
 
@@ -278,44 +480,43 @@ class ChatOrchestrator:
                 personality_id=personality_id,
             )
 
-            # 2. 获取模型参数
+            # 2. 获取模型参数；截止时间从此刻起算，后续各阶段超时由剩余预算推导
             ai_config = personality.ai
+            deadline = Deadline.for_request(timeout, ai_config.request_timeout)
             model_temperature = temperature if temperature is not None else ai_config.temperature
             model_max_tokens = max_tokens if max_tokens is not None else ai_config.max_tokens
             model_top_p = top_p if top_p is not None else ai_config.top_p
 
-            # 3. 构建上下文
-            context_bundle = await self.context_service.build_context_bundle(
-                user_id=user_id,
-                session_id=session_id,
-                current_message=message,
-                personality=personality,
-                max_tokens=model_max_tokens,
-                request_id=request_id,
-            )
-            messages = self.context_service.to_messages(context_bundle, message)
-
-            # 4. 获取引擎
+            # 3+4. 并发构建上下文与获取引擎
             engine_type = ai_config.provider
-            engine = await self.engine_registry.get_or_create(
-                engine_type,
-                {
-                    "api_key": self._get_api_key(engine_type),
-                    "base_url": self._get_base_url(engine_type),
-                    "model": ai_config.model,
-                },
+            context_bundle, (engine, engine_meta) = await asyncio.gather(
+                timer.timed(
+                    "context_build",
+                    self.context_service.build_context_bundle(
+                        user_id=user_id,
+                        session_id=session_id,
+                        current_message=message,
+                        personality=personality,
+                        max_tokens=model_max_tokens,
+                        request_id=request_id,
+                        timer=timer,
+                        deadline=deadline.child() if deadline else None,
+                    ),
+                ),
+                timer.timed("engine_acquire", self._acquire_chat_engine(ai_config, deadline)),
             )
+            context_bundle.metadata["engines"]["ai"] = engine_meta
+            messages = self.context_service.to_messages(context_bundle, message)
 
             # 5. 持久化用户消息
-            async with db_manager.session() as session:
-                await self._persist_message(
-                    session=session,
+            with timer.phase("persistence", role="user"):
+                await self._persist_messages(
                     user_id=user_id,
                     session_id=session_id,
-                    role="user",
-                    content=message,
                     personality_id=personality_id,
                     request_id=request_id,
+                    messages=[("user", message)],
+                    model=ai_config.model,
                 )
 
             # 6. 准备工具（如果支持）
@@ -330,12 +531,34 @@ class ChatOrchestrator:
                         tool_count=len(allowed_tools),
                     )
 
-            # 7. 工具循环（流式）
+            # 7. 补全缓存：命中时以合成 chunk 回放，跳过 AI 引擎调用
+            cache_key = None
+            cached_response = None
+            if self.completion_cache.is_eligible(personality, model_temperature):
+                cache_key = self.completion_cache.build_key(
+                    engine_type,
+                    ai_config.model,
+                    messages,
+                    model_temperature,
+                    model_max_tokens,
+                    model_top_p,
+                    openai_tools,
+                )
+                cached_response = await timer.timed(
+                    "completion_cache_lookup", self.completion_cache.get(cache_key)
+                )
+
+            if cached_response is not None:
+                for chunk in self._cached_stream_chunks(cached_response, request_id, ai_config.model):
+                    yield chunk
+
+            # 8. 工具循环（流式）
             iteration = 0
-            full_response = ""
+            full_response = cached_response.content if cached_response else ""
             final_tool_calls = None
+            truncated = False
 
-            while iteration < self.max_tool_iterations:
+            while cached_response is None and iteration < self.max_tool_iterations:
                 logger.info(
                     "Calling AI engine (stream)",
                     request_id=request_id,
@@ -347,35 +570,93 @@ class ChatOrchestrator:
                 current_response = ""
                 current_tool_calls = None
                 finish_reason = None
+                call_start = time.perf_counter()
+                first_token_at = None
+                deltas = 0
+                completion_tokens = None
 
-                async for chunk in engine.chat_stream(
+                tool_batch = self._new_tool_batch(
+                    user_id, session_id, personality_id, request_id, timer, deadline
+                )
+                upstream = engine.chat_stream(
                     messages=messages,
                     temperature=model_temperature,
                     max_tokens=model_max_tokens,
                     top_p=model_top_p,
                     tools=openai_tools,
-                ):
-                    current_response += chunk.get("content", "")
-                    finish_reason = chunk.get("finish_reason")
-
-                    # 检测工具调用（流式chunk可能携带tool_calls）
-                    if "tool_calls" in chunk:
-                        current_tool_calls = chunk.get("tool_calls")
+                )
+                try:
+                    async for chunk in (
+                        deadline.iterate(upstream, "llm_call") if deadline else upstream
+                    ):
+                        # 单个工具调用参数已完整：立即开始执行，流继续接收
+                        if "tool_call" in chunk:
+                            tool_batch.start(chunk["tool_call"])
+                            continue
+
+                        current_response += chunk.get("content", "")
+                        finish_reason = chunk.get("finish_reason")
+                        if chunk.get("content"):
+                            deltas += 1
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                        if chunk.get("usage"):
+                            completion_tokens = chunk["usage"].get("completion_tokens")
+
+                        # 检测工具调用（流式chunk可能携带tool_calls）
+                        if "tool_calls" in chunk:
+                            current_tool_calls = chunk.get("tool_calls")
+
+                        # Yield chunk给客户端
+                        yield {
+                            "id": f"chatcmpl-{request_id}",
+                            "object": "chat.completion.chunk",
+                            "created": created,
+                            "model": engine.model,
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "delta": {"content": chunk.get("content", "")},
+                                    "finish_reason": finish_reason,
+                                }
+                            ],
+                        }
+                except DeadlineExceededError:
+                    tool_batch.cancel()
+                    # 已向客户端输出内容时按截断结束流，而不是中途报错
+                    if not current_response:
+                        raise
+                    truncated = True
+                except BaseException:
+                    tool_batch.cancel()
+                    raise
+
+                # 流式无 usage 时以内容增量数近似 token 数
+                timer.record_llm_call(
+                    time.perf_counter() - call_start,
+                    completion_tokens=completion_tokens or deltas,
+                    ttft=first_token_at - call_start if first_token_at else None,
+                    iteration=iteration,
+                )
 
-                    # Yield chunk给客户端
+                if truncated:
+                    logger.warning(
+                        "Stream truncated at request deadline",
+                        request_id=request_id,
+                        iteration=iteration,
+                    )
+                    finish_reason = "length"
                     yield {
                         "id": f"chatcmpl-{request_id}",
                         "object": "chat.completion.chunk",
-                        "created": int(datetime.now().timestamp()),
-                        "model": ai_config.model,
+                        "created": created,
+                        "model": engine.model,
                         "choices": [
-                            {
-                                "index": 0,
-                                "delta": {"content": chunk.get("content", "")},
-                                "finish_reason": finish_reason,
-                            }
+                            {"index": 0, "delta": {"content": ""}, "finish_reason": finish_reason}
                         ],
                     }
+                    full_response = current_response
+                    break
 
                 # 检查是否需要工具调用
                 if finish_reason == "tool_calls" and current_tool_calls:
@@ -389,10 +670,8 @@ class ChatOrchestrator:
                         iteration=iteration,
                     )
 
-                    # 执行工具
-                    tool_results = await self._execute_tool_calls(
-                        current_tool_calls, user_id, session_id, personality_id, request_id
-                    )
+                    # 执行工具（流中已开始的调用直接等待其结果）
+                    tool_results = await tool_batch.collect(current_tool_calls)
 
                     # 回填消息
                     messages.append(
@@ -416,8 +695,8 @@ class ChatOrchestrator:
                     yield {
                         "id": f"chatcmpl-{request_id}",
                         "object": "chat.completion.chunk",
-                        "created": int(datetime.now().timestamp()),
-                        "model": ai_config.model,
+                        "created": created,
+                        "model": engine.model,
                         "choices": [
                             {
                                 "index": 0,
@@ -430,6 +709,7 @@ class ChatOrchestrator:
                     continue
 
                 # 无工具调用，保存响应并退出循环
+                tool_batch.cancel()
                 full_response = current_response
                 break
 
@@ -441,26 +721,45 @@ class ChatOrchestrator:
                     max_iterations=self.max_tool_iterations,
                 )
 
-            # 8. 流式完成后持久化助手消息
-            async with db_manager.session() as session:
-                await self._persist_message(
-                    session=session,
+            if (
+                cache_key
+                and cached_response is None
+                and iteration == 0
+                and not truncated
+                and not engine.failed_over
+            ):
+                await self.completion_cache.set(
+                    cache_key,
+                    ChatResponse(content=full_response, finish_reason=finish_reason),
+                    personality.cache.ttl,
+                )
+
+            # 9. 流式完成后持久化助手消息
+            with timer.phase("persistence", role="assistant"):
+                await self._persist_messages(
                     user_id=user_id,
                     session_id=session_id,
-                    role="assistant",
-                    content=full_response,
                     personality_id=personality_id,
                     request_id=request_id,
+                    messages=[("assistant", full_response)],
+                    model=engine.model,
                 )
+                await self.summarizer.schedule(session_id, engine_type, ai_config.model)
+                await self.prefetcher.schedule(user_id, session_id, personality_id, full_response)
 
-            elapsed_time = time.time() - start_time
+            timings = timer.finish()
+            engine_meta.update(engine.served_metadata())
             logger.info(
                 "Stream chat completed",
                 request_id=request_id,
-                elapsed_time=elapsed_time,
+                served_by=engine_meta["provider"],
+                failover=engine_meta["failover"],
+                elapsed_time=timings["total_ms"] / 1000,
+                phases=timer.breakdown(),
+                timings=timings,
             )
 
-            # 8. 发送 [DONE] 信号
+            # 10. 发送 [DONE] 信号
             yield {"data": "[DONE]"}
 
         except Exception as e:
@@ -472,78 +771,111 @@ class ChatOrchestrator:
             )
             raise
 
-    async def _persist_message(
+    def _cached_stream_chunks(
+        self,
+        response: ChatResponse,
+        request_id: str,
+        model: str,
+    ) -> list[dict]:
+        """把缓存的完整响应切分为 chat.completion.chunk，末块带结束原因与 usage"""
+        created = int(datetime.now().timestamp())
+        pieces = self.completion_cache.replay_chunks(response.content)
+        chunks = []
+        for index, piece in enumerate(pieces):
+            is_last = index == len(pieces) - 1
+            chunk = {
+                "id": f"chatcmpl-{request_id}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": piece},
+                        "finish_reason": response.finish_reason if is_last else None,
+                    }
+                ],
+            }
+            if is_last:
+                chunk["usage"] = response.usage
+            chunks.append(chunk)
+        return chunks
+
+    async def _persist_messages(
         self,
-        session: AsyncSession,  # noqa: ARG002
         user_id: str,
         session_id: str,
-        role: str,
-        content: str,  # noqa: ARG002
-        personality_id: str,  # noqa: ARG002
+        personality_id: str,
         request_id: str,
-    ):
-        """持久化消息到数据库"""
-        normalized_user_id = self._normalize_uuid(user_id, uuid.NAMESPACE_DNS)
-        normalized_session_id = self._normalize_uuid(session_id, uuid.NAMESPACE_URL)
-
-        session_obj = await self._get_or_create_session(
-            session=session,
-            session_id=normalized_session_id,
-            user_id=normalized_user_id,
+        messages: list[tuple[str, str]],
+        model: str | None = None,
+    ) -> list[dict]:
+        """持久化一轮消息（写后缓冲，由后台任务批量提交；model 决定 token_count 的分词器）"""
+        return await self.message_persister.submit(
+            user_id=user_id,
+            session_id=session_id,
             personality_id=personality_id,
-            external_session_id=session_id,
-        )
-
-        message = Message(
-            session_id=session_obj.id,
-            user_id=normalized_user_id,
-            role=role,
-            content=content,
-            message_metadata={"request_id": request_id},
+            request_id=request_id,
+            messages=messages,
+            model=model,
         )
-        session.add(message)
 
-        session_obj.message_count += 1
-        session_obj.last_message_at = datetime.utcnow()
-
-        logger.debug(
-            "Message persisted",
-            user_id=str(normalized_user_id),
-            session_id=str(session_obj.id),
-            role=role,
-            request_id=request_id,
+    async def _acquire_engine(self, engine_type: str, model: str) -> tuple[AIEngine, dict]:
+        """获取 AI 引擎并记录耗时（与上下文构建并发执行）"""
+        start_time = time.time()
+        engine = await self.engine_registry.get_or_create(
+            engine_type,
+            {
+                "api_key": self._get_api_key(engine_type),
+                "base_url": self._get_base_url(engine_type),
+                "model": model,
+            },
         )
-        return {"id": str(message.id), "role": role}
+        return engine, {
+            "status": "ok",
+            "latency_ms": int((time.time() - start_time) * 1000),
+            "reason": None,
+            "cache_hit": False,
+        }
+
+    async def _acquire_chat_engine(
+        self, ai_config, deadline: Deadline | None = None
+    ) -> tuple[FailoverEngine, dict]:
+        """获取对话引擎：首选 provider / model 之后按人格声明的顺序故障转移
+
+        首选引擎在此预先获取（与上下文构建并发）；备用引擎仅在需要转移时才获取。
+        """
+        targets = [AITarget(ai_config.provider, ai_config.model)] + [
+            AITarget(fallback.provider, fallback.model)
+            for fallback in getattr(ai_config, "fallbacks", [])
+        ]
+
+        async def acquire(target: AITarget) -> AIEngine:
+            engine, _ = await self._acquire_engine(target.provider, target.model)
+            return engine
 
-    @staticmethod
-    def _normalize_uuid(value: str, namespace: uuid.UUID) -> uuid.UUID:
         try:
-            return uuid.UUID(value)
-        except ValueError:
-            return uuid.uuid5(namespace, value)
-
-    async def _get_or_create_session(
-        self,
-        session: AsyncSession,
-        session_id: uuid.UUID,
-        user_id: uuid.UUID,
-        personality_id: str,
-        external_session_id: str,
-    ) -> Session:
-        result = await session.execute(select(Session).where(Session.id == session_id))
-        session_obj = result.scalar_one_or_none()
-        if session_obj:
-            return session_obj
-
-        session_obj = Session(
-            id=session_id,
-            user_id=user_id,
-            personality_id=personality_id,
-            message_count=0,
-            session_metadata={"external_session_id": external_session_id},
+            primary, engine_meta = await self._acquire_engine(ai_config.provider, ai_config.model)
+        except Exception as e:
+            if len(targets) == 1:
+                raise
+            # 首选引擎无法创建（如缺少密钥）时交给备用目标
+            primary = None
+            engine_meta = {
+                "status": "degraded",
+                "latency_ms": 0,
+                "reason": str(e),
+                "cache_hit": False,
+            }
+        engine = FailoverEngine(
+            targets,
+            acquire,
+            self.engine_registry.circuit_breaker,
+            primary=primary,
+            deadline=deadline,
         )
-        session.add(session_obj)
-        return session_obj
+        engine_meta.update(engine.served_metadata())
+        return engine, engine_meta
 
     def _get_api_key(self, engine_type: str) -> str:
         """获取引擎 API 密钥"""
@@ -595,85 +927,233 @@ class ChatOrchestrator:
         session_id: str,
         personality_id: str,
         request_id: str,
+        timer: PhaseTimer | None = None,
+        deadline: Deadline | None = None,
     ) -> list[dict]:
-        """执行工具调用并记录审计"""
-        results = []
+        """并发执行一轮工具调用，结果保持原始顺序，审计在本轮结束后批量写入"""
+        batch = self._new_tool_batch(
+            user_id, session_id, personality_id, request_id, timer, deadline
+        )
+        return await batch.collect(tool_calls)
 
-        for tool_call in tool_calls:
-            tool_call_id = tool_call.get("id")
-            function = tool_call.get("function", {})
-            tool_name = function.get("name")
-            arguments_str = function.get("arguments", "{}")
+    def _new_tool_batch(
+        self,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        request_id: str,
+        timer: PhaseTimer | None = None,
+        deadline: Deadline | None = None,
+    ) -> "_ToolCallBatch":
+        return _ToolCallBatch(
+            self, user_id, session_id, personality_id, request_id, timer, deadline
+        )
 
-            try:
-                # 解析参数
-                arguments = json.loads(arguments_str) if isinstance(arguments_str, str) else arguments_str
+    async def _execute_tool_call(
+        self,
+        tool_call: dict,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        request_id: str,
+        audit_records: list[dict],
+    ) -> dict:
+        """执行单个工具调用，失败时返回错误内容（让模型处理）"""
+        tool_call_id = tool_call.get("id")
+        function = tool_call.get("function", {})
+        tool_name = function.get("name")
+        arguments_str = function.get("arguments", "{}")
 
-                logger.info(
-                    "Executing tool",
-                    request_id=request_id,
-                    tool_name=tool_name,
-                    tool_call_id=tool_call_id,
-                )
+        try:
+            # 解析参数
+            arguments = json.loads(arguments_str) if isinstance(arguments_str, str) else arguments_str
 
-                # 执行工具
-                if not self.tools_engine:
-                    raise RuntimeError("Tools engine not initialized")
-
-                result = await self.tools_engine.invoke(
-                    name=tool_name,
-                    arguments=arguments,
-                    context={
-                        "user_id": user_id,
-                        "session_id": session_id,
-                        "personality_id": personality_id,
-                    },
-                )
+            logger.info(
+                "Executing tool",
+                request_id=request_id,
+                tool_name=tool_name,
+                tool_call_id=tool_call_id,
+            )
 
-                # 记录审计日志
-                await AuditService.log_tool_invocation(
-                    user_id=user_id,
-                    session_id=session_id,
-                    tool_name=tool_name,
-                    arguments=arguments,
-                    result={"result": result.result} if result.success else {"error": result.error},
-                    success=result.success,
-                    execution_time=result.execution_time,
-                    request_id=request_id,
-                    personality_id=personality_id,
-                )
+            # 执行工具
+            if not self.tools_engine:
+                raise RuntimeError("Tools engine not initialized")
+
+            result = await self.tools_engine.invoke(
+                name=tool_name,
+                arguments=arguments,
+                context={
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "personality_id": personality_id,
+                },
+            )
 
-                # 构造工具结果消息
-                if result.success:
-                    content = json.dumps(result.result) if isinstance(result.result, dict) else str(result.result)
-                else:
-                    content = json.dumps({"error": result.error, "tool_name": tool_name})
+            audit_records.append({
+                "user_id": user_id,
+                "session_id": session_id,
+                "tool_name": tool_name,
+                "arguments": arguments,
+                "result": {"result": result.result} if result.success else {"error": result.error},
+                "success": result.success,
+                "execution_time": result.execution_time,
+                "request_id": request_id,
+                "personality_id": personality_id,
+                "cached": result.cached,
+            })
+
+            # 构造工具结果消息
+            if result.success:
+                content = json.dumps(result.result) if isinstance(result.result, dict) else str(result.result)
+            else:
+                content = json.dumps({"error": result.error, "tool_name": tool_name})
 
-                results.append({
-                    "tool_call_id": tool_call_id,
-                    "content": content,
-                })
+            return {
+                "tool_call_id": tool_call_id,
+                "content": content,
+            }
 
-            except Exception as e:
-                logger.error(
-                    "Tool execution failed",
-                    request_id=request_id,
-                    tool_name=tool_name,
-                    error=str(e),
-                    exc_info=True,
-                )
+        except Exception as e:
+            logger.error(
+                "Tool execution failed",
+                request_id=request_id,
+                tool_name=tool_name,
+                error=str(e),
+                exc_info=True,
+            )
+
+            # 工具失败仍然返回结果（让模型处理）
+            return {
+                "tool_call_id": tool_call_id,
+                "content": json.dumps({
+                    "error": str(e),
+                    "tool_name": tool_name,
+                }),
+            }
 
-                # 工具失败仍然返回结果（让模型处理）
-                results.append({
-                    "tool_call_id": tool_call_id,
-                    "content": json.dumps({
-                        "error": str(e),
-                        "tool_name": tool_name,
-                    }),
-                })
+    def _is_serial_tool(self, tool_name: str | None) -> bool:
+        """有写入/危险副作用的工具需要串行执行"""
+        if not self.tools_engine or not tool_name:
+            return False
+        tool_def = self.tools_engine.get_tool(tool_name)
+        return tool_def is not None and tool_def.side_effect in (
+            ToolSideEffect.WRITE,
+            ToolSideEffect.DANGEROUS,
+        )
+
+    @staticmethod
+    def _get_max_concurrent_tool_calls() -> int:
+        """获取单轮工具调用并发上限"""
+        try:
+            return get_config().tools.limits.max_concurrent_calls
+        except Exception:
+            # 配置读取失败，使用默认值（降级策略）
+            return 5
+
+
+class _ToolCallBatch:
+    """一轮工具调用的调度状态
+
+    - 并发度受 tools.limits.max_concurrent_calls 限制
+    - WRITE/DANGEROUS 工具之间串行执行（按调用顺序）
+    - 流式场景下可在单个调用参数完整时提前 start，collect 时按原始顺序汇总
+    - 有截止时间时每个调用的超时为剩余预算减去 min_llm_time（留给后续 LLM 调用），
+      超时的调用以错误结果返回给模型
+    """
+
+    def __init__(
+        self,
+        orchestrator: ChatOrchestrator,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        request_id: str,
+        timer: PhaseTimer | None = None,
+        deadline: Deadline | None = None,
+    ):
+        self._orchestrator = orchestrator
+        self._call_args = (user_id, session_id, personality_id, request_id)
+        self._timer = timer
+        self._deadline = deadline
+        self._semaphore = asyncio.Semaphore(orchestrator._get_max_concurrent_tool_calls())
+        self._serial_lock = asyncio.Lock()
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.audit_records: list[dict] = []
+
+    def start(self, tool_call: dict, key: str | None = None) -> None:
+        """开始执行单个工具调用（重复 start 同一调用无副作用）"""
+        key = key or tool_call.get("id")
+        if not key or key in self._tasks:
+            return
+        self._tasks[key] = asyncio.create_task(self._run(tool_call))
+
+    async def collect(self, tool_calls: list[dict]) -> list[dict]:
+        """等待本轮全部调用完成，按原始顺序返回结果并批量写入审计"""
+        keys = [tool_call.get("id") or f"#{index}" for index, tool_call in enumerate(tool_calls)]
+        for key, tool_call in zip(keys, tool_calls):
+            self.start(tool_call, key)
+        try:
+            results = list(await asyncio.gather(*(self._tasks[key] for key in keys)))
+        finally:
+            self.cancel()
 
+        # 记录审计日志（单事务批量写入）
+        await AuditService.log_tool_invocations(self.audit_records)
         return results
 
+    def cancel(self) -> None:
+        """取消尚未完成的调用（流中断或异常时）"""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+    async def _run(self, tool_call: dict) -> dict:
+        if self._orchestrator._is_serial_tool(tool_call.get("function", {}).get("name")):
+            # 先排队串行锁再占并发槽，避免写操作占着槽位空等
+            async with self._serial_lock, self._semaphore:
+                return await self._execute(tool_call)
+        async with self._semaphore:
+            return await self._execute(tool_call)
+
+    async def _execute(self, tool_call: dict) -> dict:
+        """执行单个调用（计时不含排队等待）"""
+        execution = self._bounded(
+            tool_call,
+            self._orchestrator._execute_tool_call(tool_call, *self._call_args, self.audit_records),
+        )
+        if self._timer is None:
+            return await execution
+        tool_name = tool_call.get("function", {}).get("name")
+        tools_engine = self._orchestrator.tools_engine
+        if not tools_engine or not tools_engine.get_tool(tool_name or ""):
+            # 模型生成的未知工具名不作为指标标签，避免标签基数失控
+            tool_name = "unknown"
+        return await self._timer.timed(f"tool.{tool_name}", execution)
+
+    async def _bounded(self, tool_call: dict, execution) -> dict:
+        if self._deadline is None:
+            return await execution
+        try:
+            return await self._deadline.run(
+                "tool_execution", execution, reserve=self._deadline.min_llm_time
+            )
+        except DeadlineExceededError:
+            tool_name = tool_call.get("function", {}).get("name")
+            logger.warning(
+                "Tool skipped or cut off at request deadline",
+                request_id=self._call_args[3],
+                tool_name=tool_name,
+            )
+            return {
+                "tool_call_id": tool_call.get("id"),
+                "content": json.dumps({"error": "deadline exceeded", "tool_name": tool_name}),
+            }
+
+
+def _with_metadata(response: dict, **flags) -> dict:
+    """复制共享响应并标记其来源（合并/幂等回放），避免修改其他请求持有的对象"""
+    return {**response, "metadata": {**response.get("metadata", {}), **flags}}
+
 
 # 全局编排器实例
 _orchestrator: ChatOrchestrator | None = None
@@ -700,6 +1180,9 @@ async def initialize_orchestrator(
     
     # 初始化工具引擎
     await _orchestrator.initialize_tools_engine()
+
+    # 预先创建各人格使用的 AI 引擎：连接池在启动时完成握手，首个请求不再承担建连开销
+    await _orchestrator.warm_up_engines()
     
     logger.info("ChatOrchestrator initialized with tools engine")
     return _orchestrator
@@ -0,0 +1,130 @@
+"""补全缓存 - 完全相同的确定性请求直接返回缓存响应（L1 内存 + Redis L2）"""
+
+import hashlib
+import json
+import time
+
+from app.core.config.manager import get_config
+from app.core.personalities.models import Personality
+from app.engines.ai import ChatMessage, ChatResponse
+from app.engines.base_remote import L1Cache
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+from app.storage.redis import redis_manager
+
+logger = get_logger(__name__)
+
+completion_cache_hits = metrics.counter("completion_cache_hits_total", "Completion cache hits")
+completion_cache_misses = metrics.counter("completion_cache_misses_total", "Completion cache misses")
+
+# 可缓存的结束原因（工具调用轮次依赖外部结果，不缓存）
+_CACHEABLE_FINISH_REASONS = {"stop", "length"}
+
+
+class CompletionCache:
+    """补全缓存
+
+    键为模型、采样参数、工具定义与完整消息列表的哈希；
+    人格通过 cache.enabled 开启，TTL 按人格配置。
+    """
+
+    def __init__(self, l1_max_entries: int | None = None, key_prefix: str | None = None):
+        self.enabled = True
+        self.key_prefix = key_prefix or "cozy:completion:"
+        capacity = l1_max_entries or 1000
+        try:
+            cache_config = get_config().engines.ai.completion_cache
+            self.enabled = cache_config.enabled
+            self.key_prefix = key_prefix or cache_config.key_prefix
+            capacity = l1_max_entries or cache_config.l1_max_entries
+        except Exception:
+            pass
+        # L1 条目按各自 TTL 过期，容器本身的 TTL 仅作上限
+        self._l1: L1Cache[tuple[dict, float]] = L1Cache(capacity=capacity, ttl=86400.0)
+
+    def is_eligible(self, personality: Personality, temperature: float) -> bool:
+        """人格开启缓存且请求足够确定时才参与缓存"""
+        return (
+            self.enabled
+            and personality.cache.enabled
+            and temperature <= personality.cache.max_temperature
+        )
+
+    def build_key(
+        self,
+        provider: str,
+        model: str,
+        messages: list[ChatMessage],
+        temperature: float,
+        max_tokens: int,
+        top_p: float,
+        tools: list[dict] | None,
+    ) -> str:
+        payload = {
+            "provider": provider,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": top_p,
+            "tools": tools or [],
+            "messages": [
+                {
+                    "role": msg.role,
+                    "content": msg.content,
+                    "tool_calls": msg.tool_calls,
+                    "tool_call_id": msg.tool_call_id,
+                }
+                for msg in messages
+            ],
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return self.key_prefix + hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str) -> ChatResponse | None:
+        """查询缓存（先 L1 后 Redis），命中时 usage 标记 cache_hit"""
+        entry = self._l1.get(key)
+        cached = None
+        if entry is not None:
+            value, expires_at = entry
+            if time.time() < expires_at:
+                cached = value
+
+        if cached is None:
+            raw = await redis_manager.get(key)
+            if raw:
+                try:
+                    cached = json.loads(raw)
+                except ValueError:
+                    cached = None
+
+        if cached is None:
+            completion_cache_misses.inc()
+            return None
+
+        completion_cache_hits.inc()
+        usage = dict(cached.get("usage") or {})
+        usage["cache_hit"] = True
+        return ChatResponse(
+            content=cached["content"],
+            finish_reason=cached["finish_reason"],
+            usage=usage,
+        )
+
+    async def set(self, key: str, response: ChatResponse, ttl: int) -> None:
+        """写入缓存（仅缓存正常结束、无工具调用的响应）"""
+        if response.finish_reason not in _CACHEABLE_FINISH_REASONS or response.tool_calls:
+            return
+        value = {
+            "content": response.content,
+            "finish_reason": response.finish_reason,
+            "usage": response.usage,
+        }
+        self._l1.set(key, (value, time.time() + ttl))
+        await redis_manager.set(key, json.dumps(value), expire=ttl)
+
+    @staticmethod
+    def replay_chunks(content: str, chunk_size: int = 32) -> list[str]:
+        """把缓存内容切分为流式 delta"""
+        if not content:
+            return [""]
+        return [content[i : i + chunk_size] for i in range(0, len(content), chunk_size)]
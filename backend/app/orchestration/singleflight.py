@@ -0,0 +1,194 @@
+"""请求合并（singleflight）与幂等键 - 相同指纹的进行中请求共享同一次上游调用"""
+
+import asyncio
+import hashlib
+import json
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from app.core.config.manager import get_config
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+from app.storage.redis import redis_manager
+
+logger = get_logger(__name__)
+
+coalesced_requests = metrics.counter(
+    "coalesced_requests_total", "Requests served by joining an in-flight leader"
+)
+idempotent_replays = metrics.counter(
+    "idempotent_replays_total", "Requests served from a stored idempotent response"
+)
+
+
+class _StreamFlight:
+    """一次进行中的流：后台任务驱动生成器，所有订阅者从头回放已产出的 chunk"""
+
+    def __init__(self, factory: Callable[[], AsyncIterator[dict]]):
+        self.chunks: list[dict] = []
+        self.done = False
+        self.abandoned = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self._condition = asyncio.Condition()
+        self.task = asyncio.create_task(self._drive(factory))
+
+    async def _drive(self, factory: Callable[[], AsyncIterator[dict]]) -> None:
+        try:
+            async for chunk in factory():
+                async with self._condition:
+                    self.chunks.append(chunk)
+                    self._condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[dict]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(
+                        lambda seen=index: seen < len(self.chunks) or self.done
+                    )
+                    pending = self.chunks[index:]
+                    finished = self.done
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                if finished and index >= len(self.chunks):
+                    break
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            # 所有订阅者都已离开（客户端断开）时停止上游生成
+            if self.subscribers == 0 and not self.done:
+                self.abandoned = True
+                self.task.cancel()
+
+
+class SingleFlight:
+    """按键合并进行中的请求
+
+    - do: 非流式，领导者的调用在独立任务中执行，跟随者等待同一结果（或异常）
+    - stream: 流式，跟随者订阅领导者的 chunk 流（从头回放）
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _StreamFlight] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls or key in self._streams
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """执行或加入进行中的调用，返回 (结果, 是否为跟随者)"""
+        task = self._calls.get(key)
+        joined = task is not None
+        if joined:
+            coalesced_requests.inc(kind="chat")
+            logger.info("Joined in-flight request", coalesce_key=key)
+        else:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._release_call(key, task))
+        # 单个调用方被取消不影响其他等待者
+        return await asyncio.shield(task), joined
+
+    async def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[dict]]
+    ) -> AsyncIterator[dict]:
+        """启动或订阅进行中的流"""
+        flight = self._streams.get(key)
+        if flight is None or flight.done or flight.abandoned:
+            flight = _StreamFlight(factory)
+            self._streams[key] = flight
+            flight.task.add_done_callback(lambda _: self._release_stream(key, flight))
+        else:
+            coalesced_requests.inc(kind="chat_stream")
+            logger.info("Joined in-flight stream", coalesce_key=key)
+
+        async for chunk in flight.subscribe():
+            yield chunk
+
+    def _release_call(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 无人等待时（所有调用方均已取消）避免未取回异常的警告
+        if not task.cancelled():
+            task.exception()
+
+    def _release_stream(self, key: str, flight: _StreamFlight) -> None:
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+
+class IdempotencyStore:
+    """幂等键响应存储 - 已完成的响应短期保存在 Redis，重试直接返回"""
+
+    def __init__(
+        self,
+        enabled: bool | None = None,
+        coalesce_inflight: bool | None = None,
+        ttl: int | None = None,
+        key_prefix: str | None = None,
+    ):
+        self.enabled = True
+        self.coalesce_inflight = True
+        self.ttl = 300
+        self.key_prefix = "cozy:idem:"
+        try:
+            cfg = get_config().api.idempotency
+            self.enabled = cfg.enabled
+            self.coalesce_inflight = cfg.coalesce_inflight
+            self.ttl = cfg.ttl
+            self.key_prefix = cfg.key_prefix
+        except Exception:
+            pass
+        if enabled is not None:
+            self.enabled = enabled
+        if coalesce_inflight is not None:
+            self.coalesce_inflight = coalesce_inflight
+        if ttl is not None:
+            self.ttl = ttl
+        if key_prefix is not None:
+            self.key_prefix = key_prefix
+
+    def build_key(
+        self,
+        kind: str,
+        user_id: str,
+        idempotency_key: str | None,
+        **fingerprint: Any,
+    ) -> str | None:
+        """显式幂等键按用户隔离；否则以请求内容指纹作为合并键
+
+        返回 None 表示该请求不参与合并。
+        """
+        if idempotency_key and self.enabled:
+            return f"{self.key_prefix}{kind}:{user_id}:{idempotency_key}"
+        if not self.coalesce_inflight:
+            return None
+        canonical = json.dumps(
+            {"user_id": user_id, **fingerprint}, sort_keys=True, separators=(",", ":"), default=str
+        )
+        return f"inflight:{kind}:" + hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str) -> Any | None:
+        raw = await redis_manager.get(key)
+        if not raw:
+            return None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return None
+        idempotent_replays.inc()
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        await redis_manager.set(key, json.dumps(value, default=str), expire=self.ttl)
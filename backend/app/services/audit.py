@@ -1,13 +1,273 @@
 """审计事件服务"""
 
+import asyncio
+import contextlib
+import json
 import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any
 
+from sqlalchemy import insert
+
+from app.core.config.manager import get_config
 from app.observability.logging import get_logger
+from app.observability.metrics import metrics
 from app.storage.database import db_manager
 from app.storage.models import AuditEvent
+from app.storage.redis import redis_manager
 
 logger = get_logger(__name__)
 
+audit_queue_depth = metrics.gauge("audit_queue_depth", "Audit events waiting to be flushed")
+audit_events_dropped = metrics.counter("audit_events_dropped_total", "Audit events dropped")
+audit_events_spilled = metrics.counter("audit_events_spilled_total", "Audit events spilled to Redis")
+audit_events_flushed = metrics.counter("audit_events_flushed_total", "Audit events written to DB")
+
+
+class AuditSink:
+    """审计事件批量写入器
+
+    - 运行中：事件进入有界内存队列，后台任务按时间窗口/条数做多行 INSERT
+    - 队列满时按 overflow_policy 处理：drop_oldest 丢弃最旧事件；
+      spill_redis 溢写到 Redis 列表，由后台任务回灌（Redis 不可用时退化为 drop_oldest）
+    - 未启动或已关闭：退化为同步写入
+    - 关闭时排空内存队列与 Redis 溢写列表；数据库不可用时剩余事件溢写到 Redis
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 200,
+        max_batch_events: int = 500,
+        max_queue_events: int = 10000,
+        overflow_policy: str = "drop_oldest",
+        spill_key: str = "cozy:audit:spill",
+        shutdown_timeout: float = 10.0,
+    ):
+        self.enabled = True
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_events = max_batch_events
+        self.max_queue_events = max_queue_events
+        self.overflow_policy = overflow_policy
+        self.spill_key = spill_key
+        self.shutdown_timeout = shutdown_timeout
+        self.running = False
+        self._queue: deque[dict[str, Any]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _load_config(self) -> None:
+        try:
+            cfg = get_config().security.audit.sink
+        except Exception:
+            return
+        self.enabled = cfg.enabled
+        self.flush_interval = cfg.flush_interval_ms / 1000
+        self.max_batch_events = cfg.max_batch_events
+        self.max_queue_events = cfg.max_queue_events
+        self.overflow_policy = cfg.overflow_policy
+        self.spill_key = cfg.spill_key
+        self.shutdown_timeout = cfg.shutdown_timeout
+
+    async def start(self) -> None:
+        """启动后台刷写任务"""
+        if self.running:
+            return
+        self._load_config()
+        if not self.enabled:
+            logger.info("Audit sink disabled, writing audit events synchronously")
+            return
+
+        self._wakeup = asyncio.Event()
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "AuditSink started",
+            flush_interval_ms=int(self.flush_interval * 1000),
+            max_batch_events=self.max_batch_events,
+            overflow_policy=self.overflow_policy,
+        )
+
+    async def stop(self) -> None:
+        """停止并排空队列（含 Redis 溢写的事件）"""
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.shutdown_timeout)
+            except TimeoutError:
+                self._task.cancel()
+                logger.error("AuditSink shutdown drain timed out", remaining=len(self._queue))
+            self._task = None
+
+        # 仍未写入的事件（数据库不可用/超时）溢写到 Redis，下次启动回灌
+        if self._queue:
+            remaining = list(self._queue)
+            self._queue.clear()
+            if not await self._spill(remaining):
+                audit_events_dropped.inc(len(remaining), reason="shutdown")
+                logger.error("Audit events lost on shutdown", count=len(remaining))
+        audit_queue_depth.set(0)
+        logger.info("AuditSink stopped")
+
+    async def submit(self, events: list[dict[str, Any]]) -> None:
+        """提交审计事件行（字段与 AuditEvent 列一致）"""
+        if not events:
+            return
+
+        if not self.running:
+            await self._write(events)
+            return
+
+        overflow = len(self._queue) + len(events) - self.max_queue_events
+        if overflow > 0:
+            if self.overflow_policy == "spill_redis" and await self._spill(events):
+                return
+            # 丢弃最旧事件为新事件腾出空间
+            for _ in range(min(overflow, len(self._queue))):
+                self._queue.popleft()
+            audit_events_dropped.inc(overflow, reason="overflow")
+            logger.warning("Audit queue full, dropped oldest events", dropped=overflow)
+            events = events[-self.max_queue_events:]
+
+        self._queue.extend(events)
+        audit_queue_depth.set(len(self._queue))
+        if len(self._queue) >= self.max_batch_events:
+            self._wakeup.set()
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    async def _run(self) -> None:
+        """后台刷写循环"""
+        while self.running or self._queue:
+            if self.running and len(self._queue) < self.max_batch_events:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            self._wakeup.clear()
+
+            try:
+                while self._queue:
+                    batch = [
+                        self._queue.popleft()
+                        for _ in range(min(self.max_batch_events, len(self._queue)))
+                    ]
+                    audit_queue_depth.set(len(self._queue))
+                    try:
+                        await self._write_batch(batch)
+                    except Exception:
+                        # 放回队首，下一轮重试
+                        self._queue.extendleft(reversed(batch))
+                        audit_queue_depth.set(len(self._queue))
+                        raise
+                await self._drain_spill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Audit batch flush failed", error=str(e), queued=len(self._queue))
+                if not self.running:
+                    return
+                await asyncio.sleep(min(self.flush_interval * 10, 5.0))
+
+        # 关闭前回灌溢写事件（失败时事件仍留在 Redis）
+        try:
+            await self._drain_spill()
+        except Exception as e:
+            logger.error("Audit spill drain on shutdown failed", error=str(e))
+
+    async def _write_batch(self, events: list[dict[str, Any]]) -> None:
+        """批量写入；整批失败时逐条重试，隔离无法写入的坏事件
+
+        全部逐条失败视为数据库不可用，抛出异常由调用方重试。
+        """
+        try:
+            await self._write(events)
+            return
+        except Exception:
+            if len(events) == 1:
+                raise
+
+        rejected = []
+        for event in events:
+            try:
+                await self._write([event])
+            except Exception as e:
+                rejected.append((event, e))
+        if len(rejected) == len(events):
+            raise rejected[0][1]
+        for event, error in rejected:
+            audit_events_dropped.inc(reason="rejected")
+            logger.error("Audit event rejected by database", audit_id=str(event["id"]), error=str(error))
+
+    async def _write(self, events: list[dict[str, Any]]) -> None:
+        """单语句多行 INSERT"""
+        async with db_manager.session() as session:
+            await session.execute(insert(AuditEvent).values(events))
+        audit_events_flushed.inc(len(events))
+
+    async def _spill(self, events: list[dict[str, Any]]) -> bool:
+        redis = redis_manager.get_client()
+        if not redis:
+            return False
+        try:
+            await redis.rpush(self.spill_key, *[_dump_event(event) for event in events])
+        except Exception as e:
+            logger.warning("Audit spill to Redis failed", error=str(e))
+            return False
+        audit_events_spilled.inc(len(events))
+        return True
+
+    async def _drain_spill(self) -> None:
+        """队列有空间时回灌 Redis 中溢写的事件"""
+        if self.overflow_policy != "spill_redis":
+            return
+        redis = redis_manager.get_client()
+        if not redis:
+            return
+        while len(self._queue) < self.max_queue_events:
+            try:
+                payloads = await redis.lpop(self.spill_key, self.max_batch_events)
+            except Exception as e:
+                logger.warning("Audit spill drain failed", error=str(e))
+                return
+            if not payloads:
+                return
+            events = [_load_event(payload) for payload in payloads]
+            try:
+                await self._write_batch(events)
+            except Exception:
+                # 写库失败则放回溢写列表头部，保持顺序
+                await redis.lpush(self.spill_key, *reversed(payloads))
+                raise
+
+
+def _dump_event(event: dict[str, Any]) -> str:
+    return json.dumps(
+        {
+            **event,
+            "id": str(event["id"]),
+            "user_id": str(event["user_id"]) if event.get("user_id") else None,
+            "session_id": str(event["session_id"]) if event.get("session_id") else None,
+            "created_at": event["created_at"].isoformat(),
+        },
+        default=str,
+    )
+
+
+def _load_event(payload: str) -> dict[str, Any]:
+    event = json.loads(payload)
+    event["id"] = uuid.UUID(event["id"])
+    for key in ("user_id", "session_id"):
+        if event.get(key):
+            event[key] = uuid.UUID(event[key])
+    event["created_at"] = datetime.fromisoformat(event["created_at"])
+    return event
+
+
+audit_sink = AuditSink()
+
 
 class AuditService:
     """审计服务 - 记录工具调用等关键操作"""
@@ -21,6 +281,38 @@ class AuditService:
         except ValueError:
             return uuid.uuid5(namespace, value)
 
+    @staticmethod
+    def _build_tool_invocation_event(
+        user_id: str,
+        session_id: str,
+        tool_name: str,
+        arguments: dict,
+        result: dict,
+        success: bool,
+        execution_time: float,
+        request_id: str | None = None,
+        personality_id: str | None = None,
+        cached: bool = False,
+    ) -> dict[str, Any]:
+        return {
+            "id": uuid.uuid4(),
+            "event_type": "tool_invocation",
+            "user_id": AuditService._normalize_uuid(user_id, uuid.NAMESPACE_DNS),
+            "session_id": AuditService._normalize_uuid(session_id, uuid.NAMESPACE_URL),
+            "request_id": request_id or "",
+            "personality_id": personality_id,
+            "payload": {
+                "tool_name": tool_name,
+                "arguments": arguments,
+                "result": result if success else {"error": result.get("error")},
+                "success": success,
+                "execution_time": execution_time,
+                "cached": cached,
+            },
+            # 事件发生时间（而非落库时间）
+            "created_at": datetime.utcnow(),
+        }
+
     @staticmethod
     async def log_tool_invocation(
         user_id: str,
@@ -34,45 +326,52 @@ class AuditService:
         personality_id: str | None = None,
     ) -> str:
         """记录工具调用审计事件"""
+        audit_ids = await AuditService.log_tool_invocations(
+            [
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "tool_name": tool_name,
+                    "arguments": arguments,
+                    "result": result,
+                    "success": success,
+                    "execution_time": execution_time,
+                    "request_id": request_id,
+                    "personality_id": personality_id,
+                }
+            ]
+        )
+        return audit_ids[0] if audit_ids else ""
+
+    @staticmethod
+    async def log_tool_invocations(invocations: list[dict]) -> list[str]:
+        """批量记录一轮工具调用审计事件（交给 audit_sink 异步批量写入）
+
+        invocations 中每项的字段与 log_tool_invocation 的参数一致。
+        """
+        if not invocations:
+            return []
+
         try:
-            normalized_user_id = AuditService._normalize_uuid(user_id, uuid.NAMESPACE_DNS)
-            normalized_session_id = AuditService._normalize_uuid(session_id, uuid.NAMESPACE_URL)
-
-            async with db_manager.session() as session:
-                audit_event = AuditEvent(
-                    id=uuid.uuid4(),
-                    event_type="tool_invocation",
-                    user_id=normalized_user_id,
-                    session_id=normalized_session_id,
-                    request_id=request_id,
-                    personality_id=personality_id,
-                    payload={
-                        "tool_name": tool_name,
-                        "arguments": arguments,
-                        "result": result if success else {"error": result.get("error")},
-                        "success": success,
-                        "execution_time": execution_time,
-                    },
-                )
-
-                session.add(audit_event)
-                await session.commit()
-
-                logger.debug(
-                    "Tool invocation audit logged",
-                    audit_id=audit_event.id,
-                    tool_name=tool_name,
-                    success=success,
-                )
-
-                return str(audit_event.id)
+            audit_events = [
+                AuditService._build_tool_invocation_event(**invocation)
+                for invocation in invocations
+            ]
+            await audit_sink.submit(audit_events)
+
+            logger.debug(
+                "Tool invocation audits logged",
+                count=len(audit_events),
+                tool_names=[invocation["tool_name"] for invocation in invocations],
+            )
+            return [str(audit_event["id"]) for audit_event in audit_events]
 
         except Exception as e:
             logger.error(
-                "Failed to log tool invocation audit",
-                tool_name=tool_name,
+                "Failed to log tool invocation audits",
+                count=len(invocations),
                 error=str(e),
                 exc_info=True,
             )
             # 审计失败不应阻塞主流程
-            return ""
+            return []
@@ -0,0 +1,220 @@
+"""会话热上下文缓存 - 每会话最近消息的环形缓冲（进程内 L1 LRU + Redis L2）"""
+
+import json
+import uuid
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Protocol
+
+from redis.exceptions import WatchError
+
+from app.core.config.manager import get_config
+from app.core.config.schemas import HistoryCacheConfig
+from app.engines.base_remote import L1Cache
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+from app.storage.redis import redis_manager
+
+logger = get_logger(__name__)
+
+history_cache_hits = metrics.counter("history_cache_hits_total", "Session history cache hits")
+history_cache_misses = metrics.counter("history_cache_misses_total", "Session history cache misses")
+
+# 列表头哨兵：缓冲区包含会话的全部消息。超出容量被裁剪后哨兵随之移出
+_COMPLETE_SENTINEL = "^"
+
+
+class _MessageRow(Protocol):
+    id: uuid.UUID
+    role: str
+    content: str
+    token_count: int | None
+    created_at: datetime
+
+
+@dataclass(frozen=True)
+class CachedMessage:
+    """缓存中的一条消息"""
+
+    id: uuid.UUID
+    role: str
+    content: str
+    token_count: int | None
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, row: _MessageRow) -> "CachedMessage":
+        return cls(row.id, row.role, row.content, row.token_count, row.created_at)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            [str(self.id), self.role, self.content, self.token_count, self.created_at.isoformat()],
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, payload: str) -> "CachedMessage":
+        message_id, role, content, token_count, created_at = json.loads(payload)
+        return cls(
+            uuid.UUID(message_id), role, content, token_count, datetime.fromisoformat(created_at)
+        )
+
+
+@dataclass(frozen=True)
+class HistorySnapshot:
+    """某一版本的会话缓冲（messages 按 created_at 升序）"""
+
+    version: int
+    messages: tuple[CachedMessage, ...]
+    complete: bool
+
+
+class SessionHistoryCache:
+    """会话热上下文缓存
+
+    - Redis L2：每会话一个消息列表（最近 capacity 条）和一个版本号；
+      追加与版本递增在同一事务中完成
+    - 进程内 L1：按会话缓存快照，读取时先 GET 版本号，一致才使用 L1，
+      因此多 worker 之间不会读到过期缓冲
+    - 写穿：消息提交时追加（仅当缓冲已存在）；未命中时由读取方用数据库结果回填，
+      回填通过 WATCH 版本号与并发追加互斥
+    - Redis 不可用时整体旁路，历史读取回到数据库
+    """
+
+    def __init__(self, config: HistoryCacheConfig | None = None):
+        if config is None:
+            try:
+                config = get_config().context.history.cache
+            except Exception:
+                config = HistoryCacheConfig()
+        self.enabled = config.enabled
+        self.capacity = config.capacity
+        self.ttl = config.ttl
+        self.key_prefix = config.key_prefix
+        self._l1: L1Cache[HistorySnapshot] = L1Cache(
+            capacity=config.l1_max_sessions, ttl=float(config.ttl)
+        )
+
+    def _keys(self, session_id: uuid.UUID) -> tuple[str, str]:
+        return f"{self.key_prefix}{session_id}:ver", f"{self.key_prefix}{session_id}:buf"
+
+    def _client(self):
+        return redis_manager.get_client() if self.enabled else None
+
+    async def get(self, session_id: uuid.UUID) -> HistorySnapshot | None:
+        """读取会话缓冲；版本号与 L1 一致时不读取列表"""
+        client = self._client()
+        if client is None:
+            return None
+        ver_key, buf_key = self._keys(session_id)
+        try:
+            version = await client.get(ver_key)
+            if version is not None:
+                cached = self._l1.get(str(session_id))
+                if cached is not None and cached.version == int(version):
+                    history_cache_hits.inc(layer="l1")
+                    return cached
+                async with client.pipeline(transaction=True) as pipe:
+                    pipe.get(ver_key)
+                    pipe.lrange(buf_key, 0, -1)
+                    version, raw = await pipe.execute()
+        except Exception as e:
+            logger.warning("History cache read failed", session_id=str(session_id), error=str(e))
+            return None
+
+        if version is None or not raw:
+            history_cache_misses.inc()
+            return None
+        complete = raw[0] == _COMPLETE_SENTINEL
+        messages = [CachedMessage.from_json(item) for item in raw[1 if complete else 0 :]]
+        # 多 worker 并发追加时列表顺序即到达顺序，按时间重新排序
+        messages.sort(key=lambda message: (message.created_at, message.id))
+        snapshot = HistorySnapshot(int(version), tuple(messages), complete)
+        self._l1.set(str(session_id), snapshot)
+        history_cache_hits.inc(layer="l2")
+        return snapshot
+
+    async def begin_fill(self, session_id: uuid.UUID) -> int | None:
+        """回填前读取版本号；读数据库期间若有追加，fill() 会放弃写入"""
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            return int(await client.get(self._keys(session_id)[0]) or 0)
+        except Exception:
+            return None
+
+    async def fill(
+        self,
+        session_id: uuid.UUID,
+        token: int | None,
+        messages: list[CachedMessage],
+        complete: bool,
+    ) -> None:
+        """用数据库读取结果（最新的连续消息，升序）回填缓冲"""
+        client = self._client()
+        if client is None or token is None or not (messages or complete):
+            return
+        complete = complete and len(messages) <= self.capacity
+        kept = messages[-self.capacity :]
+        items = ([_COMPLETE_SENTINEL] if complete else []) + [m.to_json() for m in kept]
+        ver_key, buf_key = self._keys(session_id)
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                await pipe.watch(ver_key)
+                if int(await pipe.get(ver_key) or 0) != token:
+                    return
+                pipe.multi()
+                pipe.delete(buf_key)
+                pipe.rpush(buf_key, *items)
+                pipe.incr(ver_key)
+                pipe.expire(buf_key, self.ttl)
+                pipe.expire(ver_key, self.ttl)
+                _, _, version, _, _ = await pipe.execute()
+        except WatchError:
+            return
+        except Exception as e:
+            logger.warning("History cache fill failed", session_id=str(session_id), error=str(e))
+            return
+        self._l1.set(str(session_id), HistorySnapshot(version, tuple(kept), complete))
+
+    async def append(self, session_id: uuid.UUID, rows: Iterable[_MessageRow]) -> None:
+        """写穿：追加新消息并递增版本号（缓冲不存在时只递增版本号）"""
+        client = self._client()
+        if client is None:
+            return
+        appended = [CachedMessage.from_row(row) for row in rows]
+        if not appended:
+            return
+        ver_key, buf_key = self._keys(session_id)
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.rpushx(buf_key, *[message.to_json() for message in appended])
+                # 预留哨兵位置：完整会话超出容量后哨兵被裁掉
+                pipe.ltrim(buf_key, -(self.capacity + 1), -1)
+                pipe.incr(ver_key)
+                pipe.expire(buf_key, self.ttl)
+                pipe.expire(ver_key, self.ttl)
+                length, _, version, _, _ = await pipe.execute()
+        except Exception as e:
+            logger.warning("History cache append failed", session_id=str(session_id), error=str(e))
+            self._l1.cache.pop(str(session_id), None)
+            return
+
+        # 本进程持有紧邻的上一版本时直接在 L1 追加，避免下次读取回源 Redis
+        cached = self._l1.get(str(session_id))
+        if cached is None or not length or cached.version != version - 1:
+            self._l1.cache.pop(str(session_id), None)
+            return
+        messages = sorted(
+            (*cached.messages, *appended), key=lambda message: (message.created_at, message.id)
+        )
+        complete = cached.complete and len(messages) <= self.capacity
+        self._l1.set(
+            str(session_id),
+            HistorySnapshot(version, tuple(messages[-(self.capacity + 1) :]), complete),
+        )
+
+
+session_history_cache = SessionHistoryCache()
@@ -0,0 +1,510 @@
+"""消息写后持久化服务（write-behind + group commit）"""
+
+import asyncio
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import insert, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config.manager import get_config
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+from app.services.history_cache import SessionHistoryCache, session_history_cache
+from app.storage.database import db_manager
+from app.storage.models import Message, Session
+from app.storage.redis import redis_manager
+from app.utils.tokenizer import get_tokenizer
+
+logger = get_logger(__name__)
+
+messages_dead_lettered = metrics.counter(
+    "messages_dead_lettered_total", "Messages rejected by the database and set aside"
+)
+
+# 支持 INSERT ... ON CONFLICT 的方言
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+@dataclass
+class PendingMessage:
+    """待持久化的消息行（id 与 created_at 在提交时确定，重放幂等）"""
+
+    id: uuid.UUID
+    session_id: uuid.UUID
+    user_id: uuid.UUID
+    personality_id: str
+    external_session_id: str
+    role: str
+    content: str
+    request_id: str
+    created_at: datetime
+    token_count: int | None = None
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "id": str(self.id),
+                "session_id": str(self.session_id),
+                "user_id": str(self.user_id),
+                "personality_id": self.personality_id,
+                "external_session_id": self.external_session_id,
+                "role": self.role,
+                "content": self.content,
+                "request_id": self.request_id,
+                "created_at": self.created_at.isoformat(),
+                "token_count": self.token_count,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, payload: str) -> "PendingMessage":
+        data = json.loads(payload)
+        return cls(
+            id=uuid.UUID(data["id"]),
+            session_id=uuid.UUID(data["session_id"]),
+            user_id=uuid.UUID(data["user_id"]),
+            personality_id=data["personality_id"],
+            external_session_id=data["external_session_id"],
+            role=data["role"],
+            content=data["content"],
+            request_id=data["request_id"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            token_count=data.get("token_count"),
+        )
+
+
+class MessagePersister:
+    """消息写后持久化器
+
+    - 运行中：消息进入有界缓冲区，后台任务按时间窗口/行数批量提交（group commit）
+    - 未启动或已关闭：退化为同步写入，语义与直接写库一致
+    - 提交时写穿会话热缓存（SessionHistoryCache）
+    - 未落库的消息保存在内存 overlay 中，供历史读取实现 read-your-writes
+    - 可选 Redis 日志（hash，按消息 id 存储），启动时幂等重放
+    - 整批多次提交失败后逐行写入，数据库拒绝的坏行移入死信（不阻塞后续消息）
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 50,
+        max_batch_rows: int = 200,
+        max_buffer_rows: int = 10000,
+        redis_journal: bool = False,
+        journal_key: str = "cozy:journal:messages",
+        shutdown_timeout: float = 10.0,
+        max_flush_retries: int = 5,
+        history_cache: SessionHistoryCache | None = None,
+    ):
+        self.enabled = True
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.max_buffer_rows = max_buffer_rows
+        self.redis_journal = redis_journal
+        self.journal_key = journal_key
+        self.shutdown_timeout = shutdown_timeout
+        self.max_flush_retries = max_flush_retries
+        self.history_cache = history_cache or session_history_cache
+        self.running = False
+        self._queue: asyncio.Queue[PendingMessage] | None = None
+        self._task: asyncio.Task | None = None
+        # session_id -> {message_id: PendingMessage}
+        self._pending: dict[uuid.UUID, dict[uuid.UUID, PendingMessage]] = {}
+
+    def _load_config(self) -> None:
+        try:
+            cfg = get_config().storage.write_behind
+        except Exception:
+            return
+        self.enabled = cfg.enabled
+        self.flush_interval = cfg.flush_interval_ms / 1000
+        self.max_batch_rows = cfg.max_batch_rows
+        self.max_buffer_rows = cfg.max_buffer_rows
+        self.redis_journal = cfg.redis_journal
+        self.journal_key = cfg.journal_key
+        self.shutdown_timeout = cfg.shutdown_timeout
+        self.max_flush_retries = cfg.max_flush_retries
+
+    async def start(self) -> None:
+        """启动后台刷写任务（并重放 Redis 日志中未落库的消息）"""
+        if self.running:
+            return
+        self._load_config()
+        if not self.enabled:
+            logger.info("Message write-behind disabled, persisting synchronously")
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.max_buffer_rows)
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+        await self._replay_journal()
+        logger.info(
+            "MessagePersister started",
+            flush_interval_ms=int(self.flush_interval * 1000),
+            max_batch_rows=self.max_batch_rows,
+            redis_journal=self.redis_journal,
+        )
+
+    async def stop(self) -> None:
+        """停止并刷写缓冲区剩余消息"""
+        if not self.running:
+            return
+        self.running = False
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.shutdown_timeout)
+            except TimeoutError:
+                self._task.cancel()
+                logger.error(
+                    "MessagePersister shutdown flush timed out",
+                    unflushed=self.pending_count(),
+                    journaled=self.redis_journal,
+                )
+            self._task = None
+        self._queue = None
+        logger.info("MessagePersister stopped")
+
+    async def submit(
+        self,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        request_id: str,
+        messages: list[tuple[str, str]],
+        model: str | None = None,
+    ) -> list[dict]:
+        """提交一轮消息；运行中仅入缓冲区，否则同步写库
+
+        token_count 在提交时按 model 对应的分词器计算，历史读取无需重复分词。
+        """
+        if not messages:
+            return []
+
+        normalized_user_id = self._normalize_uuid(user_id, uuid.NAMESPACE_DNS)
+        normalized_session_id = self._normalize_uuid(session_id, uuid.NAMESPACE_URL)
+        now = datetime.utcnow()
+        tokenizer = get_tokenizer(model)
+
+        # 显式 created_at（按轮内顺序递增），保证同一轮内的消息顺序稳定
+        rows = [
+            PendingMessage(
+                id=uuid.uuid4(),
+                session_id=normalized_session_id,
+                user_id=normalized_user_id,
+                personality_id=personality_id,
+                external_session_id=session_id,
+                role=role,
+                content=content,
+                request_id=request_id,
+                created_at=now + timedelta(microseconds=index),
+                token_count=tokenizer.count(content),
+            )
+            for index, (role, content) in enumerate(messages)
+        ]
+
+        if self.running and self._queue is not None:
+            self._track(rows)
+            await self._journal(rows)
+            for row in rows:
+                await self._queue.put(row)
+        else:
+            async with db_manager.session() as session:
+                await self.write_batch(session, rows)
+        # 写穿会话热缓存：活跃会话的历史读取不再回源数据库
+        await self.history_cache.append(normalized_session_id, rows)
+
+        logger.debug(
+            "Messages submitted",
+            session_id=str(normalized_session_id),
+            roles=[role for role, _ in messages],
+            request_id=request_id,
+            buffered=self.running,
+        )
+        return [{"id": str(row.id), "role": row.role} for row in rows]
+
+    def pending_messages(self, session_id: uuid.UUID) -> list[PendingMessage]:
+        """返回会话尚未落库的消息（按 created_at 排序）"""
+        pending = self._pending.get(session_id)
+        if not pending:
+            return []
+        return sorted(pending.values(), key=lambda row: row.created_at)
+
+    def pending_count(self) -> int:
+        return sum(len(rows) for rows in self._pending.values())
+
+    async def write_batch(self, session: AsyncSession, rows: list[PendingMessage]) -> None:
+        """批量写入消息并按会话原子递增 message_count（幂等：重复 id 不重复计数）"""
+        if not rows:
+            return
+
+        values = [
+            {
+                "id": row.id,
+                "session_id": row.session_id,
+                "user_id": row.user_id,
+                "role": row.role,
+                "content": row.content,
+                "token_count": row.token_count,
+                "message_metadata": {"request_id": row.request_id},
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ]
+
+        dialect_insert = _DIALECT_INSERTS.get(session.get_bind().dialect.name)
+        if dialect_insert is None:
+            await session.execute(insert(Message).values(values))
+            inserted_ids = {row.id for row in rows}
+        else:
+            result = await session.execute(
+                dialect_insert(Message)
+                .values(values)
+                .on_conflict_do_nothing(index_elements=[Message.id])
+                .returning(Message.id)
+            )
+            inserted_ids = set(result.scalars())
+
+        sessions: dict[uuid.UUID, dict[str, Any]] = {}
+        for row in rows:
+            if row.id not in inserted_ids:
+                continue
+            entry = sessions.setdefault(
+                row.session_id,
+                {
+                    "id": row.session_id,
+                    "user_id": row.user_id,
+                    "personality_id": row.personality_id,
+                    "message_count": 0,
+                    "session_metadata": {"external_session_id": row.external_session_id},
+                    "last_message_at": row.created_at,
+                },
+            )
+            entry["message_count"] += 1
+            entry["last_message_at"] = max(entry["last_message_at"], row.created_at)
+
+        if sessions:
+            await self._upsert_sessions(session, list(sessions.values()), dialect_insert)
+
+    async def _upsert_sessions(
+        self,
+        session: AsyncSession,
+        sessions: list[dict[str, Any]],
+        dialect_insert,
+    ) -> None:
+        """单语句创建会话或原子递增 message_count（服务端计算，避免并发丢失更新）"""
+        if dialect_insert is not None:
+            stmt = dialect_insert(Session).values(sessions)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Session.id],
+                    set_={
+                        "message_count": Session.message_count + stmt.excluded.message_count,
+                        "last_message_at": stmt.excluded.last_message_at,
+                        "updated_at": stmt.excluded.last_message_at,
+                    },
+                )
+            )
+            return
+
+        # 其他方言：先原子 UPDATE，未命中再 INSERT
+        for values in sessions:
+            result = await session.execute(
+                update(Session)
+                .where(Session.id == values["id"])
+                .values(
+                    message_count=Session.message_count + values["message_count"],
+                    last_message_at=values["last_message_at"],
+                    updated_at=values["last_message_at"],
+                )
+            )
+            if result.rowcount == 0:
+                await session.execute(insert(Session).values(**values))
+
+    async def _run(self) -> None:
+        """后台刷写循环：攒批到时间窗口或行数上限后单事务提交"""
+        queue = self._queue
+        while self.running or not queue.empty():
+            try:
+                first = await asyncio.wait_for(queue.get(), timeout=self.flush_interval)
+            except TimeoutError:
+                continue
+
+            batch = [first]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.max_batch_rows:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0 or not self.running:
+                    # 关闭时不再等待窗口，直接取走已缓冲的消息
+                    while len(batch) < self.max_batch_rows and not queue.empty():
+                        batch.append(queue.get_nowait())
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                except TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[PendingMessage]) -> None:
+        """提交一批消息；失败时退避重试，消息保留在 overlay 与日志中
+
+        连续失败 max_flush_retries 次后逐行写入，隔离数据库拒绝的坏行；
+        逐行全部失败且数据库不可达时视为数据库故障，继续退避重试整批。
+        """
+        backoff = 0.1
+        attempts = 0
+        while True:
+            try:
+                async with db_manager.session() as session:
+                    await self.write_batch(session, batch)
+                break
+            except Exception as e:
+                attempts += 1
+                logger.error(
+                    "Message batch flush failed",
+                    rows=len(batch),
+                    attempt=attempts,
+                    error=str(e),
+                    retry_in=backoff,
+                )
+                if attempts > self.max_flush_retries:
+                    if await self._flush_rows(batch):
+                        return
+                    attempts = 0
+                if not self.running:
+                    # 关闭阶段不无限重试；启用日志时消息留待下次启动重放
+                    return
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+        await self._settle(batch)
+        logger.debug("Message batch flushed", rows=len(batch))
+
+    async def _flush_rows(self, batch: list[PendingMessage]) -> bool:
+        """逐行写入；返回 False 表示数据库不可用（整批留待重试）"""
+        written: list[PendingMessage] = []
+        rejected: list[tuple[PendingMessage, Exception]] = []
+        for row in batch:
+            try:
+                async with db_manager.session() as session:
+                    await self.write_batch(session, [row])
+            except Exception as e:
+                rejected.append((row, e))
+            else:
+                written.append(row)
+        if not written and not await self._database_available():
+            return False
+
+        await self._settle(written)
+        await self._dead_letter(rejected)
+        return True
+
+    async def _database_available(self) -> bool:
+        try:
+            async with db_manager.session() as session:
+                await session.execute(text("SELECT 1"))
+        except Exception:
+            return False
+        return True
+
+    async def _settle(self, rows: list[PendingMessage]) -> None:
+        """已落库（或已移入死信）的消息移出 overlay 与日志"""
+        if not rows:
+            return
+        self._untrack(rows)
+        await self._unjournal(rows)
+
+    async def _dead_letter(self, rejected: list[tuple[PendingMessage, Exception]]) -> None:
+        """数据库拒绝的消息写入死信列表（Redis 可用时）并记录日志，不再重试"""
+        if not rejected:
+            return
+        for row, error in rejected:
+            messages_dead_lettered.inc()
+            logger.error(
+                "Message rejected by database",
+                message_id=str(row.id),
+                session_id=str(row.session_id),
+                request_id=row.request_id,
+                error=str(error),
+            )
+        redis = redis_manager.get_client()
+        if redis:
+            try:
+                await redis.rpush(
+                    f"{self.journal_key}:dead", *[row.to_json() for row, _ in rejected]
+                )
+            except Exception as e:
+                logger.warning("Message dead-letter write failed", error=str(e))
+        await self._settle([row for row, _ in rejected])
+
+    def _track(self, rows: list[PendingMessage]) -> None:
+        for row in rows:
+            self._pending.setdefault(row.session_id, {})[row.id] = row
+
+    def _untrack(self, rows: list[PendingMessage]) -> None:
+        for row in rows:
+            pending = self._pending.get(row.session_id)
+            if pending is None:
+                continue
+            pending.pop(row.id, None)
+            if not pending:
+                del self._pending[row.session_id]
+
+    async def _journal(self, rows: list[PendingMessage]) -> None:
+        redis = redis_manager.get_client() if self.redis_journal else None
+        if not redis:
+            return
+        try:
+            await redis.hset(
+                self.journal_key, mapping={str(row.id): row.to_json() for row in rows}
+            )
+        except Exception as e:
+            logger.warning("Message journal write failed", error=str(e))
+
+    async def _unjournal(self, rows: list[PendingMessage]) -> None:
+        redis = redis_manager.get_client() if self.redis_journal else None
+        if not redis:
+            return
+        try:
+            await redis.hdel(self.journal_key, *[str(row.id) for row in rows])
+        except Exception as e:
+            logger.warning("Message journal cleanup failed", error=str(e))
+
+    async def _replay_journal(self) -> None:
+        """重放上次进程未落库的消息（消息 id 固定，写入幂等）"""
+        redis = redis_manager.get_client() if self.redis_journal else None
+        if not redis:
+            return
+        try:
+            entries = await redis.hgetall(self.journal_key)
+        except Exception as e:
+            logger.warning("Message journal replay failed", error=str(e))
+            return
+        if not entries:
+            return
+
+        rows = sorted(
+            (PendingMessage.from_json(payload) for payload in entries.values()),
+            key=lambda row: row.created_at,
+        )
+        self._track(rows)
+        for row in rows:
+            await self._queue.put(row)
+        logger.info("Message journal replayed", rows=len(rows))
+
+    @staticmethod
+    def _normalize_uuid(value: str, namespace: uuid.UUID) -> uuid.UUID:
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            return uuid.uuid5(namespace, value)
+
+
+message_persister = MessagePersister()
@@ -0,0 +1,72 @@
+"""下一轮上下文预取 - 响应完成后投递 worker 任务，预热画像、历史与记忆缓存"""
+
+from app.core.config.manager import get_config
+from app.core.config.schemas import PrefetchConfig
+from app.observability.logging import get_logger
+from app.storage.queue import task_queue
+from app.storage.redis import redis_manager
+
+logger = get_logger(__name__)
+
+
+class ContextPrefetcher:
+    """下一轮上下文预取调度器
+
+    - 请求路径：每轮结束后 schedule() 投递一个预取任务；同一用户在
+      user_interval_seconds 内只投递一次（Redis SET NX 限流）
+    - worker：ContextService.prefetch() 预热用户画像缓存、会话热上下文缓存，
+      并以助手回复作为查询预跑记忆检索
+    """
+
+    def __init__(self, config: PrefetchConfig | None = None):
+        self._config = config
+
+    @property
+    def settings(self) -> PrefetchConfig:
+        if self._config is not None:
+            return self._config
+        try:
+            return get_config().context.prefetch
+        except Exception:
+            return PrefetchConfig()
+
+    async def schedule(
+        self,
+        user_id: str,
+        session_id: str,
+        personality_id: str,
+        reply: str,
+    ) -> bool:
+        """投递预取任务；限流窗口内同一用户只投递一次。返回是否已投递"""
+        cfg = self.settings
+        client = redis_manager.get_client()
+        if not cfg.enabled or client is None:
+            return False
+
+        if cfg.user_interval_seconds:
+            try:
+                acquired = await client.set(
+                    f"{cfg.key_prefix}{user_id}",
+                    "1",
+                    ex=cfg.user_interval_seconds,
+                    nx=True,
+                )
+            except Exception as e:
+                logger.warning("Context prefetch schedule failed", user_id=user_id, error=str(e))
+                return False
+            if not acquired:
+                return False
+
+        return await task_queue.enqueue(
+            cfg.queue_name,
+            {
+                "type": "prefetch",
+                "user_id": user_id,
+                "session_id": session_id,
+                "personality_id": personality_id,
+                "query": (reply or "")[: cfg.max_query_chars],
+            },
+        )
+
+
+context_prefetcher = ContextPrefetcher()
@@ -0,0 +1,256 @@
+"""会话滚动摘要服务 - 把滑出近期窗口的消息增量折叠进每会话一份摘要"""
+
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from app.core.config.manager import get_config
+from app.core.config.schemas import SummarizationConfig
+from app.engines.ai import AIEngine, ChatMessage
+from app.observability.logging import get_logger
+from app.observability.metrics import metrics
+from app.storage.database import db_manager
+from app.storage.models import Message, SessionSummary
+from app.storage.queue import task_queue
+from app.storage.redis import redis_manager
+from app.utils.tokenizer import get_tokenizer
+
+logger = get_logger(__name__)
+
+summary_folds = metrics.counter(
+    "session_summary_folds_total", "Session summary fold attempts by outcome"
+)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the new messages into the existing summary. Keep facts about the user, "
+    "decisions, open questions and commitments; drop small talk. Write in the language "
+    "the conversation uses, as concise prose, and reply with the updated summary only."
+)
+
+
+def normalize_session_id(session_id: str) -> uuid.UUID:
+    """外部会话 ID 归一化为 UUID（与消息持久化使用相同的命名空间）"""
+    try:
+        return uuid.UUID(session_id)
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, session_id)
+
+
+@dataclass
+class SummaryState:
+    """会话摘要及其水位线（水位线之前的消息已折叠进摘要）"""
+
+    summary: str
+    token_count: int
+    watermark_message_id: uuid.UUID
+    watermark_at: datetime
+    summarized_count: int
+
+    @property
+    def watermark(self) -> tuple[datetime, uuid.UUID]:
+        return self.watermark_at, self.watermark_message_id
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "summary": self.summary,
+                "token_count": self.token_count,
+                "watermark_message_id": str(self.watermark_message_id),
+                "watermark_at": self.watermark_at.isoformat(),
+                "summarized_count": self.summarized_count,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, payload: str) -> "SummaryState":
+        data = json.loads(payload)
+        return cls(
+            summary=data["summary"],
+            token_count=data["token_count"],
+            watermark_message_id=uuid.UUID(data["watermark_message_id"]),
+            watermark_at=datetime.fromisoformat(data["watermark_at"]),
+            summarized_count=data["summarized_count"],
+        )
+
+    @classmethod
+    def from_row(cls, row: SessionSummary) -> "SummaryState":
+        return cls(
+            summary=row.summary,
+            token_count=row.token_count,
+            watermark_message_id=row.watermark_message_id,
+            watermark_at=row.watermark_at,
+            summarized_count=row.summarized_count,
+        )
+
+
+class SessionSummarizer:
+    """会话滚动摘要器
+
+    - 请求路径：每轮持久化后 schedule() 投递一个去抖的 worker 任务；上下文构建时
+      load() 读取摘要（Redis 缓存，未命中回源主键查询），代价与会话长度无关
+    - worker：summarize() 把水位线之后、最近 keep_recent_messages 条之前的消息
+      连同旧摘要交给模型合并，写回摘要并推进水位线
+    """
+
+    def __init__(self, config: SummarizationConfig | None = None):
+        self._config = config
+
+    @property
+    def settings(self) -> SummarizationConfig:
+        if self._config is not None:
+            return self._config
+        try:
+            return get_config().context.summarization
+        except Exception:
+            return SummarizationConfig()
+
+    def _cache_key(self, session_id: uuid.UUID) -> str:
+        return f"{self.settings.key_prefix}{session_id}"
+
+    async def schedule(self, session_id: str, provider: str, model: str) -> bool:
+        """投递摘要任务；去抖窗口内同一会话只投递一次。返回是否已投递"""
+        cfg = self.settings
+        client = redis_manager.get_client()
+        if not cfg.enabled or client is None:
+            return False
+
+        session_uuid = normalize_session_id(session_id)
+        if cfg.debounce_seconds:
+            try:
+                acquired = await client.set(
+                    f"{cfg.key_prefix}scheduled:{session_uuid}",
+                    "1",
+                    ex=cfg.debounce_seconds,
+                    nx=True,
+                )
+            except Exception as e:
+                logger.warning("Summary schedule failed", session_id=session_id, error=str(e))
+                return False
+            if not acquired:
+                return False
+
+        return await task_queue.enqueue(
+            cfg.queue_name,
+            {
+                "type": "summarize",
+                "session_id": str(session_uuid),
+                "provider": provider,
+                "model": model,
+            },
+        )
+
+    async def load(self, session_id: str) -> SummaryState | None:
+        """读取会话摘要；无摘要时缓存空标记，避免新会话每轮回源"""
+        cfg = self.settings
+        session_uuid = normalize_session_id(session_id)
+        key = self._cache_key(session_uuid)
+
+        cached = await redis_manager.get(key)
+        if cached is not None:
+            return SummaryState.from_json(cached) if cached else None
+
+        async with db_manager.session() as session:
+            row = await session.get(SessionSummary, session_uuid)
+        state = SummaryState.from_row(row) if row is not None else None
+        if cfg.cache_ttl:
+            await redis_manager.set(key, state.to_json() if state else "", expire=cfg.cache_ttl)
+        return state
+
+    async def summarize(
+        self,
+        session_id: uuid.UUID,
+        engine: AIEngine,
+        model: str | None = None,
+    ) -> SummaryState | None:
+        """折叠一批滑出近期窗口的消息；未达到 min_batch_messages 时不调用模型"""
+        cfg = self.settings
+        async with db_manager.session() as session:
+            row = await session.get(SessionSummary, session_id)
+            previous = SummaryState.from_row(row) if row is not None else None
+            query = select(Message.id, Message.role, Message.content, Message.created_at).where(
+                Message.session_id == session_id
+            )
+            if previous is not None:
+                query = query.where(
+                    or_(
+                        Message.created_at > previous.watermark_at,
+                        and_(
+                            Message.created_at == previous.watermark_at,
+                            Message.id > previous.watermark_message_id,
+                        ),
+                    )
+                )
+            query = query.order_by(Message.created_at, Message.id).limit(
+                cfg.max_batch_messages + cfg.keep_recent_messages
+            )
+            rows = (await session.execute(query)).all()
+
+        fold = rows[: max(0, len(rows) - cfg.keep_recent_messages)]
+        if len(fold) < cfg.min_batch_messages:
+            summary_folds.inc(outcome="skipped")
+            return None
+
+        transcript = "\n".join(f"{row.role}: {row.content}" for row in fold)
+        response = await engine.chat(
+            [
+                ChatMessage(role="system", content=SUMMARY_PROMPT),
+                ChatMessage(
+                    role="user",
+                    content=(
+                        f"Existing summary:\n{previous.summary if previous else '(none)'}\n\n"
+                        f"New messages:\n{transcript}"
+                    ),
+                ),
+            ],
+            temperature=0.2,
+            max_tokens=cfg.max_summary_tokens,
+        )
+        text = (response.content or "").strip()
+        if not text:
+            summary_folds.inc(outcome="empty")
+            return None
+
+        last = fold[-1]
+        state = SummaryState(
+            summary=text,
+            token_count=get_tokenizer(model).count(text),
+            watermark_message_id=last.id,
+            watermark_at=last.created_at,
+            summarized_count=(previous.summarized_count if previous else 0) + len(fold),
+        )
+        async with db_manager.session() as session:
+            row = await session.get(SessionSummary, session_id)
+            # 模型调用期间另一任务已推进水位线：丢弃本次结果，避免覆盖更新的摘要
+            current = row.watermark_message_id if row is not None else None
+            if current != (previous.watermark_message_id if previous else None):
+                summary_folds.inc(outcome="conflict")
+                return None
+            if row is None:
+                row = SessionSummary(session_id=session_id)
+                session.add(row)
+            row.summary = state.summary
+            row.token_count = state.token_count
+            row.watermark_message_id = state.watermark_message_id
+            row.watermark_at = state.watermark_at
+            row.summarized_count = state.summarized_count
+
+        if cfg.cache_ttl:
+            await redis_manager.set(
+                self._cache_key(session_id), state.to_json(), expire=cfg.cache_ttl
+            )
+        summary_folds.inc(outcome="folded")
+        logger.info(
+            "Session summary folded",
+            session_id=str(session_id),
+            folded=len(fold),
+            summarized_count=state.summarized_count,
+            summary_tokens=state.token_count,
+        )
+        return state
+
+
+session_summarizer = SessionSummarizer()
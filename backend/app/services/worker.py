@@ -1,11 +1,14 @@
 """Async worker service for processing background tasks."""
 
 import asyncio
+import uuid
 from typing import Any
 
 from app.engines.registry import engine_registry
 # Note: dynamic Dispatch or structural typing is preferred over strict class checks to avoid circular imports if generic
 from app.observability.logging import get_logger
+from app.services.prefetch import context_prefetcher
+from app.services.summarizer import session_summarizer
 from app.storage.queue import task_queue
 
 logger = get_logger(__name__)
@@ -20,6 +23,7 @@ class AsyncWorkerService:
     def __init__(self):
         self.running = False
         self._task = None
+        self._prefetch_task = None
 
     async def start(self):
         """Start the worker loop."""
@@ -27,17 +31,19 @@ class AsyncWorkerService:
             return
         self.running = True
         self._task = asyncio.create_task(self._loop())
+        self._prefetch_task = asyncio.create_task(self._prefetch_loop())
         logger.info("AsyncWorkerService started")
 
     async def stop(self):
         """Stop the worker loop."""
         self.running = False
-        if self._task:
-            try:
-                # Wait for current iteration to finish or timeout
-                await asyncio.wait_for(self._task, timeout=5.0)
-            except Exception:
-                pass
+        for task in (self._task, self._prefetch_task):
+            if task:
+                try:
+                    # Wait for current iteration to finish or timeout
+                    await asyncio.wait_for(task, timeout=5.0)
+                except Exception:
+                    pass
         logger.info("AsyncWorkerService stopped")
 
     async def _loop(self):
@@ -51,9 +57,14 @@ class AsyncWorkerService:
                 
                 # 2. Process Memory Updates
                 processed_memory = await self._process_queue_item(MEMORY_QUEUE, self._handle_memory_update)
+
+                # 3. Fold aged-out turns into the rolling session summary
+                processed_summary = await self._process_queue_item(
+                    session_summarizer.settings.queue_name, self._handle_summary_update
+                )
                 
-                # If both were empty, sleep a bit to yield
-                if not processed_profile and not processed_memory:
+                # If all were empty, sleep a bit to yield
+                if not processed_profile and not processed_memory and not processed_summary:
                     await asyncio.sleep(1.0)
                 else:
                     # Yield slightly to allow other tasks in event loop
@@ -65,6 +76,26 @@ class AsyncWorkerService:
                 logger.error(f"Error in async worker loop: {e}")
                 await asyncio.sleep(5)  # Backoff on error
 
+    async def _prefetch_loop(self):
+        """Prefetch consumer.
+
+        Runs beside the main loop: warming must finish before the user's next
+        turn, so it cannot wait behind the other queues' polls and idle sleep.
+        """
+        while self.running:
+            try:
+                processed = await self._process_queue_item(
+                    context_prefetcher.settings.queue_name, self._handle_context_prefetch
+                )
+                if not processed:
+                    # dequeue returns at once without Redis; don't spin
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in prefetch worker loop: {e}")
+                await asyncio.sleep(5)  # Backoff on error
+
     async def _process_queue_item(self, queue_name: str, handler) -> bool:
         """Process a single item from queue. Returns True if item was processed."""
         # Use short timeout (1s) so we can check other queues / stop signal frequently
@@ -99,5 +130,29 @@ class AsyncWorkerService:
         else:
             pass
 
+    async def _handle_summary_update(self, payload: dict):
+        # Imported lazily: the orchestrator owns provider credentials and imports services
+        from app.orchestration.chat import get_orchestrator
+
+        session_id = payload.get("session_id", "unknown")
+        logger.debug(f"Worker: Processing summary update for session {session_id}")
+        engine, _ = await get_orchestrator()._acquire_engine(payload["provider"], payload["model"])
+        await session_summarizer.summarize(uuid.UUID(session_id), engine, model=payload["model"])
+
+    async def _handle_context_prefetch(self, payload: dict):
+        from app.orchestration.chat import get_orchestrator
+
+        orchestrator = get_orchestrator()
+        personality = orchestrator.personality_registry.get(payload["personality_id"])
+        if personality is None:
+            return
+        logger.debug(f"Worker: Prefetching context for session {payload['session_id']}")
+        await orchestrator.context_service.prefetch(
+            user_id=payload["user_id"],
+            session_id=payload["session_id"],
+            personality=personality,
+            query=payload.get("query", ""),
+        )
+
 
 async_worker = AsyncWorkerService()
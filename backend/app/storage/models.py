@@ -130,6 +130,8 @@ class Message(Base):
     # 基本信息
     role: Mapped[str] = mapped_column(String(20), nullable=False)  # user | assistant | system
     content: Mapped[str] = mapped_column(Text, nullable=False)
+    # 写入时按人格模型的分词器计算；历史数据为 NULL，读取时现场计算
+    token_count: Mapped[int | None] = mapped_column(nullable=True)
 
     # 消息元数据
     message_metadata: Mapped[dict[str, Any]] = mapped_column(
@@ -159,6 +161,35 @@ class Message(Base):
     )
 
 
+class SessionSummary(Base):
+    """会话滚动摘要表（每会话一行，覆盖到水位线消息为止的全部历史）"""
+
+    __tablename__ = "session_summaries"
+
+    # 主键（即会话 ID）
+    session_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+
+    # 摘要内容
+    summary: Mapped[str] = mapped_column(Text, nullable=False)
+    token_count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+    # 水位线：已折叠进摘要的最后一条消息
+    watermark_message_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    watermark_at: Mapped[datetime] = mapped_column(nullable=False)
+    summarized_count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+    # 时间戳
+    updated_at: Mapped[datetime] = mapped_column(
+        nullable=False,
+        server_default=text("CURRENT_TIMESTAMP"),
+        onupdate=datetime.utcnow,
+    )
+
+    __table_args__ = (
+        CheckConstraint("summarized_count >= 0", name="chk_summary_summarized_count"),
+    )
+
+
 class AuditEvent(Base):
     """审计事件表"""
 
@@ -0,0 +1,104 @@
+"""请求截止时间 - 上下文构建、LLM 调用与工具执行的超时均由剩余预算推导
+
+截止时间来源优先级：
+请求头 X-Request-Timeout > 人格 ai.request_timeout > api.deadline.default_timeout
+"""
+
+import asyncio
+import inspect
+import time
+from collections.abc import AsyncIterator, Awaitable
+from typing import TypeVar
+
+from app.core.config.manager import get_config
+from app.core.config.schemas import APIDeadlineConfig
+from app.core.exceptions import DeadlineExceededError
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """单个请求的截止时间（单调时钟）"""
+
+    def __init__(
+        self,
+        timeout: float,
+        context_share: float = 0.3,
+        min_llm_time: float = 2.0,
+    ):
+        self.timeout_seconds = timeout
+        self.expires_at = time.monotonic() + timeout
+        self.context_share = context_share
+        self.min_llm_time = min_llm_time
+
+    @classmethod
+    def for_request(
+        cls,
+        requested: float | None = None,
+        personality_timeout: float | None = None,
+    ) -> "Deadline | None":
+        """按优先级确定截止时间；功能关闭时返回 None（各阶段沿用固定超时）"""
+        try:
+            cfg = get_config().api.deadline
+        except Exception:
+            cfg = APIDeadlineConfig()
+        if not cfg.enabled:
+            return None
+        if requested is not None and requested > 0:
+            timeout = min(requested, cfg.max_timeout)
+        else:
+            timeout = personality_timeout or cfg.default_timeout
+        return cls(timeout, context_share=cfg.context_share, min_llm_time=cfg.min_llm_time)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float | None = None, reserve: float = 0.0) -> float:
+        """剩余预算（扣除 reserve）与固定超时 cap 取较小者"""
+        budget = max(0.0, self.remaining() - reserve)
+        return budget if cap is None else min(cap, budget)
+
+    def child(self, share: float | None = None) -> "Deadline":
+        """子阶段截止时间：占用剩余预算的 share（默认 context_share）"""
+        return Deadline(
+            self.remaining() * (share or self.context_share),
+            context_share=self.context_share,
+            min_llm_time=self.min_llm_time,
+        )
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            raise DeadlineExceededError(stage)
+
+    async def run(self, stage: str, awaitable: Awaitable[T], reserve: float = 0.0) -> T:
+        """在剩余预算内等待，超时抛出 DeadlineExceededError"""
+        budget = self.timeout(reserve=reserve)
+        if budget <= 0:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceededError(stage)
+        try:
+            return await asyncio.wait_for(awaitable, timeout=budget)
+        except TimeoutError:
+            raise DeadlineExceededError(stage) from None
+
+    async def iterate(self, stream: AsyncIterator[T], stage: str) -> AsyncIterator[T]:
+        """逐个 chunk 等待流式响应；不为每个 chunk 创建任务，只在当前任务上设置超时"""
+        try:
+            while True:
+                try:
+                    async with asyncio.timeout(self.remaining()):
+                        item = await anext(stream)
+                except StopAsyncIteration:
+                    return
+                except TimeoutError:
+                    raise DeadlineExceededError(stage) from None
+                yield item
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -0,0 +1,113 @@
+"""分词计数工具 - 上下文预算与消息持久化共用
+
+安装 tiktoken 且能按人格模型解析出编码时使用 BPE 分词，否则退化为区分中日韩字符的启发式估算。
+消息、提示词、知识文本生成后不再变化，计数按分词器做 LRU 记忆化。
+"""
+
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from app.observability.logging import get_logger
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken 为可选依赖
+    tiktoken = None
+
+logger = get_logger(__name__)
+
+# 中日韩字符与全角标点在 cl100k/o200k 中约 1 字 1 token，拉丁文本约 4 字符 1 token
+_CJK_RE = re.compile(
+    "[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+    "\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+
+_COUNT_CACHE_SIZE = 8192
+_DEFAULT_ENCODING = "cl100k_base"
+
+
+class Tokenizer(ABC):
+    """某一模型族的 token 计数器"""
+
+    name: str
+
+    def __init__(self):
+        self._count = lru_cache(maxsize=_COUNT_CACHE_SIZE)(self._count_uncached)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._count(text)
+
+    @abstractmethod
+    def _count_uncached(self, text: str) -> int:
+        """计算非空文本的 token 数"""
+
+    @abstractmethod
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """返回不超过 max_tokens 的最长前缀"""
+
+
+class HeuristicTokenizer(Tokenizer):
+    """按字符类别估算：中日韩字符计 1，其余文本 4 字符计 1"""
+
+    name = "heuristic"
+
+    def _count_uncached(self, text: str) -> int:
+        cjk = len(_CJK_RE.findall(text))
+        return max(1, cjk + (len(text) - cjk) // 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        # 逐字累计成本，拉丁字符每个计 1/4 token
+        budget = max_tokens * 4
+        for index, char in enumerate(text):
+            budget -= 4 if _CJK_RE.match(char) else 1
+            if budget < 0:
+                return text[:index]
+        return text
+
+
+class TiktokenTokenizer(Tokenizer):
+    """基于 tiktoken 的 BPE 分词器"""
+
+    def __init__(self, encoding):
+        super().__init__()
+        self._encoding = encoding
+        self.name = encoding.name
+
+    def _count_uncached(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens])
+
+
+_heuristic = HeuristicTokenizer()
+
+
+@lru_cache(maxsize=64)
+def get_tokenizer(model: str | None = None) -> Tokenizer:
+    """按模型名解析分词器（按模型缓存）"""
+    if tiktoken is None or not model:
+        return _heuristic
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # 未知或非 OpenAI 模型：通用 BPE 仍比启发式准确得多
+            encoding = tiktoken.get_encoding(_DEFAULT_ENCODING)
+        return TiktokenTokenizer(encoding)
+    except Exception as e:
+        # 编码文件不可用（如离线环境）时降级，不影响请求
+        logger.warning("Tokenizer unavailable, using heuristic", model=model, error=str(e))
+        return _heuristic
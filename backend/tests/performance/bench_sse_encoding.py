@@ -0,0 +1,127 @@
+"""SSE 帧编码微基准：逐 chunk json.dumps vs 预编码帧，以及增量合并前后的帧数
+
+用法：
+    python -m tests.performance.bench_sse_encoding [chunk 数]
+"""
+
+import asyncio
+import json
+import socket
+import sys
+import time
+from datetime import datetime
+
+from app.api.v1.chat.sse import SSEFrameEncoder, coalesce_chunks, orjson
+
+REQUEST_ID = "6f1c0b3e-9d2a-4c71-8f3e-2b5d7a9c1e40"
+MODEL = "gpt-4o-mini"
+
+
+def _legacy_chunk(token: str) -> dict:
+    # 改造前：每个 chunk 都取一次当前时间
+    return {
+        "id": f"chatcmpl-{REQUEST_ID}",
+        "object": "chat.completion.chunk",
+        "created": int(datetime.now().timestamp()),
+        "model": MODEL,
+        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+    }
+
+
+def bench_legacy(tokens: list[str]) -> float:
+    start = time.perf_counter()
+    for token in tokens:
+        chunk = _legacy_chunk(token)
+        chunk_with_id = {**chunk, "request_id": REQUEST_ID}
+        f"data: {json.dumps(chunk_with_id)}\n\n".encode()
+    return time.perf_counter() - start
+
+
+def bench_encoder(tokens: list[str]) -> float:
+    start = time.perf_counter()
+    created = int(datetime.now().timestamp())
+    encoder = SSEFrameEncoder(REQUEST_ID)
+    for token in tokens:
+        encoder.encode(
+            {
+                "id": f"chatcmpl-{REQUEST_ID}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": MODEL,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+        )
+    return time.perf_counter() - start
+
+
+async def bench_coalescing(tokens: list[str], tokens_per_tick: int = 8) -> tuple[int, int, float]:
+    """模拟上游每个事件循环 tick 到达若干小增量（类似 MockProvider 的 5 字符 chunk）"""
+    created = int(datetime.now().timestamp())
+
+    async def upstream():
+        for index, token in enumerate(tokens):
+            if index % tokens_per_tick == 0:
+                await asyncio.sleep(0)
+            yield {
+                "id": f"chatcmpl-{REQUEST_ID}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": MODEL,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+
+    async def frames(stream) -> tuple[int, int]:
+        # 每帧一次 transport.write，与 uvicorn 发送 StreamingResponse body 的方式一致
+        left, right = socket.socketpair()
+        _, writer = await asyncio.open_connection(sock=left)
+        sink_reader, sink_writer = await asyncio.open_connection(sock=right)
+
+        async def drain_peer():
+            while await sink_reader.read(65536):
+                pass
+
+        peer = asyncio.create_task(drain_peer())
+        encoder = SSEFrameEncoder(REQUEST_ID)
+        count = size = 0
+        async for chunk in stream:
+            frame = encoder.encode(chunk)
+            writer.write(frame)
+            await writer.drain()
+            size += len(frame)
+            count += 1
+        writer.close()
+        await writer.wait_closed()
+        await peer
+        sink_writer.close()
+        return count, size
+
+    start = time.perf_counter()
+    plain, _ = await frames(upstream())
+    plain_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged, _ = await frames(coalesce_chunks(upstream(), max_bytes=256, flush_interval=0.02))
+    merged_time = time.perf_counter() - start
+    return plain, merged, plain_time / merged_time
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    words = ["你好", " world", "，", " streaming", " token", "\n", ' "quoted"', " café"]
+    tokens = [words[i % len(words)] for i in range(count)]
+
+    legacy = bench_legacy(tokens)
+    encoded = bench_encoder(tokens)
+    backend = "orjson" if orjson is not None else "json"
+    print(f"chunks:            {count}")
+    print(f"legacy json.dumps: {count / legacy:>12,.0f} chunks/sec")
+    print(f"SSEFrameEncoder:   {count / encoded:>12,.0f} chunks/sec ({backend})")
+    print(f"speedup:           {legacy / encoded:>12.2f}x")
+
+    plain, merged, speedup = asyncio.run(bench_coalescing(tokens[: count // 10]))
+    print(f"frames/writes (per delta): {plain:>8,}")
+    print(f"frames/writes (coalesced): {merged:>8,}  ({speedup:.2f}x faster incl. socket writes)")
+
+
+if __name__ == "__main__":
+    main()
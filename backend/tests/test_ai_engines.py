@@ -1,9 +1,21 @@
 """AI 引擎测试"""
 
+import asyncio
+from unittest.mock import AsyncMock
+
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
 
-from app.engines.ai import AIEngine, ChatMessage, ChatResponse, OpenAIProvider
+from app.core.config.schemas import AIHttpClientConfig
+from app.engines.ai import (
+    AIEngine,
+    ChatMessage,
+    ChatResponse,
+    OpenAIProvider,
+    ToolCallAssembler,
+    _to_openai_messages,
+    _to_openai_tools,
+)
+from app.engines.ai.http_pool import connections_opened, pool_connections, pool_wait_seconds
 from app.engines.registry import EngineRegistry
 
 
@@ -63,6 +75,102 @@ class TestOpenAIProvider:
         # This is a placeholder for actual testing with mocking
 
 
+async def _keep_alive_server(handler_calls: list):
+    """最小 HTTP/1.1 服务：同一连接上循环应答"""
+
+    async def handle(reader, writer):
+        while await reader.readuntil(b"\r\n\r\n"):
+            handler_calls.append(writer.get_extra_info("peername"))
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+            await writer.drain()
+
+    async def guarded(reader, writer):
+        try:
+            await handle(reader, writer)
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            writer.close()
+
+    return await asyncio.start_server(guarded, "127.0.0.1", 0)
+
+
+class TestOpenAIConnectionPool:
+    """OpenAI Provider 长连接池测试"""
+
+    @pytest.mark.asyncio
+    async def test_calls_reuse_prewarmed_connection(self):
+        calls = []
+        server = await _keep_alive_server(calls)
+        port = server.sockets[0].getsockname()[1]
+        labels = {"pool": "openai:pool-test"}
+        opened_before = connections_opened.value(**labels)
+        provider = OpenAIProvider(
+            api_key="test-key",
+            base_url=f"http://127.0.0.1:{port}/v1",
+            model="pool-test",
+            http_config=AIHttpClientConfig(prewarm_connections=1),
+        )
+
+        async with server:
+            await provider.initialize()
+            client = provider.client
+            for _ in range(3):
+                assert await provider.health_check() is True
+            assert provider.client is client
+
+            assert len(calls) == 4
+            assert len(set(calls)) == 1
+            assert connections_opened.value(**labels) == opened_before + 1
+            assert pool_connections.value(state="idle", **labels) == 1
+            assert pool_wait_seconds.count(**labels) >= 4
+
+            await provider.close()
+        assert provider.http_client is None
+
+
+class TestToolCallAssembler:
+    """流式 tool_calls 拼装测试"""
+
+    def test_call_completes_when_arguments_form_json_object(self):
+        assembler = ToolCallAssembler()
+        assert assembler.feed(0, call_id="call_a", name="search", arguments='{"q": ') == []
+        completed = assembler.feed(0, arguments='"cats"}')
+        assert completed == [
+            {"id": "call_a", "function": {"name": "search", "arguments": '{"q": "cats"}'}}
+        ]
+        # 已发出的调用不会在流结束时重复发出
+        assert assembler.finish() == []
+
+    def test_next_index_and_finish_complete_pending_calls(self):
+        assembler = ToolCallAssembler()
+        assembler.feed(0, call_id="call_a", name="get_current_time", arguments="")
+        completed = assembler.feed(1, call_id="call_b", name="calculate", arguments='{"expr')
+        assert [call["id"] for call in completed] == ["call_a"]
+        assert [call["id"] for call in assembler.finish()] == ["call_b"]
+        assert [call["id"] for call in assembler.tool_calls] == ["call_a", "call_b"]
+
+
+class TestOpenAIMessageConversion:
+    """OpenAI 消息/工具格式转换测试"""
+
+    def test_tool_round_trip_fields_are_preserved(self):
+        tool_call = {"id": "call_a", "function": {"name": "search", "arguments": "{}"}}
+        converted = _to_openai_messages(
+            [
+                ChatMessage(role="assistant", content="", tool_calls=[tool_call]),
+                ChatMessage(role="tool", content="result", tool_call_id="call_a"),
+            ]
+        )
+        assert converted[0]["tool_calls"] == [{"type": "function", **tool_call}]
+        assert converted[1] == {"role": "tool", "content": "result", "tool_call_id": "call_a"}
+
+    def test_tools_schema_is_not_double_wrapped(self):
+        schema = {"type": "function", "function": {"name": "search", "parameters": {}}}
+        assert _to_openai_tools([schema]) == [schema]
+        assert _to_openai_tools([{"name": "search"}]) == [
+            {"type": "function", "function": {"name": "search"}}
+        ]
+
+
 class TestEngineRegistry:
     """EngineRegistry 测试"""
 
@@ -0,0 +1,91 @@
+"""审计事件批量写入测试"""
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select
+
+from app.services.audit import AuditService, AuditSink, audit_events_dropped
+from app.storage.database import Base, DatabaseManager
+from app.storage.models import AuditEvent
+
+
+@pytest.fixture
+async def sqlite_db(tmp_path):
+    """基于 SQLite 文件的数据库管理器（替换审计模块使用的全局实例）"""
+    manager = DatabaseManager()
+    manager.initialize(f"sqlite+aiosqlite:///{tmp_path / 'audit.db'}")
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    with patch("app.services.audit.db_manager", manager):
+        yield manager
+    await manager.close()
+
+
+def _events(count: int, tool_name: str = "search") -> list[dict]:
+    return [
+        AuditService._build_tool_invocation_event(
+            user_id="user-1",
+            session_id="session-1",
+            tool_name=f"{tool_name}-{index}",
+            arguments={},
+            result={"result": "ok"},
+            success=True,
+            execution_time=0.01,
+            request_id="req-1",
+        )
+        for index in range(count)
+    ]
+
+
+async def _audit_count(db: DatabaseManager) -> int:
+    async with db.session() as session:
+        return await session.scalar(select(func.count(AuditEvent.id)))
+
+
+@pytest.mark.asyncio
+async def test_sink_batches_events_and_drains_on_stop(sqlite_db):
+    """运行中事件只入队，stop 时无损排空"""
+    sink = AuditSink()
+    await sink.start()
+    sink.flush_interval = 5.0
+
+    for _ in range(3):
+        await sink.submit(_events(4))
+
+    assert sink.queue_depth() == 12
+    assert await _audit_count(sqlite_db) == 0
+
+    await sink.stop()
+
+    assert sink.queue_depth() == 0
+    assert await _audit_count(sqlite_db) == 12
+
+
+@pytest.mark.asyncio
+async def test_sink_drop_oldest_on_overflow():
+    """队列满时丢弃最旧事件并计数"""
+    sink = AuditSink(max_queue_events=10)
+    sink.running = True  # 仅验证入队策略，不启动刷写任务
+    dropped_before = audit_events_dropped.value(reason="overflow")
+
+    await sink.submit(_events(8, "old"))
+    await sink.submit(_events(5, "new"))
+
+    queued = [event["payload"]["tool_name"] for event in sink._queue]
+    assert len(queued) == 10
+    assert queued[:3] == ["old-3", "old-4", "old-5"]
+    assert queued[-5:] == [f"new-{i}" for i in range(5)]
+    assert audit_events_dropped.value(reason="overflow") == dropped_before + 3
+
+
+@pytest.mark.asyncio
+async def test_sink_isolates_rejected_event(sqlite_db):
+    """整批写入失败时逐条重试，只丢弃被数据库拒绝的事件"""
+    sink = AuditSink()
+    events = _events(3)
+    events[1]["event_type"] = None  # 违反 NOT NULL
+
+    await sink._write_batch(events)
+
+    assert await _audit_count(sqlite_db) == 2
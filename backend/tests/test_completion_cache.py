@@ -0,0 +1,134 @@
+"""补全缓存测试"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.personalities.models import (
+    Personality,
+    PersonalityAI,
+    PersonalityCache,
+    PersonalityRegistry,
+)
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.engines.registry import EngineRegistry
+from app.orchestration.chat import ChatOrchestrator
+from app.orchestration.completion_cache import CompletionCache
+from app.storage.redis import redis_manager
+
+
+class CountingEngine(AIEngine):
+    """记录调用次数的 AI 引擎"""
+
+    def __init__(self):
+        self.chat_calls = 0
+        self.stream_calls = 0
+
+    async def initialize(self):
+        pass
+
+    async def health_check(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.chat_calls += 1
+        return ChatResponse(
+            content="Welcome aboard! " * 4,
+            finish_reason="stop",
+            usage={"prompt_tokens": 12, "completion_tokens": 16, "total_tokens": 28},
+        )
+
+    async def chat_stream(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.stream_calls += 1
+        yield {"content": "Welcome aboard! " * 4, "finish_reason": "stop"}
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    # 只验证 L1 行为：隔离其他测试模块注入的 Redis mock
+    monkeypatch.setattr(redis_manager, "_redis", None)
+
+    registry = PersonalityRegistry()
+    registry.register(
+        Personality(
+            id="onboarding",
+            name="Onboarding",
+            description="Onboarding assistant",
+            system_prompt="You greet new users.",
+            ai=PersonalityAI(provider="openai", model="gpt-4", temperature=0.0),
+            cache=PersonalityCache(enabled=True, ttl=60),
+        )
+    )
+    engine_registry = EngineRegistry()
+    engine_registry._engines["openai:gpt-4"] = CountingEngine()
+
+    context_service = SimpleNamespace(
+        build_context_bundle=AsyncMock(
+            return_value=SimpleNamespace(
+                metadata={"engines": {}},
+                token_budget=SimpleNamespace(sections={}),
+            )
+        ),
+        to_messages=lambda bundle, message: [
+            ChatMessage(role="system", content="You greet new users."),
+            ChatMessage(role="user", content=message),
+        ],
+    )
+    orchestrator = ChatOrchestrator(
+        personality_registry=registry,
+        engine_registry=engine_registry,
+        context_service=context_service,
+        completion_cache=CompletionCache(l1_max_entries=10, key_prefix="test:completion:"),
+    )
+    orchestrator._persist_messages = AsyncMock()
+    return orchestrator
+
+
+@pytest.mark.asyncio
+async def test_identical_deterministic_request_hits_cache(orchestrator):
+    """完全相同的确定性请求第二次直接命中缓存，usage 标记 cache_hit"""
+    engine = orchestrator.engine_registry._engines["openai:gpt-4"]
+
+    first = await orchestrator.chat("user-1", "session-1", "onboarding", "hello")
+    second = await orchestrator.chat("user-2", "session-2", "onboarding", "hello")
+
+    assert engine.chat_calls == 1
+    assert "cache_hit" not in first["usage"]
+    assert second["usage"]["cache_hit"] is True
+    assert second["usage"]["total_tokens"] == 28
+    assert second["choices"][0]["message"]["content"] == first["choices"][0]["message"]["content"]
+
+
+@pytest.mark.asyncio
+async def test_non_deterministic_request_bypasses_cache(orchestrator):
+    """温度高于人格上限时不参与缓存"""
+    engine = orchestrator.engine_registry._engines["openai:gpt-4"]
+
+    await orchestrator.chat("user-1", "session-1", "onboarding", "hello", temperature=0.7)
+    await orchestrator.chat("user-1", "session-1", "onboarding", "hello", temperature=0.7)
+
+    assert engine.chat_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_replays_cached_response(orchestrator):
+    """流式请求命中缓存时以合成 chunk 回放，末块带 usage"""
+    engine = orchestrator.engine_registry._engines["openai:gpt-4"]
+    await orchestrator.chat("user-1", "session-1", "onboarding", "hello")
+
+    chunks = [
+        chunk
+        async for chunk in orchestrator.chat_stream("user-1", "session-1", "onboarding", "hello")
+    ]
+
+    assert engine.stream_calls == 0
+    content_chunks = chunks[:-1]
+    assert len(content_chunks) > 1
+    assert "".join(c["choices"][0]["delta"]["content"] for c in content_chunks) == "Welcome aboard! " * 4
+    assert content_chunks[-1]["choices"][0]["finish_reason"] == "stop"
+    assert content_chunks[-1]["usage"]["cache_hit"] is True
+    assert chunks[-1] == {"data": "[DONE]"}
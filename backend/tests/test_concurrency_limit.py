@@ -0,0 +1,166 @@
+"""AI 调用自适应并发限制测试"""
+
+import asyncio
+
+import pytest
+
+from app.core.config.schemas import AIConcurrencyConfig
+from app.core.exceptions import ExternalServiceError, ServiceOverloadedError
+from app.engines.ai import ChatResponse
+from app.engines.ai.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimitedEngine,
+    concurrency_queue_depth,
+)
+from tests.test_phase_timing import StreamingEngine
+from tests.test_upstream_pool import GatedEngine, StatusError, _pool
+
+
+def _limiter(**overrides) -> AdaptiveConcurrencyLimiter:
+    config = {"initial_limit": 2, "min_limit": 1, "max_limit": 50, **overrides}
+    return AdaptiveConcurrencyLimiter("openai", AIConcurrencyConfig(**config))
+
+
+def test_limit_grows_on_flat_latency_and_shrinks_on_latency_rise():
+    """延迟平稳且名额用满时上限增长；延迟升高时收缩；上游过载类失败乘性减小"""
+    limiter = _limiter(initial_limit=10)
+    for _ in range(20):
+        limiter.inflight = 10
+        limiter.release(0.1)
+    grown = limiter.limit
+    assert grown > 10
+
+    for _ in range(10):
+        limiter.inflight = int(limiter.limit)
+        limiter.release(1.0)  # 10 倍于基线
+    assert limiter.limit < grown * 0.75
+
+    before = limiter.limit
+    limiter.inflight = 1
+    limiter.release(dropped=True)
+    assert limiter.limit == pytest.approx(max(1, before * 0.9))
+
+
+def test_limit_does_not_grow_when_app_limited():
+    """只用到少量名额时，低延迟不会推高上限"""
+    limiter = _limiter(initial_limit=20)
+    for _ in range(20):
+        limiter.inflight = 1
+        limiter.release(0.1)
+    assert limiter.limit == 20
+
+
+@pytest.mark.asyncio
+async def test_calls_over_limit_queue_then_shed():
+    """超出上限的调用排队等待名额；队列满或等待超时以可重试的 503 拒绝"""
+    gate = asyncio.Event()
+    limiter = _limiter(max_queue=1, queue_timeout_seconds=0.5)
+    engine = ConcurrencyLimitedEngine(GatedEngine(gate), limiter)
+
+    running = [asyncio.create_task(engine.chat([])) for _ in range(2)]
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(engine.chat([]))
+    await asyncio.sleep(0)
+    assert limiter.inflight == 2
+    assert concurrency_queue_depth.value(key="openai") == 1
+
+    with pytest.raises(ServiceOverloadedError) as exc_info:
+        await engine.chat([])
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.details["reason"] == "queue_full"
+
+    gate.set()
+    results = await asyncio.gather(*running, queued)
+    assert [response.content for response in results] == ["ok", "ok", "ok"]
+    assert limiter.inflight == 0
+    assert concurrency_queue_depth.value(key="openai") == 0
+
+    gate.clear()
+    blockers = [asyncio.create_task(engine.chat([])) for _ in range(int(limiter.limit))]
+    await asyncio.sleep(0)
+    limiter.config.queue_timeout_seconds = 0.05
+    with pytest.raises(ServiceOverloadedError) as exc_info:
+        await engine.chat([])
+    assert exc_info.value.details["reason"] == "queue_timeout"
+    gate.set()
+    await asyncio.gather(*blockers)
+
+
+@pytest.mark.asyncio
+async def test_stream_holds_slot_and_upstream_errors_back_off():
+    """流式调用占用名额到结束；5xx 计为过载信号，4xx 不影响上限"""
+    limiter = _limiter(initial_limit=4)
+    engine = ConcurrencyLimitedEngine(StreamingEngine(), limiter)
+
+    stream = engine.chat_stream([])
+    await stream.__anext__()
+    assert limiter.inflight == 1
+    assert [chunk async for chunk in stream][-1]["finish_reason"] == "stop"
+    assert limiter.inflight == 0
+    assert limiter.long_rtt is not None  # 首个 chunk 耗时作为样本
+
+    class FailingEngine(StreamingEngine):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+        async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+            raise ExternalServiceError("OpenAI", "failed") from StatusError(self.status_code)
+
+    before = limiter.limit
+    with pytest.raises(ExternalServiceError):
+        await ConcurrencyLimitedEngine(FailingEngine(400), limiter).chat([])
+    assert limiter.limit == before
+    with pytest.raises(ExternalServiceError):
+        await ConcurrencyLimitedEngine(FailingEngine(503), limiter).chat([])
+    assert limiter.limit == pytest.approx(before * 0.9)
+    assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_returns_granted_slot():
+    """排队中被取消的调用不会泄漏名额"""
+    gate = asyncio.Event()
+    limiter = _limiter(initial_limit=1, queue_timeout_seconds=5)
+    engine = ConcurrencyLimitedEngine(GatedEngine(gate), limiter)
+
+    first = asyncio.create_task(engine.chat([]))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(engine.chat([]))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    gate.set()
+    assert isinstance(await first, ChatResponse)
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancel_before_response_backs_off_and_shed_does_not_eject():
+    """响应 / 首个 chunk 之前被取消计为过载信号；并发拒绝不摘除上游池端点"""
+    limiter = _limiter(initial_limit=10)
+    engine = ConcurrencyLimitedEngine(GatedEngine(asyncio.Event()), limiter)
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(engine.chat([]), timeout=0.01)
+    assert limiter.limit == pytest.approx(9)
+
+    class HangingStream(StreamingEngine):
+        async def chat_stream(self, messages, **kwargs):
+            await asyncio.Event().wait()
+            yield {}
+
+    stream = ConcurrencyLimitedEngine(HangingStream(), limiter).chat_stream([])
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(stream.__anext__(), timeout=0.01)
+    assert limiter.limit == pytest.approx(8.1)
+    assert limiter.inflight == 0
+
+    full = _limiter(initial_limit=1, max_queue=0)
+    full.inflight = 1
+    pool = _pool(
+        {"busy": ConcurrencyLimitedEngine(StreamingEngine(), full), "idle": StreamingEngine()},
+        weights={"busy": 100.0},
+        consecutive_failures=1,
+    )
+    assert (await pool.chat([])).content == "hi there"
+    assert not pool.endpoints[0].ejected_until
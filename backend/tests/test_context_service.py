@@ -94,7 +94,9 @@ def _build_dummy_config(
                 reserve_for_completion=reserve_for_completion,
                 personalization_budget=personalization_budget,
             ),
-            parallel_execution=SimpleNamespace(enabled=True, timeout=1.0),
+            history=SimpleNamespace(page_size=50, max_messages=200),
+            summarization=SimpleNamespace(enabled=False),
+            parallel_execution=SimpleNamespace(enabled=True, timeout=1.0, soft_deadline=0.0),
             assembly=SimpleNamespace(
                 include_system_prompt=True,
                 include_knowledge=include_knowledge,
@@ -207,3 +209,111 @@ async def test_context_bundle_truncates_recent_messages(personality, monkeypatch
     assert len(bundle.recent_messages) == 1
     assert bundle.recent_messages[0].content == "Short reply"
     assert bundle.token_budget.truncated is True
+
+
+@pytest.mark.asyncio
+async def test_context_sources_fan_out_concurrently(personality, monkeypatch):
+    class SlowKnowledgeEngine(StubKnowledgeEngine):
+        async def search_knowledge(self, query, dataset_names=None, top_k=5):
+            await asyncio.sleep(0.2)
+            return await super().search_knowledge(query, dataset_names, top_k)
+
+    class SlowChatMemoryEngine(StubChatMemoryEngine):
+        async def search_memories(self, query, user_id, session_id, top_k=5):
+            await asyncio.sleep(0.2)
+            return await super().search_memories(query, user_id, session_id, top_k)
+
+    async def slow_history(session_id, token_budget, request_id, after=None):
+        await asyncio.sleep(0.2)
+        return [ChatMessage(role="user", content="Earlier message")]
+
+    engine_registry = EngineRegistry()
+    engine_registry._knowledge_engines["cognee"] = SlowKnowledgeEngine()
+    engine_registry._user_profile_engines["local"] = StubUserProfileEngine()
+    engine_registry._chat_memory_engines["mem0"] = SlowChatMemoryEngine()
+    service = ContextService(engine_registry, config=_build_dummy_config())
+    monkeypatch.setattr(service, "_fetch_recent_messages", slow_history)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    bundle = await service.build_context_bundle(
+        user_id="user-1",
+        session_id="not-a-uuid",
+        current_message="Hello",
+        personality=personality,
+        request_id="req-3",
+    )
+    elapsed = loop.time() - started
+
+    # History, knowledge and memory each take 0.2s; run together they cost ~0.2s.
+    assert elapsed < 0.5
+    assert [msg.content for msg in bundle.recent_messages] == ["Earlier message"]
+    assert bundle.metadata["engines"]["history"]["status"] == "ok"
+    assert bundle.metadata["engines"]["history"]["latency_ms"] >= 150
+    assert bundle.metadata["engines"]["chat_memory"]["status"] == "ok"
+
+
+@pytest.mark.asyncio
+async def test_history_failure_degrades(personality, monkeypatch):
+    service = ContextService(
+        EngineRegistry(),
+        config=_build_dummy_config(
+            include_knowledge=False,
+            include_user_profile=False,
+            include_chat_memory=False,
+        ),
+    )
+    monkeypatch.setattr(
+        service, "_fetch_recent_messages", AsyncMock(side_effect=RuntimeError("db down"))
+    )
+
+    bundle = await service.build_context_bundle(
+        user_id="user-1",
+        session_id="not-a-uuid",
+        current_message="Hello",
+        personality=personality,
+        request_id="req-4",
+    )
+
+    assert bundle.recent_messages == []
+    assert bundle.metadata["engines"]["history"]["status"] == "degraded"
+    assert bundle.metadata["engines"]["history"]["reason"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_soft_deadline_starts_without_late_engines(personality, monkeypatch):
+    finished = asyncio.Event()
+
+    class SlowKnowledgeEngine(StubKnowledgeEngine):
+        async def search_knowledge(self, query, dataset_names=None, top_k=5):
+            await asyncio.sleep(0.3)
+            finished.set()
+            return await super().search_knowledge(query, dataset_names, top_k)
+
+    engine_registry = EngineRegistry()
+    engine_registry._knowledge_engines["cognee"] = SlowKnowledgeEngine()
+    engine_registry._user_profile_engines["local"] = StubUserProfileEngine()
+    engine_registry._chat_memory_engines["mem0"] = StubChatMemoryEngine()
+    config = _build_dummy_config()
+    config.context.parallel_execution.soft_deadline = 0.05
+    service = ContextService(engine_registry, config=config)
+    monkeypatch.setattr(service, "_fetch_recent_messages", AsyncMock(return_value=[]))
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    bundle = await service.build_context_bundle(
+        user_id="user-1",
+        session_id="not-a-uuid",
+        current_message="Hello",
+        personality=personality,
+        request_id="req-5",
+    )
+
+    assert loop.time() - started < 0.2
+    assert bundle.metadata["late_sources"] == ["knowledge"]
+    assert bundle.metadata["engines"]["knowledge"]["status"] == "late"
+    assert bundle.retrieved_knowledge == []
+    assert bundle.retrieved_memories[0].content == "Memory content"
+
+    # The late engine keeps running so its result can warm the cache
+    await asyncio.wait_for(finished.wait(), timeout=1)
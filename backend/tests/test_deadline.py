@@ -0,0 +1,93 @@
+"""请求截止时间传播测试"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config.schemas import APIDeadlineConfig
+from app.core.exceptions import DeadlineExceededError
+from app.engines.ai import ChatResponse
+from app.utils.deadline import Deadline
+from tests.test_phase_timing import StreamingEngine, orchestrator  # noqa: F401
+
+
+class SlowEngine(StreamingEngine):
+    """首个 chunk 之后卡住的上游"""
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        await asyncio.sleep(5)
+        return ChatResponse(content="late", finish_reason="stop")
+
+    async def chat_stream(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        yield {"content": "partial", "finish_reason": None}
+        await asyncio.sleep(5)
+        yield {"content": " late", "finish_reason": "stop"}
+
+
+@pytest.fixture
+def deadline_config(monkeypatch):
+    cfg = APIDeadlineConfig(default_timeout=30.0, max_timeout=60.0, min_llm_time=0.0)
+    monkeypatch.setattr(
+        "app.utils.deadline.get_config", lambda: SimpleNamespace(api=SimpleNamespace(deadline=cfg))
+    )
+    return cfg
+
+
+def test_deadline_precedence_and_clamp(deadline_config):
+    """请求头 > 人格配置 > 默认值；请求头不超过 max_timeout"""
+    assert Deadline.for_request(5.0, 20.0).timeout_seconds == 5.0
+    assert Deadline.for_request(600.0).timeout_seconds == 60.0
+    assert Deadline.for_request(None, 20.0).timeout_seconds == 20.0
+    assert Deadline.for_request().timeout_seconds == 30.0
+
+    deadline_config.enabled = False
+    assert Deadline.for_request(5.0) is None
+
+
+@pytest.mark.asyncio
+async def test_run_stops_at_remaining_budget():
+    """子阶段按剩余预算取超时；预算耗尽时不再发起调用"""
+    deadline = Deadline(0.05)
+    assert deadline.child(share=0.5).timeout_seconds <= 0.025
+    assert deadline.timeout(cap=10.0) <= 0.05
+
+    with pytest.raises(DeadlineExceededError):
+        await deadline.run("llm_call", asyncio.sleep(1))
+
+    coroutine = asyncio.sleep(1)
+    with pytest.raises(DeadlineExceededError) as exc_info:
+        await deadline.run("tool_execution", coroutine)
+    assert exc_info.value.details == {"stage": "tool_execution"}
+    assert coroutine.cr_frame is None  # 已关闭，未被调度
+
+
+@pytest.mark.asyncio
+async def test_chat_fails_fast_at_deadline(orchestrator, deadline_config):  # noqa: F811
+    """非流式：LLM 调用超出截止时间返回 504，而不是等待上游超时"""
+    orchestrator.engine_registry._engines["openai:gpt-4"] = SlowEngine()
+
+    with pytest.raises(DeadlineExceededError) as exc_info:
+        await asyncio.wait_for(
+            orchestrator.chat("user-1", "session-1", "default", "hello", timeout=0.2), timeout=2
+        )
+    assert exc_info.value.status_code == 504
+
+
+@pytest.mark.asyncio
+async def test_stream_truncates_after_partial_output(orchestrator, deadline_config):  # noqa: F811
+    """流式：已输出内容后到达截止时间，以 finish_reason=length 正常结束"""
+    orchestrator.engine_registry._engines["openai:gpt-4"] = SlowEngine()
+
+    chunks = [
+        chunk
+        async for chunk in orchestrator.chat_stream(
+            "user-1", "session-1", "default", "hello", timeout=0.2
+        )
+    ]
+
+    assert chunks[-1] == {"data": "[DONE]"}
+    contents = [c["choices"][0]["delta"]["content"] for c in chunks if "choices" in c]
+    assert "".join(contents) == "partial"
+    assert chunks[-2]["choices"][0]["finish_reason"] == "length"
+    assert orchestrator._persist_messages.await_count == 2  # 用户消息与截断后的回复
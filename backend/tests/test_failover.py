@@ -0,0 +1,211 @@
+"""AI 提供商熔断与故障转移测试"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.exceptions import ExternalServiceError, RateLimitError
+from app.core.personalities.models import PersonalityFallback
+from app.engines.ai.failover import AITarget, FailoverEngine
+from app.engines.base_remote import SlidingWindowCircuitBreaker
+from app.engines.registry import EngineRegistry
+from tests.test_deadline import deadline_config  # noqa: F401
+from tests.test_phase_timing import StreamingEngine, orchestrator  # noqa: F401
+from tests.test_upstream_pool import StatusError
+
+
+class FailingEngine(StreamingEngine):
+    """按状态码失败的上游；流式在首个 token 之前失败"""
+
+    def __init__(self, status_code: int = 503):
+        self.status_code = status_code
+        self.calls = 0
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.calls += 1
+        raise ExternalServiceError("OpenAI", "failed") from StatusError(self.status_code)
+
+    async def chat_stream(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.calls += 1
+        yield {"content": "", "finish_reason": None}  # 角色 chunk，不算开始输出
+        raise ExternalServiceError("OpenAI", "failed") from StatusError(self.status_code)
+
+
+@pytest.fixture
+def failover(orchestrator):  # noqa: F811
+    """首选 openai:gpt-4 失败，备用 mock:backup 正常；熔断器直接注入注册表"""
+    orchestrator.personality_registry.get("default").ai.fallbacks = [
+        PersonalityFallback(provider="mock", model="backup")
+    ]
+    engines = orchestrator.engine_registry._engines
+    engines["openai:gpt-4"] = FailingEngine()
+    engines["mock:backup"] = StreamingEngine()
+    breakers = orchestrator.engine_registry._ai_breakers
+    breakers["openai:gpt-4"] = SlidingWindowCircuitBreaker(min_calls=2, open_seconds=60)
+    breakers["mock:backup"] = SlidingWindowCircuitBreaker()
+    return orchestrator
+
+
+def test_breaker_opens_on_failure_rate_and_probes_when_half_open():
+    """窗口内失败率达到阈值后打开；冷却后只放行一个探测请求，成功即关闭"""
+    breaker = SlidingWindowCircuitBreaker(
+        min_calls=4, failure_rate_threshold=0.5, open_seconds=0.05
+    )
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "CLOSED"  # 调用数不足 min_calls
+    breaker.record_failure()
+    assert breaker.state == "OPEN"
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == "HALF_OPEN"
+    assert not breaker.allow_request()  # 探测名额已占用
+    breaker.record_failure()
+    assert breaker.state == "OPEN"
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "CLOSED"
+    assert breaker.allow_request()
+
+
+def test_breakers_are_kept_per_provider_and_model():
+    """同一提供商的不同模型各自熔断，备用模型不受首选模型熔断影响"""
+    registry = EngineRegistry()
+    primary = registry.circuit_breaker("openai", "gpt-4")
+    assert registry.circuit_breaker("openai", "gpt-4") is primary
+    assert registry.circuit_breaker("openai", "gpt-4o-mini") is not primary
+
+
+@pytest.mark.asyncio
+async def test_chat_fails_over_and_open_breaker_skips_provider(failover):
+    """5xx 转移到备用目标；熔断打开后首选提供商不再被调用"""
+    primary = failover.engine_registry._engines["openai:gpt-4"]
+
+    first = await failover.chat("user-1", "session-1", "default", "hello")
+    second = await failover.chat("user-1", "session-1", "default", "hello")
+    assert primary.calls == 2
+    assert failover.engine_registry._ai_breakers["openai:gpt-4"].state == "OPEN"
+
+    third = await failover.chat("user-1", "session-1", "default", "hello")
+    assert primary.calls == 2
+    for response in (first, second, third):
+        assert response["model"] == "backup"
+        assert response["choices"][0]["message"]["content"] == "hi there"
+    served = third["metadata"]["context"]["engines"]["ai"]
+    assert served["provider"] == "mock"
+    assert served["failover"] is True
+    assert served["skipped"] == [{"provider": "openai", "model": "gpt-4", "reason": "circuit_open"}]
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_failed_over(failover):
+    """4xx 是请求本身的问题：直接抛出，不转移也不计入熔断"""
+    failover.engine_registry._engines["openai:gpt-4"] = FailingEngine(status_code=400)
+
+    with pytest.raises(ExternalServiceError):
+        await failover.chat("user-1", "session-1", "default", "hello")
+    assert failover.engine_registry._ai_breakers["openai:gpt-4"].state == "CLOSED"
+
+
+@pytest.mark.asyncio
+async def test_stream_fails_over_before_first_token(failover):
+    """流式在首个 token 之前失败时无感转移，chunk 标注实际服务的模型"""
+    chunks = [
+        chunk async for chunk in failover.chat_stream("user-1", "session-1", "default", "hello")
+    ]
+
+    assert chunks[-1] == {"data": "[DONE]"}
+    body = [chunk for chunk in chunks if "choices" in chunk]
+    assert "".join(chunk["choices"][0]["delta"]["content"] for chunk in body) == "hi there"
+    assert {chunk["model"] for chunk in body} == {"backup"}
+    assert failover._persist_messages.await_args.kwargs["model"] == "backup"
+
+
+@pytest.mark.asyncio
+async def test_local_throttle_fails_over_without_tripping_breaker(failover):
+    """本地限速拒绝时转移到备用目标，但不计入首选提供商的熔断"""
+
+    class ThrottledEngine(StreamingEngine):
+        async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+            raise RateLimitError("Upstream rate limit for 'openai' reached")
+
+    failover.engine_registry._engines["openai:gpt-4"] = ThrottledEngine()
+
+    for _ in range(3):
+        response = await failover.chat("user-1", "session-1", "default", "hello")
+        assert response["model"] == "backup"
+    assert failover.engine_registry._ai_breakers["openai:gpt-4"].state == "CLOSED"
+    skipped = response["metadata"]["context"]["engines"]["ai"]["skipped"]
+    assert skipped[0]["reason"] == "throttled"
+
+
+class HangingEngine(StreamingEngine):
+    """一直不返回首个 chunk 的上游"""
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        await asyncio.sleep(5)
+
+    async def chat_stream(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        await asyncio.sleep(5)
+        yield {"content": "late", "finish_reason": "stop"}
+
+
+@pytest.mark.asyncio
+async def test_hung_provider_times_out_within_deadline_and_fails_over(
+    failover, deadline_config  # noqa: F811
+):
+    """卡住的首选提供商在请求截止之前超时，计入熔断并转移到备用目标"""
+    failover.engine_registry._engines["openai:gpt-4"] = HangingEngine()
+    breaker = failover.engine_registry._ai_breakers["openai:gpt-4"]
+
+    response = await asyncio.wait_for(
+        failover.chat("user-1", "session-1", "default", "hello", timeout=0.5), timeout=2
+    )
+    assert response["model"] == "backup"
+    skipped = response["metadata"]["context"]["engines"]["ai"]["skipped"]
+    assert skipped == [{"provider": "openai", "model": "gpt-4", "reason": "timeout"}]
+
+    chunks = [
+        chunk
+        async for chunk in failover.chat_stream(
+            "user-1", "session-1", "default", "hello", timeout=0.5
+        )
+    ]
+    assert {chunk["model"] for chunk in chunks if "choices" in chunk} == {"backup"}
+    assert breaker.state == "OPEN"  # 两次超时达到 min_calls
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [TimeoutError(), RateLimitError("throttled mid-stream")])
+async def test_stream_error_after_first_chunk_is_not_failed_over(error):
+    """已输出内容后的超时 / 本地拒绝照常抛出，不会再拼接备用目标的完整回答"""
+
+    class BrokenStream(StreamingEngine):
+        async def chat_stream(self, messages, **kwargs):
+            yield {"content": "partial", "finish_reason": None}
+            raise error
+
+    engines = {"primary": BrokenStream(), "backup": StreamingEngine()}
+    breakers = {name: SlidingWindowCircuitBreaker() for name in engines}
+
+    async def acquire(target):
+        return engines[target.model]
+
+    engine = FailoverEngine(
+        [AITarget("openai", "primary"), AITarget("mock", "backup")],
+        acquire,
+        lambda provider, model: breakers[model],
+    )
+    chunks = []
+    with pytest.raises(type(error)):
+        async for chunk in engine.chat_stream([]):
+            chunks.append(chunk)
+    assert [chunk["content"] for chunk in chunks] == ["partial"]
+    assert engine.served_by == AITarget("openai", "primary")
+    assert engine.skipped == []
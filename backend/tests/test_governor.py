@@ -0,0 +1,124 @@
+"""AI 调用 RPM / TPM 限速测试"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.config.schemas import AIRateLimitConfig
+from app.core.exceptions import RateLimitError
+from app.engines.ai import ChatMessage
+from app.engines.ai.governor import RateGovernor, RateLimitedEngine, estimate_prompt_tokens
+from app.engines.registry import EngineRegistry
+from app.storage.redis import redis_manager
+from tests.test_phase_timing import StreamingEngine
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    monkeypatch.setattr(redis_manager, "_redis", None)
+
+
+class FakeScriptRedis:
+    """记录 Lua 脚本调用；按预设序列返回等待秒数"""
+
+    def __init__(self, waits):
+        self.waits = list(waits)
+        self.calls = []
+        self.increments = []
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls.append((keys, args))
+            return self.waits.pop(0)
+
+        return run
+
+    async def hincrbyfloat(self, key, field, amount):
+        self.increments.append((key, field, amount))
+
+
+@pytest.mark.asyncio
+async def test_queued_admission_waits_for_refill_then_rejects(no_redis):
+    """token 桶不足时等待补充；预计等待超出 max_wait_seconds 直接拒绝"""
+    governor = RateGovernor(
+        "openai", AIRateLimitConfig(tokens_per_minute=6000, max_wait_seconds=1.0)
+    )
+    await governor.acquire(6000)
+
+    start = time.monotonic()
+    await governor.acquire(10)  # 100 token/s，约 0.1s
+    assert 0.05 < time.monotonic() - start < 0.5
+
+    with pytest.raises(RateLimitError):
+        await governor.acquire(500)  # 约 5s > 1s
+
+
+@pytest.mark.asyncio
+async def test_admission_is_first_come_first_served(no_redis):
+    """排队请求按到达顺序准入，小请求不会插队"""
+    governor = RateGovernor(
+        "openai", AIRateLimitConfig(tokens_per_minute=600, max_wait_seconds=2.0)
+    )
+    await governor.acquire(600)
+    order = []
+
+    async def call(name, tokens):
+        await governor.acquire(tokens)
+        order.append(name)
+
+    await asyncio.gather(call("large", 3), call("small", 1))
+    assert order == ["large", "small"]
+
+
+@pytest.mark.asyncio
+async def test_engine_reserves_estimate_and_reconciles_with_usage(no_redis):
+    """预扣估算的提示 token + max_tokens，调用后按实际 usage 退回"""
+    governor = RateGovernor("openai", AIRateLimitConfig(tokens_per_minute=10000))
+    engine = RateLimitedEngine(StreamingEngine(), governor)
+    messages = [ChatMessage(role="user", content="hello", token_count=1)]
+    assert estimate_prompt_tokens(messages) == 5
+
+    await engine.chat(messages, max_tokens=1000)
+    assert governor._buckets[1][0] == pytest.approx(10000 - 7, abs=1)  # usage.total_tokens
+
+    chunks = [chunk async for chunk in engine.chat_stream(messages, max_tokens=1000)]
+    assert chunks[-1]["finish_reason"] == "stop"
+    # 流式无 usage：提示估算 + 输出内容的 token 数
+    assert governor._buckets[1][0] < 10000 - 7 - 5
+    assert governor._buckets[1][0] > 10000 - 7 - 1000
+
+
+@pytest.mark.asyncio
+async def test_shared_buckets_use_redis_script(monkeypatch):
+    """Redis 可用时由脚本原子扣减，按返回的等待时间重试；校正写回共享桶"""
+    redis = FakeScriptRedis(["0.02", "0"])
+    monkeypatch.setattr(redis_manager, "_redis", redis)
+    governor = RateGovernor(
+        "openai:primary", AIRateLimitConfig(requests_per_minute=100, tokens_per_minute=1000)
+    )
+
+    await governor.acquire(50)
+    await governor.reconcile(50, 30)
+
+    keys, args = redis.calls[-1]
+    assert len(redis.calls) == 2
+    assert keys == ["cozy:ratelimit:{openai:primary}:rpm", "cozy:ratelimit:{openai:primary}:tpm"]
+    assert args == [100, 1000, 50]
+    assert redis.increments == [("cozy:ratelimit:{openai:primary}:tpm", "level", 20)]
+    assert governor._buckets[1][0] == 1000  # 未动用进程内桶
+
+
+def test_registry_shares_governor_per_key():
+    """同一提供商密钥的不同模型共用一个限速器；未配置限额时不包装"""
+    registry = EngineRegistry()
+    config = AIRateLimitConfig(requests_per_minute=10)
+
+    first = registry._rate_limited(StreamingEngine(), "openai", config)
+    second = registry._rate_limited(StreamingEngine(), "openai", config)
+    assert isinstance(first, RateLimitedEngine)
+    assert first.governor is second.governor
+
+    engine = StreamingEngine()
+    assert registry._rate_limited(engine, "openai", None) is engine
+    assert registry._rate_limited(engine, "other", AIRateLimitConfig()) is engine
@@ -0,0 +1,175 @@
+"""会话热上下文缓存测试"""
+
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from redis.exceptions import WatchError
+
+from app.context.service import ContextService
+from app.core.config.schemas import HistoryCacheConfig
+from app.engines.registry import EngineRegistry
+from app.services.history_cache import CachedMessage, SessionHistoryCache
+from app.services.persister import MessagePersister
+from app.services.summarizer import normalize_session_id
+from app.storage.database import Base, DatabaseManager
+from app.storage.redis import redis_manager
+from tests.test_context_service import _build_dummy_config
+
+
+class FakeRedis:
+    """缓存用到的 Redis 命令子集（内存实现，事务按顺序执行）"""
+
+    def __init__(self):
+        self.data: dict[str, object] = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1)
+        return int(self.data[key])
+
+    async def expire(self, key, seconds):
+        return key in self.data
+
+    async def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+    async def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+        return len(self.data[key])
+
+    async def rpushx(self, key, *values):
+        if key not in self.data:
+            return 0
+        return await self.rpush(key, *values)
+
+    async def ltrim(self, key, start, end):
+        if key in self.data:
+            items = self.data[key]
+            self.data[key] = items[start:] if end == -1 else items[start : end + 1]
+        return True
+
+    async def lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        return list(items[start:] if end == -1 else items[start : end + 1])
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """与 redis-py 一致：WATCH 之后、MULTI 之前命令立即执行，其余命令排队"""
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+        self.watched = None
+        self.immediate = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, key):
+        self.watched = (key, self.redis.data.get(key))
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def __getattr__(self, name):
+        def command(*args):
+            if self.immediate:
+                return getattr(self.redis, name)(*args)
+            self.commands.append((name, args))
+            return self
+
+        return command
+
+    async def execute(self):
+        if self.watched and self.redis.data.get(self.watched[0]) != self.watched[1]:
+            raise WatchError("watched key changed")
+        return [await getattr(self.redis, name)(*args) for name, args in self.commands]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_manager, "_redis", redis)
+    return redis
+
+
+@pytest.fixture
+async def sqlite_db(tmp_path):
+    manager = DatabaseManager()
+    manager.initialize(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    with (
+        patch("app.services.persister.db_manager", manager),
+        patch("app.context.service.db_manager", manager),
+    ):
+        yield manager
+    await manager.close()
+
+
+def _turn(index: int) -> list[tuple[str, str]]:
+    return [("user", f"question {index}"), ("assistant", f"answer {index}")]
+
+
+@pytest.mark.asyncio
+async def test_active_session_reads_history_from_cache(fake_redis, sqlite_db):
+    """冷启动读库并回填；之后的写入写穿缓存，历史读取不再访问数据库"""
+    cache = SessionHistoryCache(HistoryCacheConfig(capacity=10))
+    persister = MessagePersister(history_cache=cache)
+    service = ContextService(EngineRegistry(), config=_build_dummy_config(), persister=persister)
+    await persister.submit("user-1", "session-1", "default", "req-0", _turn(0))
+
+    cold = await service._fetch_recent_messages("session-1", token_budget=1000, request_id="r0")
+    assert [msg.content for msg in cold] == ["question 0", "answer 0"]
+
+    await persister.submit("user-1", "session-1", "default", "req-1", _turn(1))
+    with patch("app.context.service.db_manager", None):
+        warm = await service._fetch_recent_messages(
+            "session-1", token_budget=1000, request_id="r1"
+        )
+    assert [msg.content for msg in warm] == [
+        "question 0", "answer 0", "question 1", "answer 1"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_versioned_keys_keep_workers_coherent(fake_redis):
+    """另一 worker 追加后本地 L1 失效；回填期间有写入则放弃回填"""
+    session_id = normalize_session_id("session-1")
+    worker_a = SessionHistoryCache(HistoryCacheConfig(capacity=3))
+    worker_b = SessionHistoryCache(HistoryCacheConfig(capacity=3))
+
+    token = await worker_a.begin_fill(session_id)
+    await worker_a.fill(session_id, token, [], complete=True)
+    assert (await worker_a.get(session_id)).complete
+
+    await worker_b.append(session_id, _messages(0, 2))
+    await worker_b.append(session_id, _messages(2, 4))
+
+    snapshot = await worker_a.get(session_id)
+    assert [m.content for m in snapshot.messages] == ["m0", "m1", "m2", "m3"]
+    assert not snapshot.complete  # 超出容量，哨兵被裁掉
+
+    stale = await worker_a.begin_fill(session_id)
+    await worker_b.append(session_id, _messages(4, 5))
+    await worker_a.fill(session_id, stale, [], complete=True)
+    assert (await worker_a.get(session_id)).messages[-1].content == "m4"
+
+
+def _messages(start: int, end: int) -> list[CachedMessage]:
+    base = datetime(2026, 1, 1)
+    return [
+        CachedMessage(uuid.uuid4(), "user", f"m{i}", 1, base + timedelta(seconds=i))
+        for i in range(start, end)
+    ]
@@ -0,0 +1,223 @@
+"""消息写后持久化测试"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.services.persister import MessagePersister, PendingMessage, messages_dead_lettered
+from app.storage.database import Base, DatabaseManager
+from app.storage.models import Message, Session
+
+
+@pytest.fixture
+async def sqlite_db(tmp_path):
+    """基于 SQLite 文件的数据库管理器（替换持久化器使用的全局实例）"""
+    manager = DatabaseManager()
+    manager.initialize(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    with patch("app.services.persister.db_manager", manager):
+        yield manager
+    await manager.close()
+
+
+async def _counts(db: DatabaseManager) -> tuple[list[Session], int]:
+    async with db.session() as session:
+        sessions = (await session.execute(select(Session))).scalars().all()
+        message_total = await session.scalar(select(func.count(Message.id)))
+    return sessions, message_total
+
+
+def _turn(index: int) -> list[tuple[str, str]]:
+    return [("user", f"question {index}"), ("assistant", f"answer {index}")]
+
+
+@pytest.mark.asyncio
+async def test_synchronous_upsert_counts_atomically(sqlite_db):
+    """未启动时同步写入：并发提交同一会话，会话只创建一次，message_count 原子递增"""
+    persister = MessagePersister()
+
+    await persister.submit("user-1", "session-1", "default", "req-0", _turn(0))
+    await asyncio.gather(
+        *(
+            persister.submit("user-1", "session-1", "default", f"req-{i}", _turn(i))
+            for i in range(1, 5)
+        )
+    )
+
+    sessions, message_total = await _counts(sqlite_db)
+    assert len(sessions) == 1
+    assert sessions[0].message_count == 10
+    assert message_total == 10
+
+
+@pytest.mark.asyncio
+async def test_buffered_writes_visible_before_flush_and_flushed_on_stop(sqlite_db):
+    """运行中提交只入缓冲区；overlay 可读到未落库消息，stop 时全部刷写"""
+    persister = MessagePersister()
+    await persister.start()
+    # 拉长刷写窗口，确保断言时消息仍在缓冲区
+    persister.flush_interval = 5.0
+
+    for i in range(3):
+        await persister.submit("user-1", "session-1", "default", f"req-{i}", _turn(i))
+
+    session_uuid = uuid.uuid5(uuid.NAMESPACE_URL, "session-1")
+    pending = persister.pending_messages(session_uuid)
+    assert [row.content for row in pending] == [
+        "question 0", "answer 0", "question 1", "answer 1", "question 2", "answer 2"
+    ]
+
+    await persister.stop()
+
+    assert persister.pending_count() == 0
+    sessions, message_total = await _counts(sqlite_db)
+    assert sessions[0].message_count == 6
+    assert message_total == 6
+
+
+@pytest.mark.asyncio
+async def test_replayed_rows_are_not_double_counted(sqlite_db):
+    """重放已落库的消息（相同 id）不重复插入、不重复计数"""
+    persister = MessagePersister()
+    await persister.submit("user-1", "session-1", "default", "req-0", _turn(0))
+
+    async with sqlite_db.session() as session:
+        records = (await session.execute(select(Message))).scalars().all()
+
+    replayed = [
+        PendingMessage(
+            id=record.id,
+            session_id=record.session_id,
+            user_id=record.user_id,
+            personality_id="default",
+            external_session_id="session-1",
+            role=record.role,
+            content=record.content,
+            request_id="req-0",
+            created_at=record.created_at,
+        )
+        for record in records
+    ]
+    async with sqlite_db.session() as session:
+        await persister.write_batch(session, replayed)
+
+    sessions, message_total = await _counts(sqlite_db)
+    assert sessions[0].message_count == 2
+    assert message_total == 2
+
+
+@pytest.mark.asyncio
+async def test_recent_history_includes_unflushed_messages(sqlite_db):
+    """历史读取合并 overlay：已落库与未落库消息按时间顺序返回，不重复"""
+    from app.context.service import ContextService
+    from app.engines.registry import EngineRegistry
+
+    persister = MessagePersister()
+    await persister.submit("user-1", "session-1", "default", "req-0", _turn(0))
+
+    await persister.start()
+    persister.flush_interval = 5.0
+    await persister.submit("user-1", "session-1", "default", "req-1", _turn(1))
+
+    service = ContextService(EngineRegistry(), persister=persister)
+    with patch("app.context.service.db_manager", sqlite_db):
+        messages = await service._fetch_recent_messages(
+            "session-1", token_budget=1000, request_id="req-2", max_messages=3
+        )
+
+    assert [msg.content for msg in messages] == ["answer 0", "question 1", "answer 1"]
+    await persister.stop()
+
+
+@pytest.mark.asyncio
+async def test_token_count_written_at_insert(sqlite_db):
+    """写入时按模型分词器计算 token_count"""
+    persister = MessagePersister()
+
+    await persister.submit(
+        "user-1", "session-1", "default", "req-0", [("user", "你好，世界")], model="gpt-4"
+    )
+
+    async with sqlite_db.session() as session:
+        message = (await session.execute(select(Message))).scalar_one()
+    assert message.token_count is not None
+    assert message.token_count >= 3
+
+
+@pytest.mark.asyncio
+async def test_recent_history_stops_at_token_budget(sqlite_db):
+    """历史按 token 预算分页选取：超出预算即停止，旧数据（无 token_count）按长度估算"""
+    from types import SimpleNamespace
+
+    from app.context.service import ContextService
+    from app.engines.registry import EngineRegistry
+
+    persister = MessagePersister()
+    for i in range(6):
+        await persister.submit("user-1", "session-1", "default", f"req-{i}", _turn(i))
+    # 模拟 token_count 列出现之前写入的消息
+    async with sqlite_db.session() as session:
+        await session.execute(
+            update(Message).where(Message.content == "answer 5").values(token_count=None)
+        )
+        await session.commit()
+
+    config = SimpleNamespace(
+        context=SimpleNamespace(history=SimpleNamespace(page_size=2, max_messages=200))
+    )
+    service = ContextService(EngineRegistry(), persister=persister, config=config)
+    with patch("app.context.service.db_manager", sqlite_db):
+        # "question N"/"answer N" 各计 2 token；旧行按 len//2 = 4 估算
+        messages = await service._fetch_recent_messages(
+            "session-1", token_budget=9, request_id="req-x"
+        )
+
+    assert [msg.content for msg in messages] == ["answer 4", "question 5", "answer 5"]
+    assert [msg.token_count for msg in messages] == [2, 2, None]
+
+
+@pytest.mark.asyncio
+async def test_poison_row_is_dead_lettered_after_bounded_retries(sqlite_db):
+    """整批重试有限次后逐行写入：坏行移入死信，其余消息正常落库，不再无限重试"""
+    persister = MessagePersister(max_flush_retries=1)
+    write_batch = persister.write_batch
+
+    async def reject_poison(session, rows):
+        if any(row.content == "poison" for row in rows):
+            raise ValueError("value too long for column")
+        await write_batch(session, rows)
+
+    persister.write_batch = reject_poison
+    persister.running = True
+    session_uuid = uuid.uuid5(uuid.NAMESPACE_URL, "session-1")
+    rows = [
+        PendingMessage(
+            id=uuid.uuid4(),
+            session_id=session_uuid,
+            user_id=uuid.uuid5(uuid.NAMESPACE_DNS, "user-1"),
+            personality_id="default",
+            external_session_id="session-1",
+            role=role,
+            content=content,
+            request_id="req-1",
+            created_at=datetime.utcnow() + timedelta(microseconds=index),
+        )
+        for index, (role, content) in enumerate(
+            [("user", "question"), ("assistant", "poison"), ("user", "follow-up")]
+        )
+    ]
+    persister._track(rows)
+    dead = messages_dead_lettered.value()
+
+    await asyncio.wait_for(persister._flush(rows), timeout=5)
+
+    assert persister.pending_count() == 0
+    assert messages_dead_lettered.value() == dead + 1
+    sessions, message_total = await _counts(sqlite_db)
+    assert message_total == 2
+    assert sessions[0].message_count == 2
@@ -0,0 +1,44 @@
+"""指标注册表与 Prometheus 导出测试"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.metrics import router
+from app.observability.metrics import MetricsRegistry, metrics
+
+
+def test_render_prometheus_text_format():
+    """计数器 / 仪表 / 直方图按 Prometheus 文本格式导出，标签值转义"""
+    registry = MetricsRegistry()
+    registry.counter("cache_hits_total", "Cache hits").inc(2, tool='say "hi"')
+    registry.gauge("queue_depth", "Queued jobs").set(3)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05, stage="llm")
+    latency.observe(0.5, stage="llm")
+
+    text = registry.render_prometheus()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    assert "# HELP cache_hits_total Cache hits" in lines
+    assert "# TYPE cache_hits_total counter" in lines
+    assert 'cache_hits_total{tool="say \\"hi\\""} 2.0' in lines
+    assert "# TYPE queue_depth gauge" in lines
+    assert "queue_depth 3.0" in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{stage="llm",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="llm",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{stage="llm",le="+Inf"} 2' in lines
+    assert 'latency_seconds_sum{stage="llm"} 0.55' in lines
+    assert 'latency_seconds_count{stage="llm"} 2' in lines
+
+
+def test_metrics_endpoint_serves_registry():
+    """GET /metrics 返回全局注册表的 Prometheus 文本"""
+    metrics.counter("metrics_endpoint_test_total", "Test counter").inc()
+    app = FastAPI()
+    app.include_router(router)
+
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "metrics_endpoint_test_total 1.0" in response.text.splitlines()
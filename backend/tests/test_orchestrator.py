@@ -52,6 +52,7 @@ def context_service(engine_registry):
                 reserve_for_completion=100,
                 personalization_budget=100,
             ),
+            summarization=SimpleNamespace(enabled=False),
             parallel_execution=SimpleNamespace(enabled=False, timeout=1.0),
             assembly=SimpleNamespace(
                 include_system_prompt=True,
@@ -117,11 +118,11 @@ class TestChatOrchestrator:
             )
         )
 
-        orchestrator.engine_registry._engines["openai"] = mock_engine
+        orchestrator.engine_registry._engines["openai:gpt-4"] = mock_engine
 
         # Mock persistence and db_manager
-        with patch.object(orchestrator, "_persist_message", new_callable=AsyncMock):
-            with patch("app.orchestration.chat.db_manager") as mock_db:
+        with patch.object(orchestrator, "_persist_messages", new_callable=AsyncMock):
+            with patch("app.context.service.db_manager") as mock_db:
                 mock_session = AsyncMock()
                 mock_db.session = MagicMock()
                 mock_db.session.return_value.__aenter__.return_value = mock_session
@@ -153,11 +154,11 @@ class TestChatOrchestrator:
 
         mock_engine.chat_stream = mock_stream
 
-        orchestrator.engine_registry._engines["openai"] = mock_engine
+        orchestrator.engine_registry._engines["openai:gpt-4"] = mock_engine
 
         # Mock persistence and db_manager
-        with patch.object(orchestrator, "_persist_message", new_callable=AsyncMock):
-            with patch("app.orchestration.chat.db_manager") as mock_db:
+        with patch.object(orchestrator, "_persist_messages", new_callable=AsyncMock):
+            with patch("app.context.service.db_manager") as mock_db:
                 mock_session = AsyncMock()
                 mock_db.session = MagicMock()
                 mock_db.session.return_value.__aenter__.return_value = mock_session
@@ -204,6 +205,7 @@ class TestOrchestratorInitialization:
                     reserve_for_completion=100,
                     personalization_budget=100,
                 ),
+                summarization=SimpleNamespace(enabled=False),
                 parallel_execution=SimpleNamespace(enabled=False, timeout=1.0),
                 assembly=SimpleNamespace(
                     include_system_prompt=True,
@@ -226,3 +228,4 @@ class TestOrchestratorInitialization:
         with patch("app.context.service.get_config", return_value=dummy_config):
             orchestrator = await initialize_orchestrator(personality_registry, engine_registry)
         assert orchestrator is not None
+
@@ -100,6 +100,16 @@ async def tools_engine():
     return engine
 
 
+def _mock_db_session() -> AsyncMock:
+    """Mocked AsyncSession bound to a PostgreSQL dialect."""
+    db_session = AsyncMock()
+    db_session.execute = AsyncMock(return_value=MagicMock())
+    db_session.get_bind = MagicMock(
+        return_value=SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+    )
+    return db_session
+
+
 def _build_dummy_context_config() -> SimpleNamespace:
     return SimpleNamespace(
         context=SimpleNamespace(
@@ -108,6 +118,7 @@ def _build_dummy_context_config() -> SimpleNamespace:
                 reserve_for_completion=100,
                 personalization_budget=100,
             ),
+            summarization=SimpleNamespace(enabled=False),
             parallel_execution=SimpleNamespace(enabled=False, timeout=1.0),
             assembly=SimpleNamespace(
                 include_system_prompt=True,
@@ -171,8 +182,8 @@ async def test_tool_loop_single_iteration(personality_registry, tools_engine):
     with patch.object(orchestrator, "_get_api_key", return_value="test_key"):
         with patch.object(orchestrator, "_get_base_url", return_value="https://test.com"):
             with patch("app.storage.database.db_manager.session") as mock_session:
-                mock_session.return_value.__aenter__.return_value = AsyncMock()
-                with patch("app.services.audit.AuditService.log_tool_invocation", new=AsyncMock()):
+                mock_session.return_value.__aenter__.return_value = _mock_db_session()
+                with patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()):
                     # Mock engine_registry.get_or_create to return our mock engine
                     async def mock_get_or_create(engine_type, config):
                         return mock_engine
@@ -244,8 +255,8 @@ async def test_tool_loop_multiple_iterations(personality_registry, tools_engine)
     with patch.object(orchestrator, "_get_api_key", return_value="test_key"):
         with patch.object(orchestrator, "_get_base_url", return_value="https://test.com"):
             with patch("app.storage.database.db_manager.session") as mock_session:
-                mock_session.return_value.__aenter__.return_value = AsyncMock()
-                with patch("app.services.audit.AuditService.log_tool_invocation", new=AsyncMock()):
+                mock_session.return_value.__aenter__.return_value = _mock_db_session()
+                with patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()):
                     async def mock_get_or_create(engine_type, config):
                         return mock_engine
                     engine_registry.get_or_create = mock_get_or_create
@@ -301,8 +312,8 @@ async def test_tool_loop_iteration_limit(personality_registry, tools_engine):
     with patch.object(orchestrator, "_get_api_key", return_value="test_key"):
         with patch.object(orchestrator, "_get_base_url", return_value="https://test.com"):
             with patch("app.storage.database.db_manager.session") as mock_session:
-                mock_session.return_value.__aenter__.return_value = AsyncMock()
-                with patch("app.services.audit.AuditService.log_tool_invocation", new=AsyncMock()):
+                mock_session.return_value.__aenter__.return_value = _mock_db_session()
+                with patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()):
                     async def mock_get_or_create(engine_type, config):
                         return mock_engine
                     engine_registry.get_or_create = mock_get_or_create
@@ -360,8 +371,8 @@ async def test_tool_execution_failure(personality_registry, tools_engine):
     with patch.object(orchestrator, "_get_api_key", return_value="test_key"):
         with patch.object(orchestrator, "_get_base_url", return_value="https://test.com"):
             with patch("app.storage.database.db_manager.session") as mock_session:
-                mock_session.return_value.__aenter__.return_value = AsyncMock()
-                with patch("app.services.audit.AuditService.log_tool_invocation", new=AsyncMock()):
+                mock_session.return_value.__aenter__.return_value = _mock_db_session()
+                with patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()):
                     async def mock_get_or_create(engine_type, config):
                         return mock_engine
                     engine_registry.get_or_create = mock_get_or_create
@@ -438,8 +449,8 @@ async def test_permission_denied_tool(personality_registry, tools_engine):
     with patch.object(orchestrator, "_get_api_key", return_value="test_key"):
         with patch.object(orchestrator, "_get_base_url", return_value="https://test.com"):
             with patch("app.storage.database.db_manager.session") as mock_session:
-                mock_session.return_value.__aenter__.return_value = AsyncMock()
-                with patch("app.services.audit.AuditService.log_tool_invocation", new=AsyncMock()):
+                mock_session.return_value.__aenter__.return_value = _mock_db_session()
+                with patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()):
                     async def mock_get_or_create(engine_type, config):
                         return mock_engine
                     engine_registry.get_or_create = mock_get_or_create
@@ -454,3 +465,146 @@ async def test_permission_denied_tool(personality_registry, tools_engine):
     # 验证：权限拒绝不会中断流程
     assert mock_engine.call_count == 2
     assert "permission" in result["choices"][0]["message"]["content"].lower()
+
+
+class SlowToolsEngine(BasicToolsEngine):
+    """按工具副作用返回定义、每次调用耗时固定的工具引擎"""
+
+    def __init__(self, delay: float, write_tools: set[str] | None = None):
+        super().__init__()
+        self.delay = delay
+        self.write_tools = write_tools or set()
+        self.active_writes = 0
+        self.max_active_writes = 0
+
+    def get_tool(self, name: str):
+        from app.engines.tools import ToolDefinition, ToolSideEffect
+
+        side_effect = ToolSideEffect.WRITE if name in self.write_tools else ToolSideEffect.NETWORK
+        return ToolDefinition(name=name, description=name, parameters={}, side_effect=side_effect)
+
+    async def invoke(self, name, arguments, context=None):
+        import asyncio
+
+        from app.engines.tools import ToolInvocationResult
+
+        is_write = name in self.write_tools
+        if is_write:
+            self.active_writes += 1
+            self.max_active_writes = max(self.max_active_writes, self.active_writes)
+        await asyncio.sleep(self.delay)
+        if is_write:
+            self.active_writes -= 1
+        return ToolInvocationResult(success=True, result={"tool": name}, execution_time=self.delay)
+
+
+def _tool_calls(*names: str) -> list[dict]:
+    return [
+        {"id": f"call_{index}", "function": {"name": name, "arguments": "{}"}}
+        for index, name in enumerate(names)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently_in_order(personality_registry):
+    """独立工具并发执行：耗时接近最大值而非总和，结果保持原始顺序，审计单批写入"""
+    import time
+
+    orchestrator = ChatOrchestrator(
+        personality_registry=personality_registry,
+        engine_registry=EngineRegistry(),
+        context_service=MagicMock(),
+    )
+    orchestrator.tools_engine = SlowToolsEngine(delay=0.2)
+
+    with patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()) as audit:
+        start = time.perf_counter()
+        results = await orchestrator._execute_tool_calls(
+            _tool_calls("search_a", "search_b", "search_c", "search_d"),
+            "user", "session", "test_personality", "req",
+        )
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert [r["tool_call_id"] for r in results] == ["call_0", "call_1", "call_2", "call_3"]
+    assert audit.await_count == 1
+    assert len(audit.await_args.args[0]) == 4
+
+
+@pytest.mark.asyncio
+async def test_write_tools_are_serialized(personality_registry):
+    """WRITE 工具之间串行执行，只读/网络工具不受影响"""
+    orchestrator = ChatOrchestrator(
+        personality_registry=personality_registry,
+        engine_registry=EngineRegistry(),
+        context_service=MagicMock(),
+    )
+    engine = SlowToolsEngine(delay=0.05, write_tools={"save_a", "save_b", "save_c"})
+    orchestrator.tools_engine = engine
+
+    with patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()):
+        results = await orchestrator._execute_tool_calls(
+            _tool_calls("save_a", "search", "save_b", "save_c"),
+            "user", "session", "test_personality", "req",
+        )
+
+    assert engine.max_active_writes == 1
+    assert [r["tool_call_id"] for r in results] == ["call_0", "call_1", "call_2", "call_3"]
+
+
+class StreamingToolEngine(MockAIEngine):
+    """第一轮流式返回工具调用（参数完整后继续输出一段时间），第二轮返回最终答案"""
+
+    def __init__(self, tail_delay: float):
+        super().__init__([])
+        self.tail_delay = tail_delay
+        self.stream_calls = 0
+
+    async def chat_stream(self, messages, temperature=None, max_tokens=None, top_p=None, tools=None):
+        import asyncio
+
+        self.stream_calls += 1
+        if self.stream_calls == 1:
+            tool_call = {"id": "call_0", "function": {"name": "search", "arguments": "{}"}}
+            yield {"content": "", "finish_reason": None, "tool_call": tool_call}
+            await asyncio.sleep(self.tail_delay)
+            yield {"content": "", "finish_reason": "tool_calls", "tool_calls": [tool_call]}
+            return
+        yield {"content": "done", "finish_reason": "stop"}
+
+
+@pytest.mark.asyncio
+async def test_stream_starts_tool_before_stream_ends(personality_registry):
+    """流式工具调用参数完整即开始执行，与剩余流的接收重叠"""
+    import time
+
+    engine = StreamingToolEngine(tail_delay=0.2)
+    engine_registry = EngineRegistry()
+    engine_registry._engines["openai:gpt-4"] = engine
+    orchestrator = ChatOrchestrator(
+        personality_registry=personality_registry,
+        engine_registry=engine_registry,
+        context_service=ContextService(
+            engine_registry=engine_registry,
+            config=_build_dummy_context_config(),
+        ),
+    )
+    orchestrator.tools_engine = SlowToolsEngine(delay=0.2)
+
+    with (
+        patch.object(orchestrator, "_persist_messages", new=AsyncMock()),
+        patch("app.services.audit.AuditService.log_tool_invocations", new=AsyncMock()),
+    ):
+        start = time.perf_counter()
+        chunks = [
+            chunk
+            async for chunk in orchestrator.chat_stream(
+                user_id="user", session_id="session", personality_id="test_personality",
+                message="search something",
+            )
+        ]
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.35
+    assert engine.stream_calls == 2
+    assert chunks[-1] == {"data": "[DONE]"}
@@ -1,13 +1,14 @@
+import asyncio
 import json
 import time
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-import httpx
 
-from app.engines.knowledge.cognee import CogneeKnowledgeEngine
+from app.core.config.schemas import HedgingConfig
+from app.engines.base_remote import hedges_fired, hedges_won
 from app.engines.knowledge import KnowledgeItem
-from app.engines.base_remote import L1Cache, CircuitBreaker
+from app.engines.knowledge.cognee import CogneeKnowledgeEngine
 from app.storage.redis import redis_manager
 
 # Mock redis_manager to avoid real Redis connection in tests
@@ -122,3 +123,58 @@ async def test_l2_cache_hit(cognee_engine, mock_httpx_client):
     assert cognee_engine.l1_cache.get(cache_key) is not None
     mock_httpx_client.post.assert_not_called()
     
+
+
+def _hedged_engine(budget_ratio: float) -> CogneeKnowledgeEngine:
+    engine = CogneeKnowledgeEngine(api_url="http://cognee.test", api_token="test-token")
+    engine.hedging = HedgingConfig(enabled=True, min_samples=5, budget_ratio=budget_ratio)
+    engine.hedge_budget.ratio = budget_ratio
+    engine.hedge_budget.tokens = budget_ratio * 10
+    for _ in range(5):
+        engine.latency.record(0.01)
+    return engine
+
+
+def _slow_then_fast(mock_client):
+    response = MagicMock()
+    response.json.return_value = {"results": [{"content": "fast"}]}
+    calls = []
+
+    async def post(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return response
+
+    mock_client.post.side_effect = post
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_hedged_read_wins_over_slow_primary(mock_httpx_client, monkeypatch):
+    monkeypatch.setattr(redis_manager, "_redis", None)
+    engine = _hedged_engine(budget_ratio=1.0)
+    calls = _slow_then_fast(mock_httpx_client)
+    fired = hedges_fired.value(engine="CogneeKnowledgeEngine")
+    won = hedges_won.value(engine="CogneeKnowledgeEngine")
+
+    await engine.initialize()
+    results = await asyncio.wait_for(engine.search_knowledge("hedge query"), timeout=1)
+
+    assert [item.content for item in results] == ["fast"]
+    assert len(calls) == 2
+    assert hedges_fired.value(engine="CogneeKnowledgeEngine") == fired + 1
+    assert hedges_won.value(engine="CogneeKnowledgeEngine") == won + 1
+
+
+@pytest.mark.asyncio
+async def test_hedging_respects_budget(mock_httpx_client, monkeypatch):
+    monkeypatch.setattr(redis_manager, "_redis", None)
+    engine = _hedged_engine(budget_ratio=0.0)
+    calls = _slow_then_fast(mock_httpx_client)
+
+    await engine.initialize()
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(engine.search_knowledge("budget query"), timeout=0.2)
+
+    assert len(calls) == 1
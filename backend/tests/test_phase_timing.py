@@ -0,0 +1,166 @@
+"""请求阶段计时测试"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.context.service import ContextService
+from app.core.personalities.models import Personality, PersonalityAI, PersonalityRegistry
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.engines.registry import EngineRegistry
+from app.observability.metrics import Histogram
+from app.observability.timing import PhaseTimer, phase_seconds, ttft_seconds
+from app.orchestration.chat import ChatOrchestrator
+from app.orchestration.completion_cache import CompletionCache
+from app.orchestration.singleflight import IdempotencyStore
+from tests.test_context_service import _build_dummy_config
+
+
+class StreamingEngine(AIEngine):
+    async def initialize(self):
+        pass
+
+    async def health_check(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        return ChatResponse(
+            content="hi there",
+            finish_reason="stop",
+            usage={"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+        )
+
+    async def chat_stream(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        for token in ["hi", " there"]:
+            yield {"content": token, "finish_reason": None}
+        yield {"content": "", "finish_reason": "stop"}
+
+
+@pytest.fixture
+def orchestrator():
+    registry = PersonalityRegistry()
+    registry.register(
+        Personality(
+            id="default",
+            name="Default",
+            description="Default assistant",
+            system_prompt="You are helpful.",
+            ai=PersonalityAI(provider="openai", model="gpt-4"),
+        )
+    )
+    engine_registry = EngineRegistry()
+    engine_registry._engines["openai:gpt-4"] = StreamingEngine()
+    context_service = SimpleNamespace(
+        build_context_bundle=AsyncMock(
+            return_value=SimpleNamespace(
+                metadata={"engines": {}},
+                token_budget=SimpleNamespace(sections={}),
+            )
+        ),
+        to_messages=lambda bundle, message: [ChatMessage(role="user", content=message)],
+    )
+    orchestrator = ChatOrchestrator(
+        personality_registry=registry,
+        engine_registry=engine_registry,
+        context_service=context_service,
+        completion_cache=CompletionCache(l1_max_entries=10),
+        idempotency=IdempotencyStore(enabled=False, coalesce_inflight=False),
+    )
+    orchestrator._persist_messages = AsyncMock()
+    return orchestrator
+
+
+def test_histogram_cumulative_buckets():
+    """直方图桶为累计计数，超出上界计入 +Inf"""
+    histogram = Histogram("test_latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, phase="x")
+
+    (series,) = histogram.snapshot()
+    assert series["count"] == 4
+    assert series["buckets"] == {"0.1": 2, "1.0": 3, "inf": 4}
+    assert histogram.sum(phase="x") == pytest.approx(3.65)
+
+
+def test_phase_timer_breakdown_and_token_rate():
+    """重复阶段在 breakdown 中累加；tokens/sec 按首 token 之后的时间计算"""
+    timer = PhaseTimer("unit")
+    timer.record("tool.search", 0.010)
+    timer.record("tool.search", 0.015)
+    timer.record_llm_call(1.5, completion_tokens=100, ttft=0.5)
+
+    assert timer.breakdown()["tool.search"] == 25.0
+    llm_call = timer.phases[-1]
+    assert llm_call["ttft_ms"] == 500.0
+    assert llm_call["tokens_per_sec"] == 100.0
+    assert timer.finish()["total_ms"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_context_service_records_source_and_budget_phases(monkeypatch):
+    """上下文构建按来源与预算分配分别计时"""
+    service = ContextService(
+        EngineRegistry(),
+        config=_build_dummy_config(
+            include_knowledge=False,
+            include_user_profile=False,
+            include_chat_memory=False,
+        ),
+    )
+    monkeypatch.setattr(service, "_fetch_recent_messages", AsyncMock(return_value=[]))
+    timer = PhaseTimer("unit")
+
+    await service.build_context_bundle(
+        user_id="user-1",
+        session_id="session-1",
+        current_message="Hello",
+        personality=Personality(
+            id="default",
+            name="Default",
+            description="",
+            system_prompt="You are helpful.",
+            ai=PersonalityAI(provider="openai", model="gpt-4"),
+        ),
+        timer=timer,
+    )
+
+    phases = timer.breakdown()
+    assert "history_fetch" in phases
+    assert "token_budget" in phases
+
+
+@pytest.mark.asyncio
+async def test_chat_response_includes_timings(orchestrator):
+    """非流式响应 metadata 携带阶段分解"""
+    llm_before = phase_seconds.count(kind="chat", phase="llm_call")
+
+    response = await orchestrator.chat("user-1", "session-1", "default", "hello")
+
+    timings = response["metadata"]["timings"]
+    names = [phase["phase"] for phase in timings["phases"]]
+    for expected in (
+        "personality_resolution",
+        "context_build",
+        "engine_acquire",
+        "llm_call",
+        "persistence",
+    ):
+        assert expected in names
+    llm_call = next(phase for phase in timings["phases"] if phase["phase"] == "llm_call")
+    assert llm_call["completion_tokens"] == 2
+    assert phase_seconds.count(kind="chat", phase="llm_call") == llm_before + 1
+
+
+@pytest.mark.asyncio
+async def test_stream_records_time_to_first_token(orchestrator):
+    """流式调用记录 TTFT 直方图"""
+    ttft_before = ttft_seconds.count(kind="chat_stream")
+
+    chunks = [c async for c in orchestrator.chat_stream("user-1", "session-1", "default", "hello")]
+
+    assert chunks[-1] == {"data": "[DONE]"}
+    assert ttft_seconds.count(kind="chat_stream") == ttft_before + 1
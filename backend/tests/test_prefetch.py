@@ -0,0 +1,129 @@
+"""下一轮上下文预取测试"""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.context.service import ContextService
+from app.core.config.schemas import HistoryCacheConfig, PrefetchConfig
+from app.core.personalities.models import Personality, PersonalityAI, PersonalityMemory
+from app.engines.registry import EngineRegistry
+from app.services.history_cache import SessionHistoryCache
+from app.services.persister import MessagePersister
+from app.services.prefetch import ContextPrefetcher, context_prefetcher
+from app.services.worker import AsyncWorkerService
+from app.storage.redis import redis_manager
+from tests.test_context_service import (
+    StubChatMemoryEngine,
+    StubUserProfileEngine,
+    _build_dummy_config,
+)
+from tests.test_history_cache import FakeRedis, sqlite_db  # noqa: F401
+
+
+class QueueRedis(FakeRedis):
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def lpush(self, key, *values):
+        self.data.setdefault(key, [])[:0] = values
+        return len(self.data[key])
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = QueueRedis()
+    monkeypatch.setattr(redis_manager, "_redis", redis)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_schedule_is_rate_limited_per_user(fake_redis):
+    """同一用户在限流窗口内只投递一次；回复截断为记忆检索查询"""
+    prefetcher = ContextPrefetcher(PrefetchConfig(max_query_chars=5))
+
+    assert await prefetcher.schedule("user-1", "session-1", "default", "long reply")
+    assert not await prefetcher.schedule("user-1", "session-2", "default", "another")
+    assert await prefetcher.schedule("user-2", "session-3", "default", "reply")
+
+    queued = [json.loads(item) for item in fake_redis.data["cozy:queue:context_prefetch"]]
+    assert [task["user_id"] for task in queued] == ["user-2", "user-1"]
+    assert queued[1]["query"] == "long "
+
+
+@pytest.mark.asyncio
+async def test_prefetch_warms_history_profile_and_memory(fake_redis, sqlite_db):  # noqa: F811
+    """预取后下一轮的历史读取命中缓存，画像与记忆检索已预跑"""
+    calls = []
+
+    class RecordingProfileEngine(StubUserProfileEngine):
+        async def get_profile(self, user_id, max_token_size):
+            calls.append(("profile", user_id))
+            return await super().get_profile(user_id, max_token_size)
+
+    class RecordingMemoryEngine(StubChatMemoryEngine):
+        async def search_memories(self, query, user_id, session_id, top_k=5):
+            calls.append(("memory", query))
+            return await super().search_memories(query, user_id, session_id, top_k)
+
+    engine_registry = EngineRegistry()
+    engine_registry._user_profile_engines["local"] = RecordingProfileEngine()
+    engine_registry._chat_memory_engines["mem0"] = RecordingMemoryEngine()
+    persister = MessagePersister(history_cache=SessionHistoryCache(HistoryCacheConfig()))
+    service = ContextService(
+        engine_registry,
+        config=_build_dummy_config(include_knowledge=False),
+        persister=persister,
+    )
+    await persister.submit(
+        "user-1", "session-1", "default", "req-1", [("user", "hi"), ("assistant", "hello")]
+    )
+    personality = Personality(
+        id="default",
+        name="Default",
+        description="",
+        system_prompt="You are helpful.",
+        ai=PersonalityAI(provider="openai", model="gpt-4"),
+        memory=PersonalityMemory(enabled=True, recall_top_k=3),
+    )
+
+    statuses = await service.prefetch("user-1", "session-1", personality, query="hello")
+
+    assert statuses == {"history": "ok", "user_profile": "ok", "chat_memory": "ok"}
+    assert calls == [("profile", "user-1"), ("memory", "hello")]
+    with patch("app.context.service.db_manager", None):
+        warm = await service._fetch_recent_messages("session-1", token_budget=1000, request_id="r")
+    assert [msg.content for msg in warm] == ["hi", "hello"]
+
+
+@pytest.mark.asyncio
+async def test_worker_consumes_prefetch_queue_without_waiting_for_other_queues():
+    """预取队列由独立任务消费，不排在其他队列的阻塞轮询之后"""
+    prefetch_queue = context_prefetcher.settings.queue_name
+    handled = asyncio.Event()
+    queued = [{"user_id": "user-1", "session_id": "session-1", "personality_id": "default"}]
+
+    async def dequeue(queue_name, timeout=5):
+        if queue_name == prefetch_queue and queued:
+            return queued.pop()
+        await asyncio.sleep(timeout)  # 其他队列为空：阻塞到超时
+        return None
+
+    async def handle(payload):
+        handled.set()
+
+    worker = AsyncWorkerService()
+    with (
+        patch("app.services.worker.task_queue.dequeue", dequeue),
+        patch.object(worker, "_handle_context_prefetch", handle),
+    ):
+        await worker.start()
+        try:
+            await asyncio.wait_for(handled.wait(), timeout=0.5)
+        finally:
+            await worker.stop()
@@ -0,0 +1,215 @@
+"""请求合并与幂等键测试"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.personalities.models import Personality, PersonalityAI, PersonalityRegistry
+from app.engines.ai import AIEngine, ChatMessage, ChatResponse
+from app.engines.registry import EngineRegistry
+from app.orchestration.chat import ChatOrchestrator
+from app.orchestration.completion_cache import CompletionCache
+from app.orchestration.singleflight import IdempotencyStore, SingleFlight
+from app.storage.redis import redis_manager
+
+
+class GatedEngine(AIEngine):
+    """在 gate 打开前阻塞的 AI 引擎，用于制造并发重叠"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.chat_calls = 0
+        self.stream_calls = 0
+
+    async def initialize(self):
+        pass
+
+    async def health_check(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.chat_calls += 1
+        await self.gate.wait()
+        return ChatResponse(content="pong", finish_reason="stop", usage={"total_tokens": 3})
+
+    async def chat_stream(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.stream_calls += 1
+        yield {"content": "po", "finish_reason": None}
+        await self.gate.wait()
+        yield {"content": "ng", "finish_reason": "stop"}
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """以内存字典替代 Redis 读写"""
+    store: dict[str, str] = {}
+
+    async def fake_get(key):
+        return store.get(key)
+
+    async def fake_set(key, value, expire=None):
+        store[key] = value
+        return True
+
+    monkeypatch.setattr(redis_manager, "get", fake_get)
+    monkeypatch.setattr(redis_manager, "set", fake_set)
+    return store
+
+
+@pytest.fixture
+def orchestrator(fake_redis):
+    registry = PersonalityRegistry()
+    registry.register(
+        Personality(
+            id="default",
+            name="Default",
+            description="Default assistant",
+            system_prompt="You are helpful.",
+            ai=PersonalityAI(provider="openai", model="gpt-4"),
+        )
+    )
+    engine_registry = EngineRegistry()
+    engine_registry._engines["openai:gpt-4"] = GatedEngine()
+
+    context_service = SimpleNamespace(
+        build_context_bundle=AsyncMock(
+            return_value=SimpleNamespace(
+                metadata={"engines": {}},
+                token_budget=SimpleNamespace(sections={}),
+            )
+        ),
+        to_messages=lambda bundle, message: [ChatMessage(role="user", content=message)],
+    )
+    orchestrator = ChatOrchestrator(
+        personality_registry=registry,
+        engine_registry=engine_registry,
+        context_service=context_service,
+        completion_cache=CompletionCache(l1_max_entries=10),
+        idempotency=IdempotencyStore(enabled=True, coalesce_inflight=True, ttl=60),
+    )
+    orchestrator._persist_messages = AsyncMock()
+    return orchestrator
+
+
+@pytest.mark.asyncio
+async def test_identical_inflight_requests_share_one_call(orchestrator):
+    """并发的相同请求只调用一次上游，跟随者响应带 coalesced 标记"""
+    engine = orchestrator.engine_registry._engines["openai:gpt-4"]
+
+    leader = asyncio.create_task(orchestrator.chat("user-1", "session-1", "default", "ping"))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(orchestrator.chat("user-1", "session-1", "default", "ping"))
+    other = asyncio.create_task(orchestrator.chat("user-1", "session-1", "default", "other"))
+    await asyncio.sleep(0.01)
+    engine.gate.set()
+
+    first, second, third = await asyncio.gather(leader, follower, other)
+
+    assert engine.chat_calls == 2
+    assert second["id"] == first["id"]
+    assert second["metadata"]["coalesced"] is True
+    assert "coalesced" not in first["metadata"]
+    assert third["id"] != first["id"]
+    # 合并后的请求只持久化一次
+    assert orchestrator._persist_messages.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_follower_replays_from_start(orchestrator):
+    """流式跟随者从头接收领导者的全部 chunk"""
+    engine = orchestrator.engine_registry._engines["openai:gpt-4"]
+
+    async def collect():
+        return [c async for c in orchestrator.chat_stream("user-1", "session-1", "default", "ping")]
+
+    leader = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    engine.gate.set()
+
+    leader_chunks, follower_chunks = await asyncio.gather(leader, follower)
+
+    assert engine.stream_calls == 1
+    assert follower_chunks == leader_chunks
+    assert leader_chunks[-1] == {"data": "[DONE]"}
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_replays_completed_response(orchestrator, fake_redis):
+    """完成后携带相同 Idempotency-Key 的重试直接返回保存的响应"""
+    engine = orchestrator.engine_registry._engines["openai:gpt-4"]
+    engine.gate.set()
+
+    first = await orchestrator.chat("user-1", "session-1", "default", "ping", idempotency_key="k1")
+    retry = await orchestrator.chat("user-1", "session-1", "default", "ping", idempotency_key="k1")
+    other_user = await orchestrator.chat("user-2", "session-1", "default", "ping", idempotency_key="k1")
+
+    assert engine.chat_calls == 2
+    assert retry["id"] == first["id"]
+    assert retry["metadata"]["idempotent_replay"] is True
+    assert other_user["id"] != first["id"]
+
+    chunks = [
+        c
+        async for c in orchestrator.chat_stream(
+            "user-1", "session-1", "default", "ping", idempotency_key="s1"
+        )
+    ]
+    replayed = [
+        c
+        async for c in orchestrator.chat_stream(
+            "user-1", "session-1", "default", "ping", idempotency_key="s1"
+        )
+    ]
+    assert engine.stream_calls == 1
+    assert replayed == chunks
+
+
+@pytest.mark.asyncio
+async def test_disabled_idempotency_never_replays(orchestrator, fake_redis):
+    """功能关闭时忽略 Idempotency-Key：内容相同的后续请求不会回放之前的响应"""
+    engine = orchestrator.engine_registry._engines["openai:gpt-4"]
+    engine.gate.set()
+    orchestrator.idempotency.enabled = False
+
+    first = await orchestrator.chat("user-1", "session-1", "default", "ping", idempotency_key="k1")
+    later = await orchestrator.chat("user-1", "session-1", "default", "ping", idempotency_key="k2")
+    assert engine.chat_calls == 2
+    assert later["id"] != first["id"]
+    assert "idempotent_replay" not in later.get("metadata", {})
+
+    for key in ("s1", "s2"):
+        async for _ in orchestrator.chat_stream(
+            "user-1", "session-1", "default", "ping", idempotency_key=key
+        ):
+            pass
+    assert engine.stream_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_is_cancelled():
+    """所有订阅者离开后停止上游生成"""
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def produce():
+        try:
+            yield {"n": 1}
+            await asyncio.sleep(10)
+            yield {"n": 2}
+        finally:
+            cancelled.set()
+
+    stream = flight.stream("key", produce)
+    assert await stream.__anext__() == {"n": 1}
+    await stream.aclose()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert not flight.in_flight("key")
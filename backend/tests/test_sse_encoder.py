@@ -0,0 +1,119 @@
+"""SSE 帧编码与增量合并测试"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.api.v1.chat import sse
+from app.api.v1.chat.sse import SSEFrameEncoder, coalesce_chunks
+
+
+def _chunk(content, finish_reason=None, created=1700000000):
+    return {
+        "id": "chatcmpl-req-1",
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": "gpt-4",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": finish_reason}],
+    }
+
+
+def _parse(frame: bytes) -> dict:
+    text = frame.decode()
+    assert text.startswith("data: ") and text.endswith("\n\n")
+    return json.loads(text[len("data: ") : -2])
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(sse, "orjson", None)
+    elif sse.orjson is None:
+        pytest.skip("orjson not installed")
+    return SSEFrameEncoder("req-1")
+
+
+@pytest.mark.parametrize(
+    "chunk",
+    [
+        _chunk("hello"),
+        _chunk('quote " backslash \\ newline \n 你好  ', finish_reason="stop"),
+        _chunk("", created=1700000001),
+        # 非标准形态走完整序列化
+        {**_chunk("x"), "usage": {"total_tokens": 3, "cache_hit": True}},
+        {
+            **_chunk(""),
+            "choices": [{"index": 0, "delta": {"role": "tool", "content": "[Tools executed: 1]"}, "finish_reason": None}],
+        },
+    ],
+)
+def test_frame_matches_full_serialization(encoder, chunk):
+    """预编码帧解析后与 {**chunk, "request_id"} 完全一致"""
+    assert _parse(encoder.encode(chunk)) == {**chunk, "request_id": "req-1"}
+
+
+def test_prefix_rebuilt_when_header_changes(encoder):
+    """created/model 变化时重建前缀"""
+    encoder.encode(_chunk("a"))
+    changed = {**_chunk("b"), "model": "gpt-4o"}
+    assert _parse(encoder.encode(changed))["model"] == "gpt-4o"
+
+
+async def _upstream(items):
+    for item in items:
+        yield item
+
+
+async def test_coalesce_merges_burst_and_flushes_on_finish():
+    """突发的小增量合并为一帧，finish_reason 立即刷出"""
+    deltas = [_chunk(c) for c in "hello world"] + [_chunk("!", finish_reason="stop")]
+    done = {"data": "[DONE]"}
+
+    out = [c async for c in coalesce_chunks(_upstream([*deltas, done]), flush_interval=1.0)]
+
+    assert out[-1] == done
+    assert len(out) == 2
+    merged = out[0]["choices"][0]
+    assert merged["delta"]["content"] == "hello world!"
+    assert merged["finish_reason"] == "stop"
+
+
+async def test_coalesce_respects_byte_threshold():
+    """缓冲达到字节阈值即输出"""
+    deltas = [_chunk("abcd") for _ in range(6)]
+
+    out = [c async for c in coalesce_chunks(_upstream(deltas), max_bytes=8, flush_interval=1.0)]
+
+    assert [c["choices"][0]["delta"]["content"] for c in out] == ["abcdabcd"] * 3
+
+
+async def test_coalesce_flushes_on_interval_when_upstream_stalls():
+    """上游停顿时按时间窗口刷出，不等待下一个增量"""
+    gate = asyncio.Event()
+
+    async def stalled():
+        yield _chunk("partial")
+        await gate.wait()
+        yield _chunk(" rest", finish_reason="stop")
+
+    frames = coalesce_chunks(stalled(), flush_interval=0.02)
+    first = await asyncio.wait_for(anext(frames), timeout=1)
+    assert first["choices"][0]["delta"]["content"] == "partial"
+
+    gate.set()
+    rest = [c async for c in frames]
+    assert rest[0]["choices"][0]["delta"]["content"] == " rest"
+
+
+async def test_coalesce_flushes_buffer_before_tool_event():
+    """非文本 chunk 先刷出缓冲，保持顺序"""
+    tool_event = {
+        **_chunk(""),
+        "choices": [{"index": 0, "delta": {"role": "tool", "content": "[Tools executed: 1]"}, "finish_reason": None}],
+    }
+    items = [_chunk("a"), _chunk("b"), tool_event, _chunk("c")]
+
+    out = [c async for c in coalesce_chunks(_upstream(items), flush_interval=1.0)]
+
+    assert [c["choices"][0]["delta"]["content"] for c in out] == ["ab", "[Tools executed: 1]", "c"]
@@ -0,0 +1,175 @@
+"""会话滚动摘要测试"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.context.service import ContextService
+from app.core.config.schemas import SummarizationConfig
+from app.core.personalities.models import Personality, PersonalityAI
+from app.engines.ai import ChatResponse
+from app.engines.registry import EngineRegistry
+from app.engines.user_profile import UserProfileResult
+from app.services.persister import MessagePersister
+from app.services.summarizer import SessionSummarizer, normalize_session_id
+from app.storage.database import Base, DatabaseManager
+from app.storage.redis import redis_manager
+from tests.test_context_service import StubUserProfileEngine, _build_dummy_config
+
+
+@pytest.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    """SQLite 数据库替换持久化器、摘要器与上下文服务使用的全局实例；禁用 Redis"""
+    monkeypatch.setattr(redis_manager, "_redis", None)
+    manager = DatabaseManager()
+    manager.initialize(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    with (
+        patch("app.services.persister.db_manager", manager),
+        patch("app.services.summarizer.db_manager", manager),
+        patch("app.context.service.db_manager", manager),
+    ):
+        yield manager
+    await manager.close()
+
+
+async def _seed_turns(count: int) -> None:
+    persister = MessagePersister()
+    for i in range(count):
+        await persister.submit(
+            "user-1",
+            "session-1",
+            "default",
+            f"req-{i}",
+            [("user", f"question {i}"), ("assistant", f"answer {i}")],
+        )
+
+
+def _engine(summary: str) -> SimpleNamespace:
+    response = ChatResponse(content=summary, finish_reason="stop")
+    return SimpleNamespace(chat=AsyncMock(return_value=response))
+
+
+@pytest.mark.asyncio
+async def test_fold_keeps_recent_window_and_advances_watermark(sqlite_db):
+    """只折叠近期窗口之外的消息；新增不足一批时不调用模型"""
+    await _seed_turns(5)
+    summarizer = SessionSummarizer(
+        SummarizationConfig(keep_recent_messages=4, min_batch_messages=4, max_batch_messages=100)
+    )
+    session_id = normalize_session_id("session-1")
+    engine = _engine("User asked questions 0-2.")
+
+    state = await summarizer.summarize(session_id, engine)
+
+    assert state.summarized_count == 6
+    prompt = engine.chat.await_args.args[0][1].content
+    assert "answer 2" in prompt and "question 3" not in prompt
+    assert (await summarizer.load("session-1")).summary == "User asked questions 0-2."
+
+    await _seed_turns(1)
+    assert await summarizer.summarize(session_id, engine) is None
+    assert engine.chat.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_context_uses_summary_and_history_after_watermark(sqlite_db):
+    """上下文携带摘要，近期历史只读取水位线之后的消息"""
+    await _seed_turns(5)
+    summarizer = SessionSummarizer(
+        SummarizationConfig(keep_recent_messages=4, min_batch_messages=4)
+    )
+    engine = _engine("Earlier: questions 0-2.")
+    await summarizer.summarize(normalize_session_id("session-1"), engine)
+
+    config = _build_dummy_config(
+        include_knowledge=False, include_user_profile=False, include_chat_memory=False
+    )
+    config.context.summarization = SimpleNamespace(enabled=True)
+    service = ContextService(EngineRegistry(), config=config, summarizer=summarizer)
+
+    bundle = await service.build_context_bundle(
+        user_id="user-1",
+        session_id="session-1",
+        current_message="Hello",
+        personality=Personality(
+            id="default",
+            name="Default",
+            description="",
+            system_prompt="You are helpful.",
+            ai=PersonalityAI(provider="openai", model="gpt-4"),
+        ),
+    )
+
+    assert bundle.summarized_history == ["Earlier: questions 0-2."]
+    assert [msg.content for msg in bundle.recent_messages] == [
+        "question 3", "answer 3", "question 4", "answer 4"
+    ]
+
+
+def test_summary_is_budgeted_before_personalization():
+    """画像、知识与记忆占满个性化预算时，摘要仍保留（其覆盖的消息不会再被读取）"""
+    service = ContextService(
+        EngineRegistry(), config=_build_dummy_config(personalization_budget=20)
+    )
+    summary = ["Earlier: the user is planning a trip to Kyoto in April."]
+    profile = UserProfileResult(profile_text="likes hiking " * 40, token_size=120)
+
+    budget = service._apply_token_budget(
+        ["You are helpful."], [], summary, [], [], profile, max_tokens=100
+    )
+
+    assert summary == ["Earlier: the user is planning a trip to Kyoto in April."]
+    assert budget.sections["summary"] > 0
+    assert 0 < budget.sections["profile"] <= 20
+
+
+@pytest.mark.asyncio
+async def test_summary_lookup_overlaps_personalization_engines(monkeypatch):
+    """摘要读取与个性化引擎并发进行，只有历史读取等待水位线"""
+    events = []
+
+    class SlowSummarizer:
+        async def load(self, session_id):
+            events.append("summary_start")
+            await asyncio.sleep(0.2)
+            return None
+
+    class SlowProfileEngine(StubUserProfileEngine):
+        async def get_profile(self, user_id, max_token_size):
+            events.append("profile_start")
+            await asyncio.sleep(0.2)
+            return await super().get_profile(user_id, max_token_size)
+
+    async def history(session_id, token_budget, request_id, after=None):
+        events.append("history_start")
+        return []
+
+    config = _build_dummy_config(include_knowledge=False, include_chat_memory=False)
+    config.context.summarization = SimpleNamespace(enabled=True)
+    registry = EngineRegistry()
+    registry._user_profile_engines["local"] = SlowProfileEngine()
+    service = ContextService(registry, config=config, summarizer=SlowSummarizer())
+    monkeypatch.setattr(service, "_fetch_recent_messages", history)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    bundle = await service.build_context_bundle(
+        user_id="user-1",
+        session_id="session-1",
+        current_message="Hello",
+        personality=Personality(
+            id="default",
+            name="Default",
+            description="",
+            system_prompt="You are helpful.",
+            ai=PersonalityAI(provider="openai", model="gpt-4"),
+        ),
+    )
+
+    assert loop.time() - started < 0.35
+    assert events.index("profile_start") < events.index("history_start")
+    assert bundle.summarized_history == []
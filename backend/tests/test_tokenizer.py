@@ -0,0 +1,78 @@
+"""分词计数测试"""
+
+from app.context.service import ContextService
+from app.engines.ai import ChatMessage
+from app.engines.registry import EngineRegistry
+from app.utils import tokenizer as tokenizer_module
+from app.utils.tokenizer import HeuristicTokenizer, get_tokenizer
+from tests.test_context_service import _build_dummy_config
+
+
+def test_heuristic_counts_cjk_per_character():
+    """中文按字计数，英文约 4 字符 1 token"""
+    tokenizer = HeuristicTokenizer()
+
+    assert tokenizer.count("") == 0
+    assert tokenizer.count("A" * 200) == 50
+    # 旧估算 len // 4 会把 20 个汉字算成 5 个 token
+    assert tokenizer.count("今天天气很好，我们一起去公园散步吧，好吗") == 20
+
+
+def test_heuristic_truncate_respects_budget():
+    tokenizer = HeuristicTokenizer()
+    text = "你好世界" + "hello world"
+
+    truncated = tokenizer.truncate(text, 3)
+
+    assert truncated == "你好世"
+    assert tokenizer.count(truncated) <= 3
+    assert tokenizer.truncate(text, 100) == text
+
+
+def test_counts_are_memoized():
+    """相同文本只分词一次"""
+    tokenizer = HeuristicTokenizer()
+    text = "一段不可变的知识内容" * 10
+
+    tokenizer.count(text)
+    tokenizer.count(text)
+
+    info = tokenizer._count.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+
+
+def test_falls_back_to_heuristic_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(tokenizer_module, "tiktoken", None)
+    get_tokenizer.cache_clear()
+    try:
+        assert get_tokenizer("gpt-4").name == "heuristic"
+    finally:
+        get_tokenizer.cache_clear()
+
+
+def test_budget_uses_persisted_token_count():
+    """历史消息带 token_count 时预算直接使用，不重新分词"""
+    service = ContextService(
+        EngineRegistry(),
+        config=_build_dummy_config(max_context_tokens=120, reserve_for_completion=20),
+    )
+    recent = [
+        ChatMessage(role="user", content="short", token_count=90),
+        ChatMessage(role="assistant", content="short", token_count=5),
+    ]
+
+    budget = service._apply_token_budget(
+        [], recent, [], [], [], None, None, HeuristicTokenizer()
+    )
+
+    # 可用预算 100，两条共 95 全部保留；计数来自持久化值（内容本身只有几个 token）
+    assert budget.sections["recent_messages"] == 95
+    assert len(recent) == 2
+
+    recent.insert(0, ChatMessage(role="user", content="older", token_count=10))
+    budget = service._apply_token_budget(
+        [], recent, [], [], [], None, None, HeuristicTokenizer()
+    )
+    assert [msg.token_count for msg in recent] == [90, 5]
+    assert budget.truncated is True
@@ -204,3 +204,56 @@ async def test_basic_tools_engine_close():
     # 关闭应该成功（即使没有需要清理的资源）
     await engine.close()
     assert True
+
+
+@pytest.mark.asyncio
+async def test_basic_tools_engine_result_cache(monkeypatch):
+    """测试 READ_ONLY 工具结果缓存：参数规范化后命中，跳过执行"""
+    from unittest.mock import AsyncMock
+
+    from app.engines.tools import ToolInvocationResult
+    from app.engines.tools.basic import tool_cache_hits, tool_cache_misses
+
+    engine = BasicToolsEngine()
+    await engine.initialize()
+    monkeypatch.setattr(engine, "_check_whitelist", lambda name: True)
+    invoke = AsyncMock(return_value=ToolInvocationResult(success=True, result="4"))
+    monkeypatch.setattr(BuiltInTools, "invoke", invoke)
+
+    hits_before = tool_cache_hits.value(tool="calculate")
+    misses_before = tool_cache_misses.value(tool="calculate")
+
+    first = await engine.invoke("calculate", {"expression": "2 + 2", "precision": 2})
+    second = await engine.invoke("calculate", {"precision": 2, "expression": "2 + 2"})
+
+    assert invoke.await_count == 1
+    assert not first.cached
+    assert second.cached and second.result == "4"
+    assert tool_cache_hits.value(tool="calculate") == hits_before + 1
+    assert tool_cache_misses.value(tool="calculate") == misses_before + 1
+
+    # 非 READ_ONLY / 未声明缓存的工具不缓存
+    assert "get_current_time" not in engine._result_caches
+
+
+@pytest.mark.asyncio
+async def test_basic_tools_engine_result_cache_user_scope(monkeypatch):
+    """测试 user scope 缓存按用户隔离"""
+    from dataclasses import replace
+    from unittest.mock import AsyncMock
+
+    from app.engines.tools import ToolInvocationResult
+
+    engine = BasicToolsEngine()
+    await engine.initialize()
+    engine._tools["calculate"] = replace(engine._tools["calculate"], cache_scope="user")
+    monkeypatch.setattr(engine, "_check_whitelist", lambda name: True)
+    invoke = AsyncMock(return_value=ToolInvocationResult(success=True, result="4"))
+    monkeypatch.setattr(BuiltInTools, "invoke", invoke)
+
+    await engine.invoke("calculate", {"expression": "2 + 2"}, {"user_id": "alice"})
+    await engine.invoke("calculate", {"expression": "2 + 2"}, {"user_id": "bob"})
+    cached = await engine.invoke("calculate", {"expression": "2 + 2"}, {"user_id": "alice"})
+
+    assert invoke.await_count == 2
+    assert cached.cached
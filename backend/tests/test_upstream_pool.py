@@ -0,0 +1,132 @@
+"""AI 上游池测试"""
+
+import asyncio
+import contextlib
+
+import pytest
+
+from app.core.config.schemas import OutlierEjectionConfig, UpstreamEndpointConfig
+from app.core.exceptions import ExternalServiceError, RateLimitError
+from app.engines.ai import ChatMessage, ChatResponse
+from app.engines.ai.upstream import UpstreamPool, upstream_ejections
+from tests.test_phase_timing import StreamingEngine
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class GatedEngine(StreamingEngine):
+    """chat 在 gate 打开前保持在途；可配置为按状态码失败"""
+
+    def __init__(self, gate: asyncio.Event | None = None, fail_status: int | None = None):
+        self.gate = gate
+        self.fail_status = fail_status
+        self.calls = 0
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail_status is not None:
+            raise ExternalServiceError("OpenAI", "failed") from StatusError(self.fail_status)
+        return ChatResponse(content="ok", finish_reason="stop")
+
+
+def _pool(engines: dict, weights: dict | None = None, max_concurrency: int = 64, **ejection):
+    return UpstreamPool.from_config(
+        "openai:test",
+        [
+            UpstreamEndpointConfig(
+                name=name, weight=(weights or {}).get(name, 1.0), max_concurrency=max_concurrency
+            )
+            for name in engines
+        ],
+        OutlierEjectionConfig(**ejection),
+        lambda endpoint: engines[endpoint.name],
+    )
+
+
+MESSAGES = [ChatMessage(role="user", content="hi")]
+
+
+@pytest.mark.asyncio
+async def test_weighted_least_outstanding_routing_and_concurrency_cap():
+    """在途请求按权重分摊；全部端点满载时排队等待名额"""
+    gate = asyncio.Event()
+    engines = {"a": GatedEngine(gate), "b": GatedEngine(gate)}
+    pool = _pool(engines, weights={"a": 1.0, "b": 2.0}, max_concurrency=2)
+
+    tasks = [asyncio.create_task(pool.chat(MESSAGES)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+
+    assert (engines["a"].calls, engines["b"].calls) == (2, 2)  # b 权重高但受并发上限约束
+    assert sum(not task.done() for task in tasks) == 5
+
+    gate.set()
+    responses = await asyncio.gather(*tasks)
+    assert [response.content for response in responses] == ["ok"] * 5
+    assert engines["a"].calls + engines["b"].calls == 5
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+
+@pytest.mark.asyncio
+async def test_endpoint_ejected_after_consecutive_429():
+    """连续 429 后端点被摘除，请求转到其余端点；400 不计为端点故障"""
+    engines = {"limited": GatedEngine(fail_status=429), "healthy": GatedEngine()}
+    pool = _pool(engines, consecutive_failures=2, max_ejection_percent=50)
+    limited = pool.endpoints[0]
+    ejections = upstream_ejections.value(upstream="openai:test", endpoint="limited")
+
+    while not limited.ejected_until:
+        with contextlib.suppress(ExternalServiceError):
+            await pool.chat(MESSAGES)
+
+    assert upstream_ejections.value(upstream="openai:test", endpoint="limited") == ejections + 1
+    calls = engines["limited"].calls
+    for _ in range(5):
+        assert (await pool.chat(MESSAGES)).content == "ok"
+    assert engines["limited"].calls == calls
+
+    bad_request = _pool({"x": GatedEngine(fail_status=400), "y": GatedEngine()})
+    for _ in range(5):
+        with contextlib.suppress(ExternalServiceError):
+            await bad_request.chat(MESSAGES)
+    assert not bad_request.endpoints[0].ejected_until
+
+
+class ThrottledEngine(StreamingEngine):
+    """端点自身的本地限速在发出请求前拒绝"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.calls += 1
+        raise RateLimitError("Upstream rate limit for 'openai:throttled' reached")
+
+    async def chat_stream(self, messages, temperature=0.7, max_tokens=2000, top_p=1.0, tools=None):
+        self.calls += 1
+        raise RateLimitError("Upstream rate limit for 'openai:throttled' reached")
+        yield
+
+
+@pytest.mark.asyncio
+async def test_local_rejection_retries_next_endpoint_without_ejection():
+    """本地限速拒绝不计入摘除，请求改由下一个端点处理；全部拒绝时抛出"""
+    engines = {"throttled": ThrottledEngine(), "healthy": StreamingEngine()}
+    pool = _pool(engines, weights={"throttled": 100.0}, consecutive_failures=1)
+    throttled = pool.endpoints[0]
+
+    for _ in range(3):
+        assert (await pool.chat(MESSAGES)).content == "hi there"
+        chunks = [chunk async for chunk in pool.chat_stream(MESSAGES)]
+        assert chunks[-1]["finish_reason"] == "stop"
+    assert engines["throttled"].calls == 6
+    assert not throttled.ejected_until
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+    with pytest.raises(RateLimitError):
+        await _pool({"only": ThrottledEngine()}).chat(MESSAGES)